@@ -1,3 +1,44 @@
 from django.contrib import admin
+from django.db.models import Count
 
-# Register your models here.
+from .intent_store import deferred_changes
+from .models import Intent, Response, TrainingPhrase
+
+
+class ResponseInline(admin.StackedInline):
+    model = Response
+    extra = 0
+
+
+class TrainingPhraseInline(admin.TabularInline):
+    model = TrainingPhrase
+    extra = 1
+
+
+@admin.register(Intent)
+class IntentAdmin(admin.ModelAdmin):
+    list_display = ['name', 'position', 'is_active', 'phrase_count', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'description', 'training_phrases__text']
+    inlines = [ResponseInline, TrainingPhraseInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(phrase_count=Count('training_phrases'))
+
+    @admin.display(description='Phrases', ordering='phrase_count')
+    def phrase_count(self, obj):
+        return obj.phrase_count
+
+    # Une seule notification des workers par enregistrement ou suppression,
+    # quel que soit le nombre de phrases touchées.
+    def save_related(self, request, form, formsets, change):
+        with deferred_changes():
+            super().save_related(request, form, formsets, change)
+
+    def delete_model(self, request, obj):
+        with deferred_changes():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with deferred_changes():
+            super().delete_queryset(request, queryset)
@@ -0,0 +1,140 @@
+"""Cache des réponses aux questions générales, par similarité de question.
+
+Une question hors dataset coûte un appel complet au LLM avec le contexte
+BDD. Si une question quasi identique (même langue, même contexte, même
+historique envoyé au modèle) vient d'obtenir une réponse, celle-ci est
+resservie. Les questions sont comparées par le cosinus de leurs ensembles
+de trigrammes de caractères ; les nombres doivent être identiques (« activité
+3 » et « activité 4 » ne se confondent pas).
+
+Les entrées expirent après ``CHATBOT_ANSWER_CACHE_TTL`` secondes et les
+moins récemment servies sont évincées au-delà de
+``CHATBOT_ANSWER_CACHE_SIZE``. Le cache est propre au processus. La
+version du contexte fait partie de la clé de chaque entrée : elle diffère
+d'une question à l'autre quand le contexte inclut les passages retenus
+pour la question (``retrieval``), et les entrées d'un contexte dépassé ne
+sont plus servies puis sont évincées comme les autres.
+"""
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+
+from django.conf import settings
+
+from .coalesce import normalize_question
+from .intent_index import char_ngrams
+from .metrics import registry
+
+ANSWER_CACHE_SIZE = getattr(settings, "CHATBOT_ANSWER_CACHE_SIZE", 1000)
+ANSWER_CACHE_TTL = getattr(settings, "CHATBOT_ANSWER_CACHE_TTL", 10 * 60)
+ANSWER_CACHE_SIMILARITY = getattr(settings, "CHATBOT_ANSWER_CACHE_SIMILARITY", 0.9)
+
+_number_re = re.compile(r"\d+")
+
+CachedAnswer = namedtuple(
+    "CachedAnswer", ["question", "grams", "numbers", "bucket", "answer", "latency_ms", "expires"]
+)
+
+
+class AnswerCache:
+    """Réponses récentes, retrouvées par similarité de la question"""
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._postings = defaultdict(set)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for gram in entry.grams:
+            ids = self._postings[(entry.bucket, gram)]
+            ids.discard(entry_id)
+            if not ids:
+                del self._postings[(entry.bucket, gram)]
+
+    def _evict(self, now):
+        # Ordre LRU : les entrées en tête sont les moins récemment servies.
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry.expires <= now]
+        for entry_id in expired:
+            self._remove(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def get(self, question, lang, context_version, history_key=""):
+        """Réponse d'une question assez proche, ou None"""
+        question = normalize_question(question)
+        grams = char_ngrams(question)
+        numbers = _number_re.findall(question)
+        bucket = (lang, context_version, history_key)
+        now = time.monotonic()
+
+        with self._lock:
+            shared = defaultdict(int)
+            for gram in grams:
+                for entry_id in self._postings.get((bucket, gram), ()):
+                    shared[entry_id] += 1
+
+            best, best_score = None, 0.0
+            for entry_id, count in shared.items():
+                entry = self._entries[entry_id]
+                if entry.expires <= now or entry.numbers != numbers:
+                    continue
+                score = count / math.sqrt(len(grams) * len(entry.grams))
+                if score > best_score:
+                    best, best_score = entry_id, score
+
+            if best is None or best_score < self.threshold:
+                registry.increment("answer_cache.miss")
+                return None
+            self._entries.move_to_end(best)
+            entry = self._entries[best]
+
+        registry.increment("answer_cache.hit")
+        registry.observe("answer_cache.saved_ms", entry.latency_ms)
+        return entry.answer
+
+    def put(self, question, lang, context_version, answer, latency_ms=0.0, history_key=""):
+        if not answer:
+            return
+        question = normalize_question(question)
+        grams = char_ngrams(question)
+        now = time.monotonic()
+        entry = CachedAnswer(
+            question, frozenset(grams), _number_re.findall(question), (lang, context_version, history_key),
+            answer, latency_ms, now + self.ttl
+        )
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            for gram in entry.grams:
+                self._postings[(entry.bucket, gram)].add(entry_id)
+            self._evict(now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def stats(self):
+        counters = registry.snapshot()["counters"]
+        hits = counters.get("answer_cache.hit", 0)
+        misses = counters.get("answer_cache.miss", 0)
+        return {
+            "entries": len(self),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+
+answer_cache = AnswerCache()
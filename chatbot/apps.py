@@ -1,6 +1,19 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Serveurs seulement (pas migrate ni les commandes) : prépare le
+        # chatbot en arrière-plan pour que le premier message n'attende pas.
+        if getattr(settings, 'CHATBOT_WARMUP', False):
+            from .chatbot_service import warm_up
+
+            threading.Thread(target=warm_up, name='chatbot-warmup', daemon=True).start()
@@ -0,0 +1,211 @@
+"""Variante asynchrone de ``send_message`` pour les déploiements ASGI.
+
+Les appels au LLM passent par ``LLMProvider.achat`` (``cohere.AsyncClient``
+pour Cohere) et les requêtes de contexte par l'ORM asynchrone : une
+requête en attente du LLM ne bloque plus de thread. La logique (prompts, nettoyage, composition) est celle de
+``chatbot_service`` ; seules les entrées/sorties diffèrent.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+
+from .chatbot_service import (
+    GREETING_RESPONSES,
+    LANGUAGE_CONFIDENCE_THRESHOLD,
+    LLM_BUDGETS,
+    LLM_TIMEOUT,
+    UNAVAILABLE_RESPONSES,
+    Stages,
+    _clean_model_answer,
+    _compose_reply,
+    _general_request,
+    _is_greeting_only,
+    _language_request,
+    _parse_language_answer,
+    _prepared_answer,
+    _reformulation_request,
+    get_provider,
+    get_response_for_intent,
+    llm_caller,
+    match_intent,
+    question_context,
+    quick_language_guess,
+)
+from .answer_cache import answer_cache
+from .coalesce import AsyncSingleFlight, flight_key, history_digest
+from .context import aget_context_snapshot
+from .dataset import get_dataset
+from .metrics import finish_trace, record_usage, stage, start_trace
+from .prompt import prompt_history
+from .resilience import LLMUnavailable
+from .sessions import get_session_store
+
+logger = logging.getLogger(__name__)
+
+ainflight = AsyncSingleFlight()
+
+
+async def aget_database_context():
+    """Équivalent asynchrone de ``get_database_context``"""
+    return (await aget_context_snapshot()).context
+
+
+async def aget_dataset():
+    """``get_dataset`` hors de la boucle : en base, la synchronisation passe par l'ORM"""
+    return await sync_to_async(get_dataset)()
+
+
+async def _atimed(name, awaitable):
+    with stage(name):
+        return await awaitable
+
+
+async def _allm_chat(kind, request):
+    """Équivalent asynchrone de ``_llm_chat``"""
+    with stage(f"llm.{kind}"):
+        reply = await llm_caller.acall(kind, lambda: get_provider().achat(request), LLM_BUDGETS.get(kind, LLM_TIMEOUT))
+    record_usage(reply.input_tokens, reply.output_tokens)
+    return reply
+
+
+async def afind_language(text, dataset=None):
+    """Équivalent asynchrone de ``find_language``"""
+    guess = (dataset or await aget_dataset()).language_classifier.predict(text)
+    if guess.lang and guess.confidence >= LANGUAGE_CONFIDENCE_THRESHOLD:
+        return guess.lang
+
+    try:
+        response = await _allm_chat("language", _language_request(text))
+        return _parse_language_answer(response.text, guess.lang or "fr")
+    except Exception:
+        logger.warning("Detection de langue par le LLM en echec", exc_info=True)
+        return guess.lang or "fr"
+
+
+async def _areformulate(reference, lang, question):
+    response = await _allm_chat("reformulate", _reformulation_request(reference, lang, question))
+    with stage("postprocess"):
+        return _clean_model_answer(response.text, lang) or reference.strip()
+
+
+async def areformulate_answer(reference, lang, question=None):
+    key = flight_key("reformulate", question or "", lang, reference)
+    answer, _ = await ainflight.do(key, lambda: _areformulate(reference, lang, question))
+    return answer
+
+
+async def _aanswer_general(user_text, lang, db_context, history, history_key):
+    started = time.perf_counter()
+    response = await _allm_chat("general", _general_request(user_text, lang, db_context.context_block, history))
+    with stage("postprocess"):
+        answer = _clean_model_answer(response.text, lang)
+    answer_cache.put(
+        user_text, lang, db_context.version, answer, (time.perf_counter() - started) * 1000, history_key
+    )
+    return answer
+
+
+async def aanswer_general_inquiry(user_text, lang, db_context, chat_history):
+    """Équivalent asynchrone de ``answer_general_inquiry``"""
+    # L'index se met à jour depuis la base : hors de la boucle d'événements.
+    db_context = await sync_to_async(question_context)(user_text, db_context)
+    history = prompt_history(chat_history)
+    history_key = history_digest(history)
+    with stage("answer_cache"):
+        cached = answer_cache.get(user_text, lang, db_context.version, history_key)
+    if cached is not None:
+        return cached
+
+    key = flight_key("general", user_text, lang, db_context.version, history_key)
+    answer, _ = await ainflight.do(
+        key, lambda: _aanswer_general(user_text, lang, db_context, history, history_key)
+    )
+    return answer
+
+
+async def _arun_stages(user_text, dataset, greeting=False):
+    """Équivalent asynchrone de ``_run_stages`` (tâches asyncio)"""
+    user_language = quick_language_guess(user_text)
+    language_task = None
+    if user_language is None:
+        language_task = asyncio.ensure_future(_atimed("language", afind_language(user_text, dataset)))
+
+    if greeting:
+        return Stages(user_language or await language_task, None, None)
+
+    with stage("intent"):
+        match = match_intent(user_text, dataset)
+    context_task = None
+    if dataset.resolve_response_key(match.intent_name, match.response_key) is None:
+        context_task = asyncio.ensure_future(_atimed("context", aget_context_snapshot()))
+
+    if language_task is not None:
+        user_language = await language_task
+    context = await context_task if context_task is not None else None
+    return Stages(user_language, match, context)
+
+
+async def _aremember(session_key, user_text, bot_response):
+    await get_session_store().aappend(
+        session_key,
+        {"role": "USER", "message": user_text},
+        {"role": "CHATBOT", "message": bot_response},
+    )
+
+
+async def asend_message(text, session_key):
+    """Logique principale du chatbot, sans bloquer la boucle d'événements"""
+    trace = start_trace()
+    outcome = "error"
+    chat_history = await get_session_store().aget_history(session_key)
+    dataset = await aget_dataset()
+
+    try:
+        user_text = (text or "").strip()
+        greeting = _is_greeting_only(user_text)
+        user_language, match, db_context = await _arun_stages(user_text, dataset, greeting)
+        trace.language = user_language
+        if greeting:
+            outcome = "greeting"
+            bot_response = GREETING_RESPONSES.get(user_language, GREETING_RESPONSES["fr"])
+            await _aremember(session_key, user_text, bot_response)
+            return bot_response
+        trace.intent = match.intent_name
+        dataset_response = get_response_for_intent(match.intent_name, match.response_key, user_language, dataset)
+
+        if dataset_response:
+            outcome = "dataset"
+            main_answer = _prepared_answer(match, dataset_response, user_language, dataset)
+            if main_answer is None:
+                outcome = "reformulated"
+                try:
+                    main_answer = await areformulate_answer(dataset_response, user_language, question=user_text)
+                except Exception:
+                    logger.warning("Reformulation impossible, reponse du dataset servie", exc_info=True)
+                    outcome = "fallback"
+                    main_answer = dataset_response
+            bot_response = _compose_reply(main_answer, user_language, add_contact=False)
+            await _aremember(session_key, user_text, bot_response)
+            return bot_response
+
+        if db_context is None:
+            db_context = await _atimed("context", aget_context_snapshot())
+        try:
+            main_answer = await aanswer_general_inquiry(user_text, user_language, db_context, chat_history)
+            outcome = "general"
+        except LLMUnavailable:
+            outcome = "fallback"
+            main_answer = UNAVAILABLE_RESPONSES.get(user_language, UNAVAILABLE_RESPONSES["fr"])
+        bot_response = _compose_reply(main_answer, user_language, add_contact=True)
+        await _aremember(session_key, user_text, bot_response)
+        return bot_response
+
+    except Exception:
+        outcome = "error"
+        logger.exception("Erreur du chatbot (asynchrone)")
+        return "Desole, une erreur s'est produite. Veuillez reessayer."
+
+    finally:
+        finish_trace(trace, outcome)
@@ -0,0 +1,211 @@
+"""Classification d'intentions par lots (questions journalisées, réglage du dataset).
+
+Les phrases de l'index forment une matrice creuse d'incidence
+n-grammes x phrases ; un lot de questions en forme une seconde, et leur
+produit (calculé avec NumPy) donne d'un coup le nombre de n-grammes
+partagés par chaque question et chaque phrase. La présélection qui en
+découle, puis le classement exact par ratio difflib, sont ceux de
+``IntentIndex.best_match`` : une question obtient la même intention par
+lot qu'en ligne.
+
+Le ratio difflib, calculé phrase par phrase, coûte l'essentiel du temps.
+Seuls les scores des ``top_k`` meilleures intentions sont rendus : les
+candidates sont donc évaluées par borne supérieure décroissante (le
+``quick_ratio`` de difflib, calculé d'un coup pour toutes à partir des
+nombres de caractères), et l'évaluation s'arrête dès qu'aucune candidate
+restante ne peut plus changer ces intentions ni leur score.
+"""
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from .chatbot_service import SUPPORT_INTENT, resolve_match
+from .intent_index import SHORTLIST_PER_INTENT, SHORTLIST_SIZE, canonical_phrase, char_ngrams
+
+# Questions traitées par produit matriciel (borne la mémoire du produit).
+BATCH_SIZE = 256
+
+
+class BatchClassifier:
+    """Index du dataset sous forme matricielle"""
+
+    def __init__(self, index):
+        self.index = index
+        vocabulary = {}
+        phrase_ids = []
+        columns = []
+        removed = getattr(index, "removed", ())
+        for phrase_id in range(len(index.phrases)):
+            if phrase_id in removed:
+                continue
+            for gram in char_ngrams(index.phrases[phrase_id]):
+                phrase_ids.append(phrase_id)
+                columns.append(vocabulary.setdefault(gram, len(vocabulary)))
+
+        # Stockage compressé par n-gramme : les phrases du n-gramme ``c``
+        # sont ``indices[indptr[c]:indptr[c + 1]]``.
+        columns = np.asarray(columns, dtype=np.int64)
+        self.indices = np.asarray(phrase_ids, dtype=np.int64)[np.argsort(columns, kind="stable")]
+        self.indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns, minlength=len(vocabulary)), out=self.indptr[1:])
+        self.vocabulary = vocabulary
+        self.phrase_sizes = np.asarray(index.phrase_sizes, dtype=np.int64)
+        self.phrase_intents = np.asarray(index.phrase_intents, dtype=np.int64)
+
+        # Nombre de chaque caractère par phrase, pour les bornes de ``quick_ratio``.
+        phrases = [index.phrases[phrase_id] for phrase_id in range(len(index.phrases))]
+        self.alphabet = {}
+        for phrase in phrases:
+            for char in phrase:
+                self.alphabet.setdefault(char, len(self.alphabet))
+        self.char_counts = np.zeros((len(phrases), len(self.alphabet)), dtype=np.int32)
+        for phrase_id, phrase in enumerate(phrases):
+            for char, count in Counter(phrase).items():
+                self.char_counts[phrase_id, self.alphabet[char]] = count
+        self.phrase_lengths = np.asarray([len(phrase) for phrase in phrases], dtype=np.int64)
+
+        support_ids = [i for i, (name, _) in enumerate(index.intents) if name == SUPPORT_INTENT]
+        self.support_mask = np.isin(self.phrase_intents, support_ids) if support_ids else None
+
+    def shared_counts(self, gram_sets):
+        """Matrice questions x phrases du nombre de n-grammes partagés"""
+        size = len(self.phrase_sizes)
+        rows, starts, lengths = [], [], []
+        for row, grams in enumerate(gram_sets):
+            for gram in grams:
+                column = self.vocabulary.get(gram)
+                if column is not None:
+                    rows.append(row)
+                    starts.append(self.indptr[column])
+                    lengths.append(self.indptr[column + 1] - self.indptr[column])
+        if not rows:
+            return np.zeros((len(gram_sets), size), dtype=np.int64)
+
+        lengths = np.asarray(lengths, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.int64)
+        # Position, dans ``indices``, de chaque phrase des n-grammes retenus.
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        cells = np.repeat(np.asarray(rows, dtype=np.int64), lengths) * size + self.indices[positions]
+        return np.bincount(cells, minlength=len(gram_sets) * size).reshape(len(gram_sets), size)
+
+    def shortlist(self, counts, query_size, mask=None):
+        """Même présélection que ``IntentIndex.candidates``"""
+        phrase_ids = np.flatnonzero(counts if mask is None else counts * mask)
+        dice = counts[phrase_ids] / (query_size + self.phrase_sizes[phrase_ids])
+        ranked = phrase_ids[np.lexsort((phrase_ids, -dice))]
+
+        selected = []
+        per_intent_counts = Counter()
+        intents = self.phrase_intents
+        for phrase_id in ranked.tolist():
+            intent_id = intents[phrase_id]
+            if per_intent_counts[intent_id] >= SHORTLIST_PER_INTENT:
+                continue
+            per_intent_counts[intent_id] += 1
+            selected.append(phrase_id)
+            if len(selected) >= SHORTLIST_SIZE:
+                break
+        return selected
+
+    def intent_scores(self, query, phrase_ids, keep):
+        """Ratios des ``keep`` meilleures intentions, tels que ``IntentIndex.intent_scores``
+
+        Les intentions hors des ``keep`` premières peuvent manquer ou avoir
+        un score sous-estimé.
+        """
+        if not phrase_ids:
+            return {}
+        ids = np.asarray(phrase_ids, dtype=np.int64)
+        query_counts = np.zeros(len(self.alphabet), dtype=np.int32)
+        for char, count in Counter(query).items():
+            column = self.alphabet.get(char)
+            if column is not None:
+                query_counts[column] = count
+        # Même calcul, donc mêmes flottants, que ``SequenceMatcher.quick_ratio``.
+        matches = np.minimum(self.char_counts[ids], query_counts).sum(axis=1)
+        bounds = (2.0 * matches / (self.phrase_lengths[ids] + len(query))).tolist()
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        phrases = self.index.phrases
+        intents = self.index.phrase_intents
+        scores = {}
+        threshold = -1.0
+        for rank in sorted(range(len(phrase_ids)), key=lambda i: (-bounds[i], i)):
+            bound = bounds[rank]
+            if bound < threshold:
+                break
+            phrase_id = phrase_ids[rank]
+            intent_id = intents[phrase_id]
+            best = scores.get(intent_id)
+            # À ratio égal, la candidate la mieux classée l'emporte : une
+            # candidate moins bien classée doit faire strictement mieux.
+            if best is not None and (bound < best[0] or (bound == best[0] and rank > best[1])):
+                continue
+            matcher.set_seq1(phrases[phrase_id])
+            score = matcher.ratio()
+            if best is None or score > best[0] or (score == best[0] and rank < best[1]):
+                scores[intent_id] = (score, rank, phrase_id)
+                if len(scores) >= keep:
+                    threshold = sorted((entry[0] for entry in scores.values()), reverse=True)[keep - 1]
+        return scores
+
+    def _scores(self, query, query_size, counts, top_k):
+        """(ratios par intention, correspondance de support) d'une question"""
+        if not query:
+            return {}, None
+        index = self.index
+        # L'intention retenue et sa marge demandent les deux premières.
+        scores = self.intent_scores(query, self.shortlist(counts, query_size), max(top_k, 2))
+        support = None
+        if self.support_mask is not None:
+            support = index.match_candidates(
+                query, self.shortlist(counts, query_size, self.support_mask), cutoff=0.8
+            )
+        return scores, support
+
+    def _result(self, text, scores, support, top_k):
+        index = self.index
+        match = resolve_match(text, support, lambda: index.match_scores(scores, cutoff=0.6))
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], item[1][1]))[:top_k]
+        return {
+            "text": text,
+            "intent": match.intent_name,
+            "response_key": match.response_key,
+            "score": round(match.score, 4),
+            "margin": round(match.margin, 4),
+            "top": [
+                {"intent": index.intents[intent_id][0], "score": round(score, 4)}
+                for intent_id, (score, _, _) in ranked
+            ],
+        }
+
+    def classify(self, texts, top_k=3):
+        """Intention et ``top_k`` meilleures intentions de chaque texte"""
+        # Les questions journalisées se répètent : chaque forme canonique
+        # n'est classée qu'une fois.
+        queries = [canonical_phrase(text) for text in texts]
+        unique = list(dict.fromkeys(queries))
+        scored = {}
+        for start in range(0, len(unique), BATCH_SIZE):
+            chunk = unique[start:start + BATCH_SIZE]
+            gram_sets = [char_ngrams(query) if query else set() for query in chunk]
+            counts = self.shared_counts(gram_sets)
+            for row, query in enumerate(chunk):
+                scored[query] = self._scores(query, len(gram_sets[row]), counts[row], top_k)
+        return [self._result(text, *scored[query], top_k) for text, query in zip(texts, queries)]
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_batch_classifier(dataset):
+    """Classifieur du dataset courant, reconstruit quand le dataset change"""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None or _classifier[0] != dataset.checksum:
+            _classifier = (dataset.checksum, BatchClassifier(dataset.index))
+        return _classifier[1]
@@ -0,0 +1,346 @@
+"""Banc d'essai du chatbot : justesse et débit de la détection d'intention,
+de l'identification de la langue et de la détection des salutations.
+
+Une partie des phrases d'entraînement de ``cjk_dataset.json`` est mise de
+côté (par phrase canonique, pour que les variantes numérotées d'une même
+phrase ne se retrouvent pas des deux côtés). Chaque implémentation du
+matcher est construite sur le reste puis évaluée sur les phrases mises de
+côté, telles quelles et perturbées (fautes de frappe, casse, accents
+retirés). Le résultat est un dictionnaire JSON comparable d'une version à
+l'autre (commande ``benchmark_chatbot``).
+"""
+import os
+import random
+import re
+import tempfile
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from .chatbot_service import SUPPORT_INTENT, _is_greeting_only, quick_language_guess, resolve_match
+from .keywords import scan_keywords
+from .compiled import load_compiled, write_compiled
+from .intent_index import IntentIndex, canonical_phrase
+from .language import LanguageClassifier
+
+BENCHMARK_VERSION = 1
+HOLDOUT = 0.2
+SEED = 1234
+# Durée minimale de mesure du débit, en secondes.
+MIN_TIMING = 0.5
+
+# ``exhaustive`` (référence sans présélection, lente) est à demander.
+DEFAULT_MATCHERS = ("index", "compiled", "batch")
+
+_sentence_re = re.compile(r"(?<=[.!?])\s+")
+
+
+def _typo(text, rng):
+    chars = list(text)
+    if len(chars) < 4:
+        return text
+    i = rng.randrange(len(chars) - 1)
+    operation = rng.choice(("swap", "drop", "double", "replace"))
+    if operation == "swap":
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    elif operation == "drop":
+        del chars[i]
+    elif operation == "double":
+        chars.insert(i, chars[i])
+    else:
+        chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+
+def _casing(text, rng):
+    return "".join(c.upper() if rng.random() < 0.5 else c.lower() for c in text)
+
+
+def strip_accents(text):
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+PERTURBATIONS = {
+    "exact": lambda text, rng: text,
+    "typo": _typo,
+    "casing": _casing,
+    "accents": lambda text, rng: strip_accents(text),
+}
+
+
+def split_dataset(data, holdout=HOLDOUT, seed=SEED):
+    """(dataset d'entraînement, [(phrase mise de côté, intention)])"""
+    rng = random.Random(seed)
+    train = {"intents": []}
+    heldout = []
+    for intent_data in data.get("intents", []):
+        groups = defaultdict(list)
+        for phrase in intent_data.get("training_phrases", []):
+            groups[canonical_phrase(phrase)].append(phrase)
+        keys = sorted(groups)
+        rng.shuffle(keys)
+        # Une intention garde toujours au moins une phrase d'entraînement.
+        count = min(int(round(len(keys) * holdout)), len(keys) - 1)
+        held = set(keys[:count])
+        train_phrases = []
+        for key, phrases in groups.items():
+            if key in held:
+                heldout.extend((phrase, intent_data["intent_name"]) for phrase in phrases)
+            else:
+                train_phrases.extend(phrases)
+        train["intents"].append(dict(intent_data, training_phrases=train_phrases))
+    return train, heldout
+
+
+class ExhaustiveMatcher:
+    """Référence : ratio difflib contre toutes les phrases, sans présélection"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def classify(self, texts):
+        return [self._match(text).intent_name for text in texts]
+
+    def _best(self, query, cutoff, intent_name=None):
+        index = self.index
+        phrase_ids = [
+            phrase_id for phrase_id in range(len(index))
+            if intent_name is None or index.intents[index.phrase_intents[phrase_id]][0] == intent_name
+        ]
+        return index.match_candidates(query, phrase_ids, cutoff)
+
+    def _match(self, text):
+        query = canonical_phrase(text)
+        if not query:
+            return resolve_match(text, None, lambda: None)
+        support = self._best(query, 0.8, SUPPORT_INTENT)
+        return resolve_match(text, support, lambda: self._best(query, 0.6))
+
+
+class OnlineMatcher:
+    """Le matcher du chatbot (``match_intent``) sur un index donné"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def classify(self, texts):
+        index = self.index
+        return [
+            resolve_match(
+                text,
+                index.best_match(text, cutoff=0.8, intent_name=SUPPORT_INTENT),
+                lambda text=text: index.best_match(text, cutoff=0.6),
+            ).intent_name
+            for text in texts
+        ]
+
+
+class BatchMatcher:
+    def __init__(self, index):
+        from .batch import BatchClassifier
+
+        self.classifier = BatchClassifier(index)
+
+    def classify(self, texts):
+        return [result["intent"] for result in self.classifier.classify(texts, top_k=1)]
+
+
+def build_matchers(train, workdir, names=None):
+    """Implémentations du matcher construites sur ``train``"""
+    index = IntentIndex.from_dataset(train)
+    factories = {
+        "index": lambda: OnlineMatcher(index),
+        "compiled": lambda: OnlineMatcher(_compiled_index(train, workdir)),
+        "batch": lambda: BatchMatcher(index),
+        "exhaustive": lambda: ExhaustiveMatcher(index),
+    }
+    matchers = {}
+    for name, factory in factories.items():
+        if name not in (names or DEFAULT_MATCHERS):
+            continue
+        try:
+            matchers[name] = factory()
+        except ImportError:
+            # NumPy absent : le matcher par lots n'est pas mesuré.
+            continue
+    return matchers
+
+
+def _compiled_index(train, workdir):
+    path = os.path.join(workdir, "benchmark.compiled")
+    write_compiled(path, train, "benchmark")
+    return load_compiled(path).index
+
+
+def throughput(func, items, min_time=MIN_TIMING):
+    """Éléments traités par seconde (le lot est rejoué pendant ``min_time``)"""
+    if not items:
+        return None
+    rounds = 0
+    started = time.perf_counter()
+    while True:
+        func(items)
+        rounds += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return round(rounds * len(items) / elapsed, 1)
+
+
+def uncached(func):
+    """``func`` sur un lot, sans profiter du cache des analyses de mots-clés"""
+    def run(items):
+        scan_keywords.cache_clear()
+        return [func(item) for item in items]
+    return run
+
+
+def classification_report(expected, predicted):
+    """Exactitude, et précision / rappel / F1 par classe"""
+    labels = sorted(set(expected) | set(predicted))
+    true_positives = Counter()
+    predicted_counts = Counter(predicted)
+    expected_counts = Counter(expected)
+    for truth, guess in zip(expected, predicted):
+        if truth == guess:
+            true_positives[truth] += 1
+
+    per_label = {}
+    for label in labels:
+        precision = true_positives[label] / predicted_counts[label] if predicted_counts[label] else 0.0
+        recall = true_positives[label] / expected_counts[label] if expected_counts[label] else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_label[label] = {
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(f1, 4),
+            "support": expected_counts[label],
+        }
+    scored = [values for label, values in per_label.items() if values["support"]]
+    return {
+        "accuracy": round(sum(true_positives.values()) / len(expected), 4) if expected else None,
+        "macro_f1": round(sum(v["f1"] for v in scored) / len(scored), 4) if scored else None,
+        "per_label": per_label,
+    }
+
+
+def intent_benchmark(data, holdout=HOLDOUT, seed=SEED, names=None):
+    train, heldout = split_dataset(data, holdout, seed)
+    rng = random.Random(seed)
+    variants = {
+        name: [(perturb(phrase, rng), intent) for phrase, intent in heldout]
+        for name, perturb in PERTURBATIONS.items()
+    }
+    results = {"heldout": len(heldout), "matchers": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, matcher in build_matchers(train, workdir, names).items():
+            report = {}
+            elapsed = 0.0
+            for variant, samples in variants.items():
+                texts = [text for text, _ in samples]
+                started = time.perf_counter()
+                predicted = matcher.classify(texts)
+                elapsed += time.perf_counter() - started
+                report[variant] = classification_report([intent for _, intent in samples], predicted)
+            total = sum(len(samples) for samples in variants.values())
+            report["queries_per_second"] = round(total / elapsed, 1) if elapsed else None
+            results["matchers"][name] = report
+    return results
+
+
+def _response_sentences(data):
+    samples = []
+    for intent_data in data.get("intents", []):
+        for by_lang in (intent_data.get("responses") or {}).values():
+            for lang, text in by_lang.items():
+                samples.extend((lang, sentence) for sentence in _sentence_re.split(text or "") if sentence.strip())
+    return samples
+
+
+def language_benchmark(data, holdout=HOLDOUT, seed=SEED, min_time=MIN_TIMING):
+    """Classifieur entraîné sur une partie des réponses, testé sur le reste"""
+    samples = _response_sentences(data)
+    random.Random(seed).shuffle(samples)
+    count = int(round(len(samples) * holdout))
+    test, train = samples[:count], samples[count:]
+    classifier = LanguageClassifier().fit(train)
+    expected = [lang for lang, _ in test]
+    texts = [text for _, text in test]
+
+    guesses = [quick_language_guess(text) for text in texts]
+    covered = [(truth, guess) for truth, guess in zip(expected, guesses) if guess is not None]
+    return {
+        "samples": len(test),
+        "classifier": dict(
+            classification_report(expected, [classifier.predict(text).lang for text in texts]),
+            queries_per_second=throughput(lambda items: [classifier.predict(t) for t in items], texts, min_time),
+        ),
+        "keywords": {
+            "coverage": round(len(covered) / len(texts), 4) if texts else None,
+            "accuracy": round(sum(t == g for t, g in covered) / len(covered), 4) if covered else None,
+            "queries_per_second": throughput(uncached(quick_language_guess), texts, min_time),
+        },
+    }
+
+
+GREETINGS = (
+    "bonjour", "Bonjour !", "salut", "Bonsoir", "hello", "Hi!", "good morning", "Good evening",
+    "mwaramutse", "Namahoro", "habari", "hujambo", "shikamoo", "how are you?", "Comment allez-vous ?",
+    "ça va ?", "ca va", "amakuru yawe", "Salut, ça va ?", "Hello, how are you?",
+)
+
+
+def greeting_benchmark(data, seed=SEED, min_time=MIN_TIMING):
+    """Salutations seules contre phrases d'entraînement (qui n'en sont pas)"""
+    rng = random.Random(seed)
+    positives = [_casing(text, rng) if i % 2 else text for i, text in enumerate(GREETINGS * 5)]
+    phrases = sorted({
+        phrase for intent_data in data.get("intents", [])
+        for phrase in intent_data.get("training_phrases", [])
+    })
+    negatives = rng.sample(phrases, min(len(phrases), 1000))
+    texts = positives + negatives
+    expected = ["greeting"] * len(positives) + ["other"] * len(negatives)
+    predicted = ["greeting" if _is_greeting_only(text) else "other" for text in texts]
+    report = classification_report(expected, predicted)["per_label"]["greeting"]
+    report["queries_per_second"] = throughput(uncached(_is_greeting_only), texts, min_time)
+    return report
+
+
+def run_benchmark(data, holdout=HOLDOUT, seed=SEED, matchers=None, min_time=MIN_TIMING):
+    return {
+        "version": BENCHMARK_VERSION,
+        "seed": seed,
+        "holdout": holdout,
+        "intent": intent_benchmark(data, holdout, seed, matchers),
+        "language": language_benchmark(data, holdout, seed, min_time),
+        "greeting": greeting_benchmark(data, seed, min_time),
+    }
+
+
+def summary_metrics(result):
+    """Indicateurs principaux à plat, pour comparer deux résultats"""
+    flat = {}
+    for name, report in result["intent"]["matchers"].items():
+        for variant in PERTURBATIONS:
+            flat[f"intent.{name}.{variant}.accuracy"] = report[variant]["accuracy"]
+        flat[f"intent.{name}.queries_per_second"] = report["queries_per_second"]
+    flat["language.classifier.accuracy"] = result["language"]["classifier"]["accuracy"]
+    flat["language.classifier.queries_per_second"] = result["language"]["classifier"]["queries_per_second"]
+    flat["language.keywords.accuracy"] = result["language"]["keywords"]["accuracy"]
+    flat["language.keywords.queries_per_second"] = result["language"]["keywords"]["queries_per_second"]
+    flat["greeting.f1"] = result["greeting"]["f1"]
+    flat["greeting.queries_per_second"] = result["greeting"]["queries_per_second"]
+    return flat
+
+
+def compare(baseline, current):
+    """[(indicateur, avant, après, variation relative)]"""
+    before = summary_metrics(baseline)
+    after = summary_metrics(current)
+    rows = []
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key), after.get(key)
+        change = (new - old) / old if old and new is not None else None
+        rows.append((key, old, new, change))
+    return rows
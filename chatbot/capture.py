@@ -0,0 +1,193 @@
+"""Enregistrement des échanges du chatbot en JSONL, pour les rejouer.
+
+Avec ``CHATBOT_CAPTURE``, chaque appel à ``chat/`` ajoute une ligne
+à ``CHATBOT_CAPTURE_PATH`` : session anonymisée, message, langue,
+intention, durées par étape et réponse.
+
+La requête ne fait que déposer l'enregistrement dans une file. Un thread
+dédié le sérialise et écrit par paquets dans un fichier tamponné, vidé dès
+que la file reste vide ``FLUSH_INTERVAL`` secondes. Il fait aussi tourner
+le fichier au-delà de ``CHATBOT_CAPTURE_MAX_BYTES`` (``.1``, ``.2``...
+comme ``RotatingFileHandler``). Une file pleine fait abandonner
+l'enregistrement (compteur ``capture.dropped``) plutôt que de ralentir la
+réponse.
+
+Avec plusieurs workers, mettre ``{pid}`` dans le chemin pour que chacun
+écrive son propre fichier.
+"""
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_ENABLED = getattr(settings, "CHATBOT_CAPTURE", False)
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+_STOP = object()
+
+
+def get_capture_path():
+    return getattr(settings, "CHATBOT_CAPTURE_PATH", None) or os.path.join(
+        settings.BASE_DIR, "logs", "chatbot_requests.jsonl"
+    )
+
+
+def session_hash(session_key):
+    """Identifiant stable de la session, sans la clé elle-même"""
+    digest = hmac.new(settings.SECRET_KEY.encode("utf-8"), str(session_key).encode("utf-8"), hashlib.sha256)
+    return digest.hexdigest()[:16]
+
+
+class CaptureWriter:
+    """Écrit des enregistrements JSON, un par ligne, depuis un thread dédié"""
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backups=5,
+                 queue_size=QUEUE_SIZE, flush_interval=FLUSH_INTERVAL):
+        # Seul ``{pid}`` est remplacé : le chemin peut contenir d'autres accolades.
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+
+    def write(self, record):
+        """Dépose ``record`` sans jamais attendre le disque"""
+        self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            registry.increment("capture.dropped")
+
+    def close(self, timeout=5.0):
+        """Écrit ce qui reste dans la file et ferme le fichier"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="chatbot-capture", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self._file is not None:
+                    self._file.flush()
+                continue
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(record is _STOP for record in batch)
+            records = [record for record in batch if record is not _STOP]
+            try:
+                self._write(records)
+            except (OSError, TypeError, ValueError):
+                registry.increment("capture.failed", len(records))
+                logger.exception("Enregistrement des echanges en echec: %s", self.path)
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write(self, records):
+        if not records:
+            return
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        if self._file is not None and self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "ab")
+            self._size = self._file.tell()
+        self._file.write(data)
+        self._size += len(data)
+        registry.increment("capture.written", len(records))
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_capture_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = CaptureWriter(
+                    get_capture_path(),
+                    max_bytes=getattr(settings, "CHATBOT_CAPTURE_MAX_BYTES", 50 * 1024 * 1024),
+                    backups=getattr(settings, "CHATBOT_CAPTURE_BACKUPS", 5),
+                )
+    return _writer
+
+
+def capture_exchange(text, session_key, trace, reply):
+    """Enregistre un échange du chatbot si la capture est activée"""
+    if not CAPTURE_ENABLED:
+        return
+    summary = trace.summary() if trace is not None else {}
+    get_capture_writer().write({
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "session": session_hash(session_key),
+        "text": text,
+        "lang": summary.get("lang"),
+        "intent": summary.get("intent"),
+        "outcome": summary.get("outcome"),
+        "total_ms": summary.get("total_ms"),
+        "timings_ms": summary.get("timings_ms", {}),
+        "tokens": summary.get("tokens", {}),
+        "reply": reply,
+    })
+
+
+def read_captures(path):
+    """Enregistrements d'un fichier de capture (lignes invalides ignorées)"""
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get("text"):
+                yield record
@@ -1,45 +1,90 @@
-import os
-import json
+import contextvars
+import logging
 import re
-from difflib import get_close_matches
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-import cohere
-import httpx
-from blog.models import BlogPost
-from activities.models import Activity
-from members.models import Member
-
-def _require_ascii(value, name):
-    if value is None:
-        return None
-    if not isinstance(value, str):
-        value = str(value)
-    value = value.strip()
-    try:
-        value.encode("ascii")
-    except UnicodeEncodeError as exc:
-        raise ValueError(
-            f"{name} must contain only ASCII characters. "
-            f"Check your environment variable for hidden accents or spaces."
-        ) from exc
-    return value
-
-
-# Configure Cohere avec httpx client UTF-8
-httpx_client = httpx.Client(
-    headers={"Content-Type": "application/json; charset=utf-8"},
-    timeout=30.0
-)
-_cohere_api_key = _require_ascii(settings.COHERE_API_KEY, "COHERE_API_KEY")
-client = cohere.Client(
-    api_key=_cohere_api_key,
-    client_name="cjk-api",
-    httpx_client=httpx_client
-)
+from django.db import connections
+from .answer_cache import answer_cache
+from .coalesce import SingleFlight, flight_key, history_digest
+from .context import get_context_snapshot, with_passages
+from .dataset import get_dataset
+from .intent_index import IntentMatch
+from .keywords import SUPPORT_GREETING, THANKS, scan_keywords, strip_greetings
+from .metrics import finish_trace, record_usage, stage, start_trace
+from .prompt import prompt_history
+from .providers import build_provider
+from .rendered import get_rendered_answer
+from .resilience import CircuitBreaker, LLMUnavailable, ResilientCaller
+from .retrieval import get_content_store, retrieve
+from .sessions import get_session_store
+
+logger = logging.getLogger(__name__)
+
+
+# Appels identiques simultanés au LLM regroupés en un seul
+inflight = SingleFlight()
+
+# Budget de latence (secondes) par type d'appel au LLM
+LLM_BUDGETS = getattr(settings, "CHATBOT_LLM_BUDGETS", {
+    "language": 3.0,
+    "reformulate": 8.0,
+    "general": 12.0,
+})
+LLM_TIMEOUT = max(LLM_BUDGETS.values())
+
+# Le fournisseur du LLM (et le SDK Cohere lui-même) n'est construit qu'au
+# premier appel : les processus qui ne servent pas le chatbot (migrate,
+# workers d'administration) ne paient ni l'import ni la construction.
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Fournisseur du LLM (``CHATBOT_LLM_PROVIDER``) partagé par le processus"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider(timeout=LLM_TIMEOUT)
+    return _provider
+
+
+def set_provider(provider):
+    """Remplace le fournisseur du processus (rejeu, tests de charge)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
 COHERE_MODEL = getattr(settings, "COHERE_MODEL", "command-r-08-2024")
 
-# Session memory
-session_chats = {}
+
+def _record_discarded_usage(reply):
+    """Jetons de la requête doublée qui a perdu la course, facturée elle aussi"""
+    record_usage(reply.input_tokens, reply.output_tokens)
+
+
+# Disjoncteur et requêtes doublées autour de tous les appels au LLM
+llm_caller = ResilientCaller(
+    CircuitBreaker(
+        failure_threshold=getattr(settings, "CHATBOT_BREAKER_FAILURES", 5),
+        reset_timeout=getattr(settings, "CHATBOT_BREAKER_RESET", 30.0),
+    ),
+    hedge_min_delay=getattr(settings, "CHATBOT_LLM_HEDGE_MIN_DELAY", 1.0),
+    hedge=getattr(settings, "CHATBOT_LLM_HEDGE", True),
+    on_discarded=_record_discarded_usage,
+)
+# En dessous de cette confiance, la langue est demandée à Cohere.
+LANGUAGE_CONFIDENCE_THRESHOLD = getattr(settings, "CHATBOT_LANGUAGE_CONFIDENCE", 0.75)
+# Au-dessus de ce score (et de cette marge sur l'intention suivante), la
+# réponse du dataset est servie telle quelle, sans appel au LLM.
+DIRECT_ANSWER_MIN_SCORE = getattr(settings, "CHATBOT_DIRECT_ANSWER_SCORE", 0.9)
+DIRECT_ANSWER_MIN_MARGIN = getattr(settings, "CHATBOT_DIRECT_ANSWER_MARGIN", 0.15)
+# Threads partagés pour exécuter en parallèle les étapes indépendantes.
+PIPELINE_WORKERS = getattr(settings, "CHATBOT_PIPELINE_WORKERS", 8)
 
 EMPATHY_LINES = {
     "fr": "Merci pour votre message.",
@@ -55,6 +100,14 @@ CONTACT_LINES = {
     "sw": "Ikihitajika, timu ya CJK iko tayari kukusaidia."
 }
 
+# Réponse aux questions générales quand le LLM est indisponible
+UNAVAILABLE_RESPONSES = {
+    "fr": "Je ne peux pas repondre a cette question pour le moment.",
+    "rn": "Sinshoboye kwishura ico kibazo ubu.",
+    "en": "I cannot answer this question right now.",
+    "sw": "Siwezi kujibu swali hili kwa sasa."
+}
+
 GREETING_RESPONSES = {
     "fr": "Bonjour.\nComment puis-je vous aider aujourd'hui ?",
     "rn": "Namahoro.\nNdagufasha iki uyu munsi?",
@@ -63,119 +116,104 @@ GREETING_RESPONSES = {
 }
 
 
+SUPPORT_INTENT = "support_general"
+
+
 def load_json_dataset():
-    json_path = os.path.join(settings.BASE_DIR, "cjk_dataset.json")
-    with open(json_path, "r", encoding="utf-8") as file:
-        return json.load(file)
+    """Contenu du dataset, partagé par tout le processus (ne pas modifier)"""
+    return get_dataset().data
 
 
 def get_database_context():
     """Récupère les données publiques de la DB pour enrichir le contexte"""
-    context = {
-        "blog_posts": [],
-        "activities": [],
-        "members_count": Member.objects.filter(is_active_member=True).count()
-    }
-
-    posts = BlogPost.objects.filter(is_published=True)[:5]
-    for post in posts:
-        context["blog_posts"].append({
-            "title": post.title,
-            "author": post.author.get_full_name(),
-            "category": post.category.name if post.category else "Sans categorie"
-        })
-
-    activities = Activity.objects.filter(is_published=True)[:5]
-    for activity in activities:
-        context["activities"].append({
-            "title": activity.title,
-            "type": activity.get_activity_type_display(),
-            "date": activity.date_activite.strftime("%d/%m/%Y")
-        })
-
-    return context
-
-
-def find_intent(text):
+    return get_context_snapshot().context
+
+
+def resolve_match(text, support, best):
+    """Intention retenue à partir des correspondances ``support_general`` et générale
+
+    ``best`` n'est appelée que si la correspondance de support ne suffit pas.
+    """
+    if support:
+        keywords = scan_keywords((text or "").strip())
+        if keywords.has(SUPPORT_GREETING):
+            return support._replace(response_key="greeting")
+        elif keywords.has(THANKS):
+            return support._replace(response_key="thanks")
+
+    match = best()
+    if match:
+        return match
+
+    return IntentMatch("general_inquiry", None, 0.0, 0.0, None)
+
+
+def match_intent(text, dataset=None):
+    """Identifie l'intention avec son score et sa marge sur la suivante"""
+    index = (dataset or get_dataset()).index
+    support = index.best_match(text, cutoff=0.8, intent_name=SUPPORT_INTENT)
+    return resolve_match(text, support, lambda: index.best_match(text, cutoff=0.6))
+
+
+def find_intent(text, dataset=None):
     """Identifie l'intention de l'utilisateur"""
-    dataset = load_json_dataset()
-    intents = dataset.get("intents", [])
-
-    for intent_data in intents:
-        if intent_data["intent_name"] == "support_general":
-            for phrase in intent_data["training_phrases"]:
-                if get_close_matches(text.lower(), [phrase.lower()], n=1, cutoff=0.8):
-                    if any(word in text.lower() for word in ["bonjour", "salut", "hello", "mwaramutse"]):
-                        return "support_general", "greeting"
-                    elif any(word in text.lower() for word in ["merci", "murakoze", "thank"]):
-                        return "support_general", "thanks"
-
-    best_match_score = 0.6
-    matched_intent = None
-    matched_key = None
-
-    for intent_data in intents:
-        for phrase in intent_data["training_phrases"]:
-            matches = get_close_matches(text.lower(), [phrase.lower()], n=1, cutoff=best_match_score)
-            if matches:
-                matched_intent = intent_data["intent_name"]
-                if "responses" in intent_data:
-                    matched_key = list(intent_data["responses"].keys())[0]
-                return matched_intent, matched_key
-
-    return "general_inquiry", None
+    match = match_intent(text, dataset)
+    return match.intent_name, match.response_key
+
+
+def is_confident_match(match):
+    """Vrai si la réponse du dataset peut être servie sans reformulation"""
+    return (
+        match.score >= DIRECT_ANSWER_MIN_SCORE
+        and match.margin >= DIRECT_ANSWER_MIN_MARGIN
+    )
 
 
 def get_response_for_intent(intent_name, response_key, lang, dataset):
     """Récupère la réponse du dataset"""
-    for intent_data in dataset["intents"]:
-        if intent_data["intent_name"] == intent_name:
-            responses = intent_data["responses"]
-            if response_key and response_key in responses:
-                return responses[response_key].get(lang, "")
-            elif "default" in responses:
-                return responses["default"].get(lang, "")
-    return None
-
-
-def find_language(text, chat_history):
-    """Détecte la langue avec Cohere"""
-    prompt = "What is the language of this sentence: '" + str(text) + "'? Respond with only one word: 'French', 'English', 'Kirundi', or 'Swahili'."
+    return dataset.get_response(intent_name, response_key, lang)
 
-    try:
-        response = client.chat(
-            message=prompt,
-            model=COHERE_MODEL,
-            chat_history=[],  # Sans historique pour la détection
-            temperature=0.1
-        )
 
-        answer = str(response.text).strip().lower()
+def _language_request(text):
+    prompt = "What is the language of this sentence: '" + str(text) + "'? Respond with only one word: 'French', 'English', 'Kirundi', or 'Swahili'."
+    return dict(
+        message=prompt,
+        model=COHERE_MODEL,
+        chat_history=[],  # Sans historique pour la détection
+        temperature=0.1
+    )
 
-        if "french" in answer or "francais" in answer:
-            return "fr"
-        elif "kirundi" in answer:
-            return "rn"
-        elif "english" in answer or "anglais" in answer:
-            return "en"
-        elif "swahili" in answer:
-            return "sw"
-        return "fr"
-    except:
-        return "fr"  # Pas de logging
 
+def _parse_language_answer(text, default):
+    answer = str(text).strip().lower()
 
-def quick_language_guess(text):
-    t = (text or "").lower()
-    if any(w in t for w in ["bonjour", "salut", "merci", "svp", "s'il", "mais ", "pourquoi", "comment", "je "]):
+    if "french" in answer or "francais" in answer:
         return "fr"
-    if any(w in t for w in ["hello", "hi", "thanks", "please"]):
-        return "en"
-    if any(w in t for w in ["mwaramutse", "murakoze", "urakoze"]):
+    elif "kirundi" in answer:
         return "rn"
-    if any(w in t for w in ["habari", "asante", "tafadhali"]):
+    elif "english" in answer or "anglais" in answer:
+        return "en"
+    elif "swahili" in answer:
         return "sw"
-    return None
+    return default
+
+
+def find_language(text, chat_history, dataset=None):
+    """Détecte la langue localement, avec le LLM en dernier recours"""
+    guess = (dataset or get_dataset()).language_classifier.predict(text)
+    if guess.lang and guess.confidence >= LANGUAGE_CONFIDENCE_THRESHOLD:
+        return guess.lang
+
+    try:
+        response = _llm_chat("language", _language_request(text))
+        return _parse_language_answer(response.text, guess.lang or "fr")
+    except Exception:
+        logger.warning("Detection de langue par le LLM en echec", exc_info=True)
+        return guess.lang or "fr"
+
+
+def quick_language_guess(text):
+    return scan_keywords(text or "").language
 
 
 def _normalize_line(text):
@@ -183,94 +221,11 @@ def _normalize_line(text):
 
 
 def _is_greeting_only(text):
-    t = (text or "").strip().lower()
-    if not t:
-        return False
-    t_clean = re.sub(r"[^\w\s']+", " ", t)
-    t_clean = re.sub(r"\s+", " ", t_clean).strip()
-
-    greeting_phrases = {
-        "bonjour",
-        "salut",
-        "bonsoir",
-        "hello",
-        "hi",
-        "good morning",
-        "good afternoon",
-        "good evening",
-        "mwaramutse",
-        "namahoro",
-        "habari",
-        "hujambo",
-        "shikamoo",
-        "how are you",
-        "are you good",
-        "comment vas tu",
-        "comment vas tu?",
-        "comment allez vous",
-        "comment allez vous?",
-        "ca va",
-        "ça va",
-        "amakuru yawe",
-        "umeamkaje"
-    }
-    if t_clean in greeting_phrases:
-        return True
-
-    greeting_tokens = {
-        "bonjour",
-        "salut",
-        "bonsoir",
-        "hello",
-        "hi",
-        "good",
-        "morning",
-        "afternoon",
-        "evening",
-        "mwaramutse",
-        "namahoro",
-        "habari",
-        "hujambo",
-        "shikamoo",
-        "comment",
-        "vas",
-        "tu",
-        "allez",
-        "vous",
-        "ca",
-        "ça",
-        "va",
-        "how",
-        "are",
-        "you",
-        "are",
-        "good",
-        "amakuru",
-        "yawe",
-        "umeamkaje"
-    }
-    tokens = t_clean.split()
-    return bool(tokens) and all(tok in greeting_tokens for tok in tokens)
+    return scan_keywords((text or "").strip()).greeting_only
 
 
 def _strip_greetings(text):
-    t = (text or "").strip()
-    if not t:
-        return t
-    # Remove common greetings and "how are you" style openers
-    t = re.sub(
-        r"^(bonjour|salut|hello|hi|good morning|good afternoon|good evening|mwaramutse|namahoro|habari)[.!?\\s-]*",
-        "",
-        t,
-        flags=re.IGNORECASE,
-    )
-    t = re.sub(
-        r"^(comment allez-vous|comment tu vas|comment vas-tu|ca va|ça va|how are you|amakuru yawe|umeamkaje)[.!?\\s-]*",
-        "",
-        t,
-        flags=re.IGNORECASE,
-    )
-    return t.strip()
+    return strip_greetings(text)
 
 
 def _limit_sentences(text, max_sentences=2):
@@ -300,122 +255,309 @@ def _compose_reply(main_text, lang, add_contact=False):
     return "\n".join(lines)
 
 
+def _system_preamble(lang):
+    lang_full = user_language_to_full_name(lang)
+    return (
+        "Tu es l'assistant officiel du Centre Jeunes Kamenge (CJK). "
+        f"Reponds uniquement en {lang_full}. "
+        "Ne salue pas. Ne pose pas de questions. "
+        "Donne uniquement la reponse factuelle en 1 a 2 phrases. "
+        "N'ajoute pas d'informations qui ne sont pas dans le contexte."
+    )
+
+
+def _reformulation_request(reference, lang, question=None):
+    prompt = ""
+    if question:
+        prompt += f"Question: {question}\n"
+    prompt += (
+        f"Reponse de reference (a conserver sur le fond): {reference}\n"
+        "Reformule de maniere professionnelle et concise."
+    )
+    return dict(
+        message=prompt,
+        model=COHERE_MODEL,
+        preamble=_system_preamble(lang),
+        chat_history=[],
+        temperature=0.2,
+        max_tokens=300
+    )
+
+
+def _llm_chat(kind, request):
+    """Appel au LLM chronométré, jetons comptabilisés"""
+    with stage(f"llm.{kind}"):
+        reply = llm_caller.call(kind, lambda: get_provider().chat(request), LLM_BUDGETS.get(kind, LLM_TIMEOUT))
+    record_usage(reply.input_tokens, reply.output_tokens)
+    return reply
+
+
+def model_reformulation(reference, lang, question=None):
+    """Reformulation nettoyée du modèle, vide s'il n'a rien renvoyé d'utilisable"""
+    response = _llm_chat("reformulate", _reformulation_request(reference, lang, question))
+    with stage("postprocess"):
+        return _clean_model_answer(response.text, lang)
+
+
+def _reformulate(reference, lang, question):
+    return model_reformulation(reference, lang, question) or reference.strip()
+
+
+def reformulate_answer(reference, lang, question=None):
+    """Reformule une réponse de référence du dataset avec le LLM"""
+    key = flight_key("reformulate", question or "", lang, reference)
+    answer, _ = inflight.do(key, lambda: _reformulate(reference, lang, question))
+    return answer
+
+
+def _prepared_answer(match, dataset_response, lang, dataset):
+    """Réponse servie sans appel au LLM, ou None s'il faut reformuler"""
+    # Correspondance quasi exacte : la réponse de référence suffit.
+    if is_confident_match(match):
+        return dataset_response
+    # Version pré-générée par prerender_answers.
+    return get_rendered_answer(
+        match.intent_name,
+        dataset.resolve_response_key(match.intent_name, match.response_key),
+        lang,
+        dataset_response
+    )
+
+
+def _general_request(user_text, lang, context_block, history):
+    """Requête d'une question générale ; ``history`` vient de ``prompt_history``"""
+    prompt = f"Contexte: {context_block}\nQuestion: {user_text}\nReponse:"
+    return dict(
+        message=prompt,
+        model=COHERE_MODEL,
+        preamble=_system_preamble(lang),
+        chat_history=history,
+        temperature=0.3,
+        max_tokens=400
+    )
+
+
+def question_context(user_text, db_context):
+    """Contexte d'une question générale, avec les passages pertinents du contenu publié"""
+    with stage("retrieval"):
+        try:
+            passages = retrieve(user_text)
+        except Exception:
+            logger.warning("Recherche de passages en echec, contexte general utilise", exc_info=True)
+            passages = []
+    return with_passages(db_context, passages)
+
+
+def _answer_general(user_text, lang, db_context, history, history_key):
+    started = time.perf_counter()
+    response = _llm_chat("general", _general_request(user_text, lang, db_context.context_block, history))
+    with stage("postprocess"):
+        answer = _clean_model_answer(response.text, lang)
+    answer_cache.put(
+        user_text, lang, db_context.version, answer, (time.perf_counter() - started) * 1000, history_key
+    )
+    return answer
+
+
+def answer_general_inquiry(user_text, lang, db_context, chat_history):
+    """Réponse du LLM à une question hors dataset, avec le contexte BDD"""
+    db_context = question_context(user_text, db_context)
+    history = prompt_history(chat_history)
+    history_key = history_digest(history)
+    with stage("answer_cache"):
+        cached = answer_cache.get(user_text, lang, db_context.version, history_key)
+    if cached is not None:
+        return cached
+
+    key = flight_key("general", user_text, lang, db_context.version, history_key)
+    answer, _ = inflight.do(
+        key, lambda: _answer_general(user_text, lang, db_context, history, history_key)
+    )
+    return answer
+
+
 def start_new_chat(session_key):
     """Démarre une nouvelle session chat"""
-    session_chats[session_key] = []
-    return session_chats[session_key]
+    get_session_store().reset(session_key)
+    return []
 
 
 def get_chat(session_key):
-    """Récupère ou crée un chat"""
-    if session_key not in session_chats:
-        start_new_chat(session_key)
-    return session_chats[session_key]
+    """Récupère l'historique d'un chat (copie, vide pour un nouveau chat)"""
+    return get_session_store().get_history(session_key)
+
+
+def _remember(session_key, user_text, bot_response):
+    get_session_store().append(
+        session_key,
+        {"role": "USER", "message": user_text},
+        {"role": "CHATBOT", "message": bot_response},
+    )
+
+
+# Résultat des étapes préalables à la réponse. ``context`` vaut None
+# quand le dataset répond : le contexte BDD n'est alors pas chargé.
+Stages = namedtuple("Stages", ["language", "match", "context"])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="chatbot")
+    return _executor
+
+
+def _timed(name, func, *args):
+    with stage(name):
+        return func(*args)
+
+
+def _in_thread(func, *args):
+    # Les connexions BDD ouvertes dans un thread du pool lui appartiennent :
+    # on les ferme à la fin de l'étape.
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+def _submit(name, func, *args):
+    """Lance une étape chronométrée dans le pool, avec la trace du message"""
+    context = contextvars.copy_context()
+    return _get_executor().submit(context.run, _in_thread, _timed, name, func, *args)
+
+
+def _run_stages(user_text, chat_history, dataset, greeting=False):
+    """Langue, intention et contexte BDD, les étapes lentes en parallèle
+
+    La détection distante de la langue (si le mot-clé ne suffit pas) part
+    dans un thread pendant que l'intention est calculée ; le contexte BDD
+    n'est récupéré que si le dataset n'a pas de réponse pour l'intention,
+    lui aussi en parallèle de la détection de langue encore en cours.
+    """
+    user_language = quick_language_guess(user_text)
+    language_future = None
+    if user_language is None:
+        language_future = _submit("language", find_language, user_text, chat_history, dataset)
+
+    if greeting:
+        return Stages(user_language or language_future.result(), None, None)
+
+    match = _timed("intent", match_intent, user_text, dataset)
+    context = None
+    context_future = None
+    if dataset.resolve_response_key(match.intent_name, match.response_key) is None:
+        if language_future is None:
+            context = _timed("context", get_context_snapshot)
+        else:
+            context_future = _submit("context", get_context_snapshot)
+
+    if language_future is not None:
+        user_language = language_future.result()
+    if context_future is not None:
+        context = context_future.result()
+    return Stages(user_language, match, context)
 
 
 def send_message(text, session_key):
     """Logique principale du chatbot"""
+    trace = start_trace()
+    outcome = "error"
     chat_history = get_chat(session_key)
-    dataset = load_json_dataset()
+    dataset = get_dataset()
 
     try:
         user_text = (text or "").strip()
-        user_language = quick_language_guess(user_text) or find_language(user_text, chat_history)
-        if _is_greeting_only(user_text):
+        greeting = _is_greeting_only(user_text)
+        user_language, match, db_context = _run_stages(user_text, chat_history, dataset, greeting)
+        trace.language = user_language
+        if greeting:
+            outcome = "greeting"
             bot_response = GREETING_RESPONSES.get(user_language, GREETING_RESPONSES["fr"])
-            chat_history.append({"role": "USER", "message": user_text})
-            chat_history.append({"role": "CHATBOT", "message": bot_response})
+            _remember(session_key, user_text, bot_response)
             return bot_response
-        intent_name, response_key = find_intent(user_text)
-        db_context = get_database_context()
-        dataset_response = get_response_for_intent(intent_name, response_key, user_language, dataset)
-
-        lang_full = {"fr": "francais", "rn": "kirundi", "en": "anglais", "sw": "swahili"}.get(
-            user_language, "francais"
-        )
-
-        system_preamble = (
-            "Tu es l'assistant officiel du Centre Jeunes Kamenge (CJK). "
-            f"Reponds uniquement en {lang_full}. "
-            "Ne salue pas. Ne pose pas de questions. "
-            "Donne uniquement la reponse factuelle en 1 a 2 phrases. "
-            "N'ajoute pas d'informations qui ne sont pas dans le contexte."
-        )
+        trace.intent = match.intent_name
+        dataset_response = get_response_for_intent(match.intent_name, match.response_key, user_language, dataset)
 
         # Si on a une réponse du dataset, on la reformule en style pro
         # en restant strictement dans la langue.
         if dataset_response:
-            prompt = (
-                f"Question: {user_text}\n"
-                f"Reponse de reference (a conserver sur le fond): {dataset_response}\n"
-                "Reformule de maniere professionnelle et concise."
-            )
-            response = client.chat(
-                message=prompt,
-                model=COHERE_MODEL,
-                preamble=system_preamble,
-                chat_history=[],
-                temperature=0.2,
-                max_tokens=300
-            )
-            main_answer = _clean_model_answer(response.text, user_language)
-            if not main_answer:
-                main_answer = dataset_response.strip()
+            outcome = "dataset"
+            main_answer = _prepared_answer(match, dataset_response, user_language, dataset)
+            if main_answer is None:
+                outcome = "reformulated"
+                try:
+                    main_answer = reformulate_answer(dataset_response, user_language, question=user_text)
+                except Exception:
+                    # LLM indisponible : la réponse de référence fait l'affaire.
+                    logger.warning("Reformulation impossible, reponse du dataset servie", exc_info=True)
+                    outcome = "fallback"
+                    main_answer = dataset_response
             bot_response = _compose_reply(
                 main_answer,
                 user_language,
                 add_contact=False
             )
-            chat_history.append({"role": "USER", "message": user_text})
-            chat_history.append({"role": "CHATBOT", "message": bot_response})
+            _remember(session_key, user_text, bot_response)
             return bot_response
 
-        # Contexte condensé
-        posts = "; ".join(
-            f"{p['title']} ({p['author']}, {p['category']})" for p in db_context.get("blog_posts", [])
-        )
-        activities = "; ".join(
-            f"{a['title']} ({a['type']}, {a['date']})" for a in db_context.get("activities", [])
-        )
-        context_lines = [
-            f"Membres actifs: {db_context.get('members_count', 0)}.",
-        ]
-        if posts:
-            context_lines.append(f"Articles recents: {posts}.")
-        if activities:
-            context_lines.append(f"Activites recentes: {activities}.")
-        context_block = " ".join(context_lines)
-
-        prompt = f"Contexte: {context_block}\nQuestion: {user_text}\nReponse:"
-
-        response = client.chat(
-            message=prompt,
-            model=COHERE_MODEL,
-            preamble=system_preamble,
-            chat_history=chat_history[-6:],
-            temperature=0.3,
-            max_tokens=400
-        )
-
-        main_answer = _clean_model_answer(response.text, user_language)
+        # Réponse vide dans cette langue : le contexte n'a pas été chargé.
+        if db_context is None:
+            db_context = _timed("context", get_context_snapshot)
+        try:
+            main_answer = answer_general_inquiry(user_text, user_language, db_context, chat_history)
+            outcome = "general"
+        except LLMUnavailable:
+            outcome = "fallback"
+            main_answer = UNAVAILABLE_RESPONSES.get(user_language, UNAVAILABLE_RESPONSES["fr"])
         bot_response = _compose_reply(
             main_answer,
             user_language,
             add_contact=True
         )
-        chat_history.append({"role": "USER", "message": user_text})
-        chat_history.append({"role": "CHATBOT", "message": bot_response})
+        _remember(session_key, user_text, bot_response)
 
         return bot_response
 
-    except Exception as e:
-        import traceback
-        print("=" * 50)
-        print("ERREUR:", str(e))
-        traceback.print_exc()
-        print("=" * 50)
+    except Exception:
+        outcome = "error"
+        logger.exception("Erreur du chatbot")
         return f"Desole, une erreur s'est produite. Veuillez reessayer."
 
+    finally:
+        finish_trace(trace, outcome)
+
+
+_warmed_up = threading.Event()
+
+
+def warm_up():
+    """Prépare le processus avant le premier message (dataset, index, connexion au LLM)"""
+    with stage("warmup"):
+        dataset = get_dataset()
+        # Un premier passage charge les pages de l'index et du classifieur.
+        dataset.index.best_match("bonjour")
+        dataset.language_classifier.predict("bonjour")
+        try:
+            get_content_store().search("bonjour", 1)
+        except Exception:
+            logger.warning("Index du contenu non prepare", exc_info=True)
+        try:
+            get_provider().warm_up()
+        except Exception:
+            logger.warning("Connexion au LLM non preparee", exc_info=True)
+    _warmed_up.set()
+    return dataset
+
+
+def is_warm():
+    return _warmed_up.is_set()
+
 
 def user_language_to_full_name(lang_code):
     return {"fr": "francais", "rn": "kirundi", "en": "anglais", "sw": "swahili"}.get(lang_code, "francais")
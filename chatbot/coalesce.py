@@ -0,0 +1,97 @@
+"""Regroupement des appels identiques simultanés au LLM (« single flight »).
+
+Quand plusieurs utilisateurs posent la même question au même moment, un
+seul appel part : les suivants attendent son résultat au lieu d'envoyer
+la même requête. La clé couvre tout ce qui détermine la réponse (question
+normalisée, langue, version du contexte, historique envoyé au modèle),
+donc deux sessions dont l'historique diffère ne partagent jamais un appel.
+Seule la réponse nettoyée est partagée ; chaque session enregistre ensuite
+son propre message dans son historique.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+
+from .intent_index import normalize_phrase
+from .metrics import registry
+
+
+def normalize_question(text):
+    return normalize_phrase(text).rstrip(" ?!.")
+
+
+def history_digest(chat_history):
+    payload = json.dumps(chat_history or [], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def flight_key(kind, question, lang, *parts):
+    payload = json.dumps([kind, normalize_question(question), lang, *parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Un seul appel en cours par clé entre les threads du processus"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Renvoie (résultat, partagé)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            registry.increment("singleflight.shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """Équivalent asynchrone : les tâches d'une même boucle partagent l'appel"""
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, factory):
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        if task is not None and task.get_loop() is loop:
+            registry.increment("singleflight.shared")
+            # shield : l'annulation d'un demandeur n'interrompt pas l'appel commun.
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(factory())
+        self._tasks[key] = task
+
+        def _forget(finished):
+            if self._tasks.get(key) is finished:
+                del self._tasks[key]
+
+        task.add_done_callback(_forget)
+        return await asyncio.shield(task), False
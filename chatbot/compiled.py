@@ -0,0 +1,305 @@
+"""Artefact compilé du dataset : tout ce qu'il faut pour répondre, prêt à l'emploi.
+
+La commande ``compile_dataset`` écrit ``cjk_dataset.compiled`` à côté du
+dataset. Le fichier ne contient que des tableaux de nombres et du texte
+UTF-8 (aucun pickle) :
+
+- un en-tête : ``MAGIC``, longueur de l'en-tête JSON, puis l'en-tête JSON
+  (version du format, empreinte du dataset source, table des intentions,
+  réponses par langue, log-probabilités a priori du classifieur de
+  langue, position de chaque section) ;
+- des sections alignées sur 4 octets : en ``uint32`` petit-boutistes, la
+  table des phrases (décalages dans le texte UTF-8), l'intention et le
+  nombre de n-grammes de chaque phrase, les n-grammes triés par empreinte
+  crc32 et leurs listes d'affichage ; par langue, les n-grammes de
+  caractères du classifieur (séparés par ``\n``) et leurs
+  log-probabilités en ``float64`` petit-boutistes.
+
+Avec un artefact à jour, le chargement du dataset ne reconstruit ni
+l'index ni le classifieur de langue.
+
+Le fichier est projeté en mémoire (``mmap``) en lecture seule et l'index
+lit directement dans la projection : les workers gunicorn partagent les
+mêmes pages du cache disque au lieu de construire chacun leur copie.
+
+Un artefact dont l'empreinte ne correspond plus au dataset est ignoré.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from .intent_index import IntentIndex, canonical_phrase, normalize_phrase
+from .language import LanguageClassifier
+
+MAGIC = b"CJKDSET\x00"
+FORMAT_VERSION = 3
+
+_length = struct.Struct("<I")
+_swap = sys.byteorder != "little"
+
+
+def _uint32(values):
+    data = array("I", values)
+    if _swap:
+        data.byteswap()
+    return data.tobytes()
+
+
+def _read_uint32(buffer):
+    data = array("I")
+    data.frombytes(buffer)
+    if _swap:
+        data.byteswap()
+    return data
+
+
+def _float64(values):
+    data = array("d", values)
+    if _swap:
+        data.byteswap()
+    return data.tobytes()
+
+
+def _read_float64(buffer):
+    data = array("d")
+    data.frombytes(buffer)
+    if _swap:
+        data.byteswap()
+    return data
+
+
+def _gram_hash(gram):
+    return zlib.crc32(gram.encode("utf-8"))
+
+
+def _text_table(texts):
+    """(texte UTF-8 concaténé, décalages de début et de fin)"""
+    blob = bytearray()
+    offsets = [0]
+    for text in texts:
+        blob += text.encode("utf-8")
+        offsets.append(len(blob))
+    return bytes(blob), offsets
+
+
+class _TextTable:
+    """Chaînes lues à la demande dans un texte UTF-8 concaténé"""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+def compile_index(data):
+    """Index des phrases canoniques, et rapport de la déduplication"""
+    index = IntentIndex.from_dataset(data)
+    normalized = set()
+    owners = defaultdict(set)
+    total = 0
+    for intent_data in data.get("intents", []):
+        for phrase in intent_data.get("training_phrases", []):
+            total += 1
+            normalized.add(normalize_phrase(phrase))
+            owners[canonical_phrase(phrase)].add(intent_data["intent_name"])
+    report = {
+        "intents": len(index.intents),
+        "phrases": total,
+        "duplicates": total - len(normalized),
+        "templated": len(normalized) - len(owners),
+        "conflicts": sorted(phrase for phrase, intents in owners.items() if len(intents) > 1),
+        "compiled": len(index),
+    }
+    report["collapsed"] = total - len(index)
+    return index, report
+
+
+def write_compiled(path, data, checksum):
+    """Compile ``data`` et écrit l'artefact de façon atomique"""
+    index, report = compile_index(data)
+    log_probs, log_unseen, log_priors = LanguageClassifier.from_dataset(data).tables()
+    # Triés par empreinte pour une recherche dichotomique dans le fichier.
+    grams = sorted(index.postings, key=lambda gram: (_gram_hash(gram), gram))
+    phrase_text, phrase_offsets = _text_table(index.phrases)
+    gram_text, gram_offsets = _text_table(grams)
+    posting_offsets = [0]
+    postings = []
+    for gram in grams:
+        postings.extend(index.postings[gram])
+        posting_offsets.append(len(postings))
+
+    sections = [
+        ("phrase_text", phrase_text),
+        ("phrase_offsets", _uint32(phrase_offsets)),
+        ("phrase_intents", _uint32(index.phrase_intents)),
+        ("phrase_sizes", _uint32(index.phrase_sizes)),
+        ("gram_hashes", _uint32(_gram_hash(gram) for gram in grams)),
+        ("gram_text", gram_text),
+        ("gram_offsets", _uint32(gram_offsets)),
+        ("posting_offsets", _uint32(posting_offsets)),
+        ("postings", _uint32(postings)),
+    ]
+    for lang, features in log_probs.items():
+        sections.append((f"language_features_{lang}", "\n".join(features).encode("utf-8")))
+        sections.append((f"language_log_probs_{lang}", _float64(features.values())))
+    header = {
+        "version": FORMAT_VERSION,
+        "source": checksum,
+        "intents": [list(intent) for intent in index.intents],
+        "responses": {
+            intent_data["intent_name"]: intent_data.get("responses") or {}
+            for intent_data in data.get("intents", [])
+        },
+        "language": {"unseen": log_unseen, "priors": log_priors},
+        "sections": {},
+    }
+    # Les positions dépendent de la taille de l'en-tête : on les calcule
+    # relativement à la fin de l'en-tête, aligné sur 4 octets.
+    offset = 0
+    for name, payload in sections:
+        header["sections"][name] = [offset, len(payload)]
+        offset += len(payload) + (-len(payload) % 4)
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(len(MAGIC) + _length.size + len(header_bytes)) % 4)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(_length.pack(len(header_bytes)))
+        file.write(header_bytes)
+        for _, payload in sections:
+            file.write(payload)
+            file.write(b"\x00" * (-len(payload) % 4))
+    os.replace(tmp_path, path)
+    report["bytes"] = os.path.getsize(path)
+    report["language_features"] = sum(len(features) for features in log_probs.values())
+    report["grams"] = len(grams)
+    return report
+
+
+class MappedPostings:
+    """Listes d'affichage lues dans l'artefact, indexées par n-gramme"""
+
+    def __init__(self, hashes, grams, offsets, postings):
+        self._hashes = hashes
+        self._grams = grams
+        self._offsets = offsets
+        self._postings = postings
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def get(self, gram, default=None):
+        value = _gram_hash(gram)
+        i = bisect_left(self._hashes, value)
+        # Deux n-grammes peuvent partager une empreinte : on compare le texte.
+        while i < len(self._hashes) and self._hashes[i] == value:
+            if self._grams[i] == gram:
+                return self._postings[self._offsets[i]:self._offsets[i + 1]]
+            i += 1
+        return default
+
+
+class MappedIntentIndex(IntentIndex):
+    """``IntentIndex`` en lecture seule adossé aux sections de l'artefact"""
+
+    def __init__(self, intents, phrases, phrase_intents, phrase_sizes, postings):
+        self.intents = intents
+        self.phrases = phrases
+        self.phrase_intents = phrase_intents
+        self.phrase_sizes = phrase_sizes
+        self.postings = postings
+
+    def add_phrase(self, intent_id, phrase):
+        raise TypeError("Index compile en lecture seule")
+
+
+class CompiledDataset:
+    """Contenu d'un artefact compilé"""
+
+    def __init__(self, header, index, language_classifier):
+        self.header = header
+        self.source = header["source"]
+        self.responses = header["responses"]
+        self.index = index
+        self.language_classifier = language_classifier
+
+
+def read_header(buffer):
+    """(en-tête, début des sections) ; ``ValueError`` si le format n'est pas reconnu"""
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Artefact compile: signature inconnue")
+    (header_size,) = _length.unpack_from(buffer, len(MAGIC))
+    start = len(MAGIC) + _length.size
+    header = json.loads(bytes(buffer[start:start + header_size]).decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError("Artefact compile: version de format inconnue")
+    return header, start + header_size
+
+
+def read_compiled(buffer, header=None, base=None):
+    """Index lisant directement ``buffer`` (bytes ou projection mmap)"""
+    buffer = memoryview(buffer)
+    if header is None:
+        header, base = read_header(buffer)
+
+    def section(name):
+        offset, size = header["sections"][name]
+        return buffer[base + offset:base + offset + size]
+
+    def uint32_section(name):
+        # Sans copie sur les machines petit-boutistes (x86, ARM).
+        if _swap:
+            return _read_uint32(section(name))
+        return section(name).cast("I")
+
+    index = MappedIntentIndex(
+        [tuple(intent) for intent in header["intents"]],
+        _TextTable(section("phrase_text"), uint32_section("phrase_offsets")),
+        uint32_section("phrase_intents"),
+        uint32_section("phrase_sizes"),
+        MappedPostings(
+            uint32_section("gram_hashes"),
+            _TextTable(section("gram_text"), uint32_section("gram_offsets")),
+            uint32_section("posting_offsets"),
+            uint32_section("postings"),
+        ),
+    )
+    # Les tables du classifieur sont des dictionnaires : construits une fois, sans réentraînement.
+    language = header["language"]
+    log_probs = {}
+    for lang in language["priors"]:
+        features = bytes(section(f"language_features_{lang}")).decode("utf-8")
+        values = _read_float64(section(f"language_log_probs_{lang}"))
+        log_probs[lang] = dict(zip(features.split("\n"), values)) if features else {}
+    classifier = LanguageClassifier.from_tables(log_probs, language["unseen"], language["priors"])
+    return CompiledDataset(header, index, classifier)
+
+
+def load_compiled(path, checksum=None):
+    """Artefact de ``path`` projeté en mémoire, s'il correspond au dataset"""
+    try:
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        header, base = read_header(mapped)
+        if checksum is not None and header["source"] != checksum:
+            mapped.close()
+            return None
+        return read_compiled(mapped, header, base)
+    except (ValueError, KeyError, TypeError, struct.error):
+        mapped.close()
+        return None
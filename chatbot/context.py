@@ -0,0 +1,158 @@
+"""Contexte de la base de données fourni au LLM pour les questions générales.
+
+Le contexte (membres actifs, derniers articles, dernières activités) et
+sa version condensée ``context_block`` sont calculés une fois puis gardés
+dans le cache Django. Les signaux de ``chatbot.signals`` les invalident
+quand un article, une activité ou un membre change, une fois la
+transaction validée ; le prochain message les reconstruit. Avec un cache chaud, un message ne coûte aucune requête.
+
+Pour que l'invalidation atteigne tous les workers, ``CHATBOT_CONTEXT_CACHE``
+doit désigner un cache partagé ; ``CHATBOT_CONTEXT_TTL`` borne de toute
+façon l'âge du contexte.
+"""
+import hashlib
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from activities.models import Activity
+from blog.models import BlogPost
+from members.models import Member
+
+CONTEXT_CACHE_KEY = "chatbot:db_context"
+CONTEXT_TTL = getattr(settings, "CHATBOT_CONTEXT_TTL", 5 * 60)
+
+# ``version`` identifie le contenu du contexte : elle change dès que le
+# texte envoyé au LLM change.
+ContextSnapshot = namedtuple("ContextSnapshot", ["context", "context_block", "version"])
+
+_build_lock = threading.Lock()
+
+
+def get_context_cache():
+    return caches[getattr(settings, "CHATBOT_CONTEXT_CACHE", "default")]
+
+
+def get_counter(key):
+    """Compteur de version partagé par les workers"""
+    return get_context_cache().get(key, 0)
+
+
+def bump_counter(key):
+    cache = get_context_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Clé évincée entre add et incr : la relecture périodique rattrape.
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def _context_querysets():
+    members = Member.objects.filter(is_active_member=True)
+    posts = BlogPost.objects.filter(is_published=True).select_related("author", "category")[:5]
+    activities = Activity.objects.filter(is_published=True)[:5]
+    return members, posts, activities
+
+
+def serialize_context(members_count, posts, activities):
+    context = {
+        "blog_posts": [],
+        "activities": [],
+        "members_count": members_count
+    }
+
+    for post in posts:
+        context["blog_posts"].append({
+            "title": post.title,
+            "author": post.author.get_full_name(),
+            "category": post.category.name if post.category else "Sans categorie"
+        })
+
+    for activity in activities:
+        context["activities"].append({
+            "title": activity.title,
+            "type": activity.get_activity_type_display(),
+            "date": activity.date_activite.strftime("%d/%m/%Y")
+        })
+
+    return context
+
+
+def format_context_block(db_context, passages=None):
+    """Contexte condensé ; ``passages`` (de ``retrieval``) remplace les derniers articles et activités"""
+    context_lines = [
+        f"Membres actifs: {db_context.get('members_count', 0)}.",
+    ]
+    if passages:
+        context_lines.append("Sources: " + " | ".join(passage.format() for passage in passages))
+        return " ".join(context_lines)
+    posts = "; ".join(
+        f"{p['title']} ({p['author']}, {p['category']})" for p in db_context.get("blog_posts", [])
+    )
+    activities = "; ".join(
+        f"{a['title']} ({a['type']}, {a['date']})" for a in db_context.get("activities", [])
+    )
+    if posts:
+        context_lines.append(f"Articles recents: {posts}.")
+    if activities:
+        context_lines.append(f"Activites recentes: {activities}.")
+    return " ".join(context_lines)
+
+
+def _snapshot(context, passages=None):
+    block = format_context_block(context, passages)
+    version = hashlib.sha256(block.encode("utf-8")).hexdigest()[:12]
+    return ContextSnapshot(context, block, version)
+
+
+def with_passages(snapshot, passages):
+    """Contexte propre à une question, avec les passages retenus pour elle"""
+    if not passages:
+        return snapshot
+    return _snapshot(snapshot.context, passages)
+
+
+def build_context_snapshot():
+    """Interroge la base (trois requêtes)"""
+    members, posts, activities = _context_querysets()
+    return _snapshot(serialize_context(members.count(), list(posts), list(activities)))
+
+
+async def abuild_context_snapshot():
+    members, posts, activities = _context_querysets()
+    return _snapshot(serialize_context(
+        await members.acount(),
+        [post async for post in posts],
+        [activity async for activity in activities],
+    ))
+
+
+def get_context_snapshot():
+    """Contexte courant, depuis le cache si possible"""
+    cache = get_context_cache()
+    snapshot = cache.get(CONTEXT_CACHE_KEY)
+    if snapshot is None:
+        # Un seul thread reconstruit ; les autres réutilisent son résultat.
+        with _build_lock:
+            snapshot = cache.get(CONTEXT_CACHE_KEY)
+            if snapshot is None:
+                snapshot = build_context_snapshot()
+                cache.set(CONTEXT_CACHE_KEY, snapshot, CONTEXT_TTL)
+    return snapshot
+
+
+async def aget_context_snapshot():
+    cache = get_context_cache()
+    snapshot = await cache.aget(CONTEXT_CACHE_KEY)
+    if snapshot is None:
+        snapshot = await abuild_context_snapshot()
+        await cache.aset(CONTEXT_CACHE_KEY, snapshot, CONTEXT_TTL)
+    return snapshot
+
+
+def invalidate_context():
+    get_context_cache().delete(CONTEXT_CACHE_KEY)
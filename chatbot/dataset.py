@@ -0,0 +1,177 @@
+"""Dataset du chatbot chargé une seule fois par processus.
+
+Le fichier ``cjk_dataset.json`` (comme les artefacts qui l'accompagnent)
+est lu au premier accès puis surveillé :
+quand sa date de modification ou sa taille change, il est relu et, si son
+contenu a réellement changé, un nouvel instantané remplace l'ancien d'un
+seul coup. Les requêtes en cours gardent l'instantané qu'elles ont obtenu.
+
+Si ``compile_dataset`` a produit un artefact compilé à jour pour ce
+contenu, l'index des phrases, les réponses et le classifieur de langue en
+sont chargés au lieu d'être reconstruits. L'artefact est surveillé comme
+le dataset : recompilé, il est pris en compte sans attendre que le JSON
+change.
+
+Avec ``CHATBOT_INTENT_SOURCE = 'database'``, les intentions viennent
+de la base (voir ``intent_store``) et non plus du fichier.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .compiled import load_compiled
+from .intent_index import IntentIndex
+from .language import LanguageClassifier
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal (en secondes) entre deux vérifications du fichier.
+CHECK_INTERVAL = 2.0
+
+
+def get_dataset_path():
+    return getattr(settings, "CHATBOT_DATASET_PATH", None) or os.path.join(settings.BASE_DIR, "cjk_dataset.json")
+
+
+def get_compiled_path():
+    base, _ = os.path.splitext(get_dataset_path())
+    return f"{base}.compiled"
+
+
+class ChatbotDataset:
+    """Instantané immuable du dataset et des structures qui en dérivent"""
+
+    def __init__(self, data, checksum, index=None, language_classifier=None):
+        self.data = data
+        self.checksum = checksum
+        compiled = load_compiled(get_compiled_path(), checksum) if index is None else None
+        if compiled is not None:
+            self.responses = compiled.responses
+            self.index = compiled.index
+            self.language_classifier = language_classifier or compiled.language_classifier
+            return
+        self.responses = {}
+        for intent_data in data.get("intents", []):
+            self.responses.setdefault(intent_data["intent_name"], intent_data.get("responses") or {})
+        self.index = index or IntentIndex.from_dataset(data)
+        self.language_classifier = language_classifier or LanguageClassifier.from_dataset(data)
+
+    def resolve_response_key(self, intent_name, response_key):
+        """Clé de réponse réellement utilisée (la clé demandée ou ``default``)"""
+        responses = self.responses.get(intent_name)
+        if responses is None:
+            return None
+        if response_key and response_key in responses:
+            return response_key
+        elif "default" in responses:
+            return "default"
+        return None
+
+    def get_response(self, intent_name, response_key, lang):
+        resolved_key = self.resolve_response_key(intent_name, response_key)
+        if resolved_key is None:
+            return None
+        return self.responses[intent_name][resolved_key].get(lang, "")
+
+
+class DatasetStore:
+    """Détient l'instantané d'un fichier et le recharge quand il change
+
+    ``loader`` reçoit le contenu décodé et sa somme de contrôle et construit
+    l'instantané. Si ``required`` est faux, un fichier absent donne ``None``.
+    Quand l'un des fichiers de ``companions`` (lus par ``loader``) apparaît,
+    change ou disparaît, l'instantané est reconstruit même si le contenu du
+    fichier principal n'a pas changé.
+    """
+
+    def __init__(self, path, loader, required=True, check_interval=CHECK_INTERVAL, companions=()):
+        self.path = path
+        self.loader = loader
+        self.required = required
+        self.check_interval = check_interval
+        self.companions = tuple(companions)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._snapshot = None
+        self._stat = None
+        self._checksum = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if not self._loaded or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if not self._loaded or now - self._checked_at >= self.check_interval:
+                    self._refresh()
+                    self._loaded = True
+                    self._checked_at = time.monotonic()
+        return self._snapshot
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self.required:
+                raise
+            self._snapshot = self._stat = self._checksum = None
+            return
+        signature = (
+            (stat.st_mtime_ns, stat.st_size),
+            tuple(self._signature(path) for path in self.companions),
+        )
+        if self._loaded and signature == self._stat:
+            return
+
+        with open(self.path, "rb") as file:
+            raw = file.read()
+        checksum = hashlib.sha256(raw).hexdigest()
+        companions_unchanged = self._stat is not None and signature[1] == self._stat[1]
+        if self._loaded and checksum == self._checksum and companions_unchanged:
+            self._stat = signature
+            return
+
+        try:
+            snapshot = self.loader(json.loads(raw.decode("utf-8")), checksum)
+        except ValueError:
+            if self._snapshot is None and self.required:
+                raise
+            # Fichier en cours d'écriture ou invalide : on garde l'ancien.
+            logger.exception("Fichier chatbot invalide, rechargement ignore: %s", self.path)
+            return
+
+        self._snapshot = snapshot
+        self._stat = signature
+        self._checksum = checksum
+        logger.info("Fichier chatbot charge: %s", self.path)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_dataset():
+    """Instantané courant du dataset pour tout le processus"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if getattr(settings, "CHATBOT_INTENT_SOURCE", "file") == "database":
+                    from .intent_store import DatabaseIntentStore
+
+                    _store = DatabaseIntentStore()
+                else:
+                    _store = DatasetStore(get_dataset_path(), ChatbotDataset, companions=[get_compiled_path()])
+    return _store.get()
@@ -0,0 +1,201 @@
+"""Faux LLM pour les tests de charge, sans réseau ni quota.
+
+``FakeLLM`` simule le comportement observé de Cohere :
+
+- délai avant le premier jeton tiré d'une loi log-normale réglée par sa
+  médiane et son p95 ;
+- puis un débit de génération en jetons par seconde ;
+- une proportion d'appels en erreur.
+
+Il est utilisé tel quel par ``FakeProvider`` (``CHATBOT_LLM_PROVIDER=fake``)
+ou derrière ``FakeLLMServer``, qui répond comme l'API Cohere v1
+(``POST /v1/chat``, JSON ou flux de lignes JSON) : avec
+``CHATBOT_LLM_BASE_URL`` pointé dessus, le vrai client Cohere est mesuré
+avec ses connexions HTTP.
+"""
+import json
+import logging
+import math
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+from .prompt import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Quantile 95 de la loi normale centrée réduite.
+_Z95 = 1.6449
+
+_token_re = re.compile(r"\S+\s*")
+
+FAKE_ANSWERS = [
+    "Le Centre Jeunes Kamenge accueille les jeunes de tous les quartiers pour des activites sportives, "
+    "culturelles et de formation. Passez nous voir pour en savoir plus.",
+    "Les inscriptions se font directement au centre, du lundi au samedi. "
+    "Pensez a apporter une piece d'identite.",
+    "Le centre organise regulierement des ateliers pour la paix et la reconciliation. "
+    "Le programme est affiche a l'accueil et publie dans nos actualites.",
+]
+
+
+class FakeLLMError(Exception):
+    """Erreur simulée par le faux LLM"""
+
+
+class FakeLLM:
+    """Générateur de réponses, de latences et d'erreurs simulées"""
+
+    def __init__(self, latency_median=0.8, latency_p95=2.0, tokens_per_second=40.0, error_rate=0.0, seed=None):
+        self.latency_median = latency_median
+        self.latency_p95 = max(latency_p95, latency_median)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._sigma = math.log(self.latency_p95 / latency_median) / _Z95 if latency_median > 0 else 0.0
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            latency_median=getattr(settings, "CHATBOT_FAKE_LLM_LATENCY", 0.8),
+            latency_p95=getattr(settings, "CHATBOT_FAKE_LLM_LATENCY_P95", 2.0),
+            tokens_per_second=getattr(settings, "CHATBOT_FAKE_LLM_TOKENS_PER_SECOND", 40.0),
+            error_rate=getattr(settings, "CHATBOT_FAKE_LLM_ERROR_RATE", 0.0),
+        )
+
+    @property
+    def token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def first_token_delay(self):
+        """Délai avant le premier jeton (secondes)"""
+        if self.latency_median <= 0:
+            return 0.0
+        return self._random.lognormvariate(math.log(self.latency_median), self._sigma)
+
+    def generation_time(self, text):
+        return len(self.tokens(text)) * self.token_delay
+
+    def failed(self):
+        return self._random.random() < self.error_rate
+
+    def check_error(self):
+        if self.failed():
+            raise FakeLLMError("Erreur simulee du faux LLM")
+
+    def tokens(self, text):
+        return _token_re.findall(text)
+
+    def reply_text(self, request):
+        message = request.get("message", "")
+        if message.startswith("What is the language"):
+            return "French"
+        # Même question, même réponse : le cache et le regroupement restent mesurables.
+        return FAKE_ANSWERS[sum(message.encode("utf-8")) % len(FAKE_ANSWERS)]
+
+    def usage(self, request, text):
+        """(jetons d'entrée, jetons de sortie) estimés comme pour l'historique"""
+        prompt = [request.get("preamble") or "", request.get("message", "")]
+        prompt.extend(turn.get("message", "") for turn in request.get("chat_history") or [])
+        return sum(count_tokens(part) for part in prompt), count_tokens(text)
+
+    def response(self, request, text):
+        """Corps d'une réponse ``/v1/chat`` non diffusée"""
+        input_tokens, output_tokens = self.usage(request, text)
+        units = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+        return {
+            "response_id": str(uuid.uuid4()),
+            "generation_id": str(uuid.uuid4()),
+            "text": text,
+            "chat_history": [],
+            "finish_reason": "COMPLETE",
+            "meta": {"api_version": {"version": "1"}, "billed_units": units, "tokens": units},
+        }
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeCohere/1.0"
+
+    @property
+    def llm(self):
+        return self.server.llm
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat", "/chat"):
+            self._send_json(404, {"message": f"not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"message": "invalid JSON body"})
+            return
+
+        if self.llm.failed():
+            self._send_json(self.server.error_status, {"message": "simulated error"})
+            return
+        text = self.llm.reply_text(request)
+        time.sleep(self.llm.first_token_delay())
+        if request.get("stream"):
+            self._stream(request, text)
+        else:
+            time.sleep(self.llm.generation_time(text))
+            self._send_json(200, self.llm.response(request, text))
+
+    def _stream(self, request, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/stream+json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        response = self.llm.response(request, text)
+        try:
+            self._write_chunk({
+                "event_type": "stream-start", "is_finished": False, "generation_id": response["generation_id"],
+            })
+            for token in self.llm.tokens(text):
+                time.sleep(self.llm.token_delay)
+                self._write_chunk({"event_type": "text-generation", "is_finished": False, "text": token})
+            self._write_chunk({
+                "event_type": "stream-end", "is_finished": True, "finish_reason": "COMPLETE", "response": response,
+            })
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Le client a cessé de lire (deux phrases reçues).
+            self.close_connection = True
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Serveur HTTP compatible avec ``POST /v1/chat`` de Cohere"""
+
+    daemon_threads = True
+
+    def __init__(self, address, llm, error_status=500):
+        super().__init__(address, FakeLLMHandler)
+        self.llm = llm
+        self.error_status = error_status
@@ -0,0 +1,266 @@
+"""Index inversé de n-grammes pour la détection d'intention du chatbot.
+
+Les phrases d'entraînement du dataset sont normalisées une seule fois et
+découpées en n-grammes de caractères. Les variantes numérotées générées
+par gabarit (« C'est quoi le CJK 0? », « ... CJK 1? ») se réduisent à une
+seule phrase canonique. Pour une question, seules les phrases
+qui partagent des n-grammes avec elle sont évaluées, puis les meilleures
+candidates sont départagées avec le même ratio que ``difflib``.
+"""
+import re
+from collections import Counter, defaultdict, namedtuple
+from difflib import SequenceMatcher
+from itertools import chain
+
+NGRAM_SIZE = 3
+# Nombre de candidates (classées par recouvrement de n-grammes) re-scorées
+# avec SequenceMatcher, et nombre maximal par intention pour que les
+# phrases quasi identiques d'une intention n'évincent pas les autres.
+SHORTLIST_SIZE = 25
+SHORTLIST_PER_INTENT = 5
+
+# ``score`` est le ratio difflib (0 à 1) de la meilleure phrase, ``margin``
+# son avance sur la meilleure phrase d'une autre intention.
+IntentMatch = namedtuple("IntentMatch", ["intent_name", "response_key", "score", "margin", "phrase"])
+
+
+def normalize_phrase(text):
+    return " ".join((text or "").lower().split())
+
+
+# Numéro final ajouté par les gabarits du dataset, avant la ponctuation.
+_template_number_re = re.compile(r"\s+\d+(?=[\s?!.]*$)")
+
+
+def canonical_phrase(text):
+    """Phrase normalisée, sans le numéro des variantes de gabarit"""
+    return _template_number_re.sub("", normalize_phrase(text))
+
+
+def char_ngrams(text, n=NGRAM_SIZE):
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class IntentIndex:
+    """Phrases d'entraînement indexées par n-grammes de caractères"""
+
+    def __init__(self):
+        self.intents = []
+        self.phrases = []
+        self.phrase_intents = []
+        self.phrase_sizes = []
+        self.postings = defaultdict(list)
+        self._phrase_ids = {}
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        index = cls()
+        for intent_data in dataset.get("intents", []):
+            responses = intent_data.get("responses") or {}
+            response_key = next(iter(responses), None)
+            intent_id = index.add_intent(intent_data["intent_name"], response_key)
+            for phrase in intent_data.get("training_phrases", []):
+                index.add_phrase(intent_id, phrase)
+        return index
+
+    def add_intent(self, intent_name, response_key):
+        self.intents.append((intent_name, response_key))
+        return len(self.intents) - 1
+
+    def add_phrase(self, intent_id, phrase):
+        normalized = canonical_phrase(phrase)
+        # Une phrase répétée garde l'intention rencontrée en premier, comme
+        # le parcours séquentiel du dataset.
+        if not normalized or normalized in self._phrase_ids:
+            return None
+        phrase_id = len(self.phrases)
+        grams = char_ngrams(normalized)
+        self.phrases.append(normalized)
+        self.phrase_intents.append(intent_id)
+        self.phrase_sizes.append(len(grams))
+        self._phrase_ids[normalized] = phrase_id
+        for gram in grams:
+            self.postings[gram].append(phrase_id)
+        return phrase_id
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def shared_counts(self, grams):
+        """Nombre de n-grammes partagés avec ``grams``, par phrase"""
+        return Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+
+    def candidates(self, query, intent_name=None, limit=SHORTLIST_SIZE, per_intent=SHORTLIST_PER_INTENT):
+        """Phrases partageant des n-grammes avec la requête, classées par Dice"""
+        grams = char_ngrams(query)
+        shared = self.shared_counts(grams)
+
+        if intent_name is not None:
+            shared = {
+                phrase_id: count for phrase_id, count in shared.items()
+                if self.intents[self.phrase_intents[phrase_id]][0] == intent_name
+            }
+
+        query_size = len(grams)
+        sizes = self.phrase_sizes
+        ranked = sorted(
+            shared.items(),
+            key=lambda item: (-item[1] / (query_size + sizes[item[0]]), item[0]),
+        )
+        selected = []
+        per_intent_counts = Counter()
+        for phrase_id, _ in ranked:
+            intent_id = self.phrase_intents[phrase_id]
+            if per_intent_counts[intent_id] >= per_intent:
+                continue
+            per_intent_counts[intent_id] += 1
+            selected.append(phrase_id)
+            if len(selected) >= limit:
+                break
+        return selected
+
+    def best_match(self, text, cutoff=0.6, intent_name=None):
+        """Phrase au meilleur ratio difflib, s'il atteint ``cutoff``
+
+        Contrairement à l'ancienne boucle, qui retenait la première phrase
+        au-dessus du seuil dans l'ordre du dataset, la phrase la mieux notée
+        l'emporte (la première en cas d'égalité). La requête est comparée
+        sous forme canonique, sans le numéro des variantes de gabarit.
+        """
+        query = canonical_phrase(text)
+        if not query:
+            return None
+        return self.match_candidates(query, self.candidates(query, intent_name=intent_name), cutoff)
+
+    def intent_scores(self, query, phrase_ids):
+        """Meilleur ratio difflib par intention : {intention: (ratio, rang, phrase)}"""
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        scores = {}
+        for rank, phrase_id in enumerate(phrase_ids):
+            matcher.set_seq1(self.phrases[phrase_id])
+            intent_id = self.phrase_intents[phrase_id]
+            # Inutile de scorer une phrase qui ne peut pas battre la
+            # meilleure de son intention.
+            bound = scores[intent_id][0] if intent_id in scores else 0.0
+            if matcher.real_quick_ratio() <= bound or matcher.quick_ratio() <= bound:
+                continue
+            score = matcher.ratio()
+            if score > bound:
+                scores[intent_id] = (score, rank, phrase_id)
+        return scores
+
+    def match_candidates(self, query, phrase_ids, cutoff=0.6):
+        """``IntentMatch`` de la meilleure candidate, ou None sous ``cutoff``"""
+        return self.match_scores(self.intent_scores(query, phrase_ids), cutoff)
+
+    def match_scores(self, scores, cutoff=0.6):
+        # À ratio égal, la candidate la mieux classée l'emporte.
+        best = min(scores.items(), key=lambda item: (-item[1][0], item[1][1]), default=None)
+        if best is None or best[1][0] < cutoff:
+            return None
+        best_intent, (best_score, _, best_id) = best
+        runner_up = max(
+            (score for intent_id, (score, _, _) in scores.items() if intent_id != best_intent),
+            default=0.0,
+        )
+        intent_name, response_key = self.intents[best_intent]
+        return IntentMatch(intent_name, response_key, best_score, best_score - runner_up, self.phrases[best_id])
+
+
+class LiveIntentIndex(IntentIndex):
+    """``IntentIndex`` modifiable intention par intention
+
+    Une phrase retirée est seulement marquée dans ``removed`` et ignorée
+    par la présélection. Quand les phrases retirées dépassent
+    ``COMPACT_RATIO`` de l'index, ``needs_compaction`` signale qu'il vaut
+    mieux le reconstruire. Un index lu par d'autres threads ne doit pas
+    être modifié : on modifie sa ``copy()``, puis on la publie.
+    """
+
+    COMPACT_RATIO = 0.3
+
+    def __init__(self):
+        super().__init__()
+        self.removed = set()
+        self._intent_ids = {}
+        self._intent_phrases = defaultdict(list)
+        # Phrases écartées parce qu'une autre intention les porte déjà.
+        self._shadowed = defaultdict(list)
+
+    def __len__(self):
+        return len(self.phrases) - len(self.removed)
+
+    def copy(self):
+        """Copie indépendante, sans recalculer les n-grammes"""
+        clone = type(self)()
+        clone.intents = list(self.intents)
+        clone.phrases = list(self.phrases)
+        clone.phrase_intents = list(self.phrase_intents)
+        clone.phrase_sizes = list(self.phrase_sizes)
+        clone.postings.update((gram, list(ids)) for gram, ids in self.postings.items())
+        clone._phrase_ids = dict(self._phrase_ids)
+        clone.removed = set(self.removed)
+        clone._intent_ids = dict(self._intent_ids)
+        clone._intent_phrases.update((intent_id, list(ids)) for intent_id, ids in self._intent_phrases.items())
+        clone._shadowed.update((phrase, list(ids)) for phrase, ids in self._shadowed.items())
+        return clone
+
+    def add_intent(self, intent_name, response_key):
+        intent_id = self._intent_ids.get(intent_name)
+        if intent_id is None:
+            intent_id = self._intent_ids[intent_name] = super().add_intent(intent_name, response_key)
+        else:
+            self.intents[intent_id] = (intent_name, response_key)
+        return intent_id
+
+    def add_phrase(self, intent_id, phrase):
+        phrase_id = super().add_phrase(intent_id, phrase)
+        if phrase_id is not None:
+            self._intent_phrases[intent_id].append(phrase_id)
+            return phrase_id
+        normalized = canonical_phrase(phrase)
+        owner = self._phrase_ids.get(normalized)
+        if owner is not None and self.phrase_intents[owner] != intent_id:
+            if intent_id not in self._shadowed[normalized]:
+                self._shadowed[normalized].append(intent_id)
+        return None
+
+    def remove_intent(self, intent_name):
+        """Retire toutes les phrases de l'intention"""
+        intent_id = self._intent_ids.get(intent_name)
+        if intent_id is None:
+            return
+        for shadowed in self._shadowed.values():
+            while intent_id in shadowed:
+                shadowed.remove(intent_id)
+        for phrase_id in self._intent_phrases.pop(intent_id, ()):
+            self.removed.add(phrase_id)
+            phrase = self.phrases[phrase_id]
+            self._phrase_ids.pop(phrase, None)
+            # La phrase revient à la prochaine intention qui la porte.
+            while self._shadowed.get(phrase):
+                if self.add_phrase(self._shadowed[phrase].pop(0), phrase) is not None:
+                    break
+
+    def replace_intent(self, intent_name, response_key, phrases):
+        """Remplace les phrases de l'intention (ajoutée si elle est nouvelle)"""
+        self.remove_intent(intent_name)
+        intent_id = self.add_intent(intent_name, response_key)
+        for phrase in phrases:
+            self.add_phrase(intent_id, phrase)
+        return intent_id
+
+    @property
+    def needs_compaction(self):
+        return len(self.removed) > self.COMPACT_RATIO * len(self.phrases)
+
+    def shared_counts(self, grams):
+        shared = super().shared_counts(grams)
+        if self.removed:
+            for phrase_id in self.removed.intersection(shared):
+                del shared[phrase_id]
+        return shared
@@ -0,0 +1,230 @@
+"""Intentions du chatbot tenues en base (``CHATBOT_INTENT_SOURCE = 'database'``).
+
+Le staff édite intentions, phrases et réponses dans l'admin. Chaque
+modification horodate son intention (``Intent.updated_at``), puis, une
+fois la transaction validée, incrémente un compteur de version dans le
+cache partagé (``CHATBOT_CONTEXT_CACHE``).
+
+Chaque worker compare ce compteur au sien toutes les ``CHECK_INTERVAL``
+secondes. Il relit aussi les horodatages toutes les
+``CHATBOT_INTENT_SYNC_INTERVAL`` secondes, au cas où le cache n'est pas
+partagé. Seules les intentions modifiées sont rechargées : leurs phrases
+sont remplacées dans une copie du ``LiveIntentIndex``, sans recalculer
+les n-grammes des autres intentions.
+"""
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .context import bump_counter, get_counter
+from .dataset import CHECK_INTERVAL, ChatbotDataset
+from .intent_index import LiveIntentIndex
+from .models import Intent, Response, TrainingPhrase
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = "chatbot:intents:version"
+SYNC_INTERVAL = getattr(settings, "CHATBOT_INTENT_SYNC_INTERVAL", 60.0)
+
+_deferred = threading.local()
+
+
+def get_intents_version():
+    return get_counter(VERSION_CACHE_KEY)
+
+
+def bump_intents_version():
+    return bump_counter(VERSION_CACHE_KEY)
+
+
+def notify_intents_changed():
+    """Prévient les workers, une fois la transaction validée"""
+    if getattr(_deferred, "pending", None) is not None:
+        return
+    transaction.on_commit(bump_intents_version)
+
+
+def touch_intent(intent_id):
+    """Horodate l'intention dont une phrase ou une réponse a changé"""
+    pending = getattr(_deferred, "pending", None)
+    if pending is not None:
+        pending.add(intent_id)
+        return
+    Intent.objects.filter(pk=intent_id).update(updated_at=timezone.now())
+    notify_intents_changed()
+
+
+@contextmanager
+def deferred_changes():
+    """Regroupe les notifications d'un import ou d'une suppression en masse"""
+    if getattr(_deferred, "pending", None) is not None:
+        yield
+        return
+    pending = _deferred.pending = set()
+    try:
+        yield
+    finally:
+        _deferred.pending = None
+    if pending:
+        Intent.objects.filter(pk__in=pending).update(updated_at=timezone.now())
+    notify_intents_changed()
+
+
+def load_intents(pks):
+    """Intentions au format de ``cjk_dataset.json``, par id (sans instancier les modèles)"""
+    intents = {
+        pk: {"intent_name": name, "description": description, "training_phrases": [], "responses": {}}
+        for pk, name, description in Intent.objects.filter(pk__in=pks).values_list("id", "name", "description")
+    }
+    phrases = TrainingPhrase.objects.filter(intent_id__in=intents).values_list("intent_id", "text")
+    for intent_id, text in phrases:
+        intents[intent_id]["training_phrases"].append(text)
+    responses = Response.objects.filter(intent_id__in=intents).values_list("intent_id", "key", "language", "text")
+    for intent_id, key, lang, text in responses:
+        intents[intent_id]["responses"].setdefault(key, {})[lang] = text
+    return intents
+
+
+def import_intents(data, replace=False):
+    """Charge en base les intentions de ``data`` (format de ``cjk_dataset.json``)
+
+    Les phrases et réponses d'une intention existante sont remplacées ; avec
+    ``replace``, les intentions absentes de ``data`` sont supprimées.
+    """
+    report = {"created": 0, "updated": 0, "deleted": 0, "phrases": 0, "responses": 0}
+    names = set()
+    with transaction.atomic(), deferred_changes():
+        for position, item in enumerate(data.get("intents", [])):
+            name = item["intent_name"]
+            # Comme pour le fichier, la première occurrence d'un nom l'emporte.
+            if name in names:
+                continue
+            names.add(name)
+            intent, created = Intent.objects.update_or_create(
+                name=name,
+                defaults={"description": item.get("description", ""), "position": position, "is_active": True},
+            )
+            report["created" if created else "updated"] += 1
+            intent.training_phrases.all().delete()
+            intent.responses.all().delete()
+            phrases = TrainingPhrase.objects.bulk_create(
+                TrainingPhrase(intent=intent, text=text) for text in item.get("training_phrases", [])
+            )
+            responses = Response.objects.bulk_create(
+                Response(intent=intent, key=key, language=lang, text=text)
+                for key, by_lang in (item.get("responses") or {}).items()
+                for lang, text in by_lang.items()
+            )
+            report["phrases"] += len(phrases)
+            report["responses"] += len(responses)
+        if replace:
+            stale = Intent.objects.exclude(name__in=names)
+            report["deleted"] = stale.count()
+            stale.delete()
+    return report
+
+
+class DatabaseIntentStore:
+    """Instantané du dataset construit depuis la base, mis à jour par intention
+
+    Un instantané publié n'est jamais modifié : chaque synchronisation
+    travaille sur une copie de l'index, et une requête en cours garde
+    l'index qu'elle a lu.
+    """
+
+    def __init__(self, check_interval=CHECK_INTERVAL, sync_interval=SYNC_INTERVAL):
+        self.check_interval = check_interval
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._index = None
+        self._classifier = None
+        # id de l'intention -> (updated_at, intention au format JSON)
+        self._entries = {}
+        self._positions = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._synced_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self._snapshot is None or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if self._snapshot is None or now - self._checked_at >= self.check_interval:
+                    self._check(now)
+                    self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def _check(self, now):
+        # Lu avant la synchronisation : un changement pendant celle-ci sera
+        # vu au prochain contrôle.
+        version = get_intents_version()
+        if self._snapshot is not None and version == self._version and now - self._synced_at < self.sync_interval:
+            return
+        self.sync()
+        self._version = version
+        self._synced_at = time.monotonic()
+
+    def sync(self):
+        """Recharge les intentions modifiées ; vrai si l'instantané a changé"""
+        rows = Intent.objects.filter(is_active=True).values_list("id", "updated_at", "position")
+        stamps = {}
+        self._positions = {}
+        for pk, updated_at, position in rows:
+            stamps[pk] = updated_at
+            self._positions[pk] = position
+        changed = [pk for pk, stamp in stamps.items() if pk not in self._entries or self._entries[pk][0] != stamp]
+        removed = [pk for pk in self._entries if pk not in stamps]
+        if self._snapshot is not None and not changed and not removed:
+            return False
+
+        loaded = load_intents(changed)
+        # Le classifieur de langue n'apprend que des réponses.
+        retrain = self._classifier is None or bool(removed)
+        index = LiveIntentIndex() if self._index is None else self._index.copy()
+        entries = dict(self._entries)
+        for pk in removed:
+            index.remove_intent(entries.pop(pk)[1]["intent_name"])
+        for pk in sorted(changed, key=self._order):
+            item = loaded.get(pk)
+            previous = entries.pop(pk, None)
+            if previous is not None and (item is None or previous[1]["intent_name"] != item["intent_name"]):
+                index.remove_intent(previous[1]["intent_name"])
+            if previous is None or item is None or previous[1]["responses"] != item["responses"]:
+                retrain = True
+            if item is None:
+                # Supprimée entre les deux requêtes.
+                continue
+            index.replace_intent(item["intent_name"], next(iter(item["responses"]), None), item["training_phrases"])
+            entries[pk] = (stamps[pk], item)
+
+        ordered = sorted(entries, key=self._order)
+        if index.needs_compaction:
+            index = LiveIntentIndex()
+            for pk in ordered:
+                item = entries[pk][1]
+                index.replace_intent(item["intent_name"], next(iter(item["responses"]), None), item["training_phrases"])
+        self._index = index
+        self._entries = entries
+
+        checksum = hashlib.sha256(
+            "\n".join(f"{pk}:{self._entries[pk][0].isoformat()}" for pk in sorted(self._entries)).encode("utf-8")
+        ).hexdigest()
+        data = {"intents": [self._entries[pk][1] for pk in ordered]}
+        self._snapshot = ChatbotDataset(
+            data, checksum, index=index, language_classifier=None if retrain else self._classifier
+        )
+        self._classifier = self._snapshot.language_classifier
+        if not self._entries:
+            logger.warning("Aucune intention active en base (import_intents ?)")
+        logger.info("Intentions du chatbot synchronisees: %d modifiees, %d retirees", len(changed), len(removed))
+        return True
+
+    def _order(self, pk):
+        return self._positions.get(pk, 0), pk
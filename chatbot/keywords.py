@@ -0,0 +1,221 @@
+"""Mots-clés du chatbot reconnus en une seule passe sur le message.
+
+Salutations, formules d'ouverture, remerciements et mots-clés par langue
+sont compilés une fois dans un automate d'Aho-Corasick. Le message est
+découpé en mots repliés (minuscules, sans accents, ponctuation ignorée),
+puis chaque mot fait avancer l'automate : le coût d'une analyse est
+linéaire en le nombre de mots, quel que soit le nombre de mots-clés.
+
+Seuls des mots entiers correspondent : « hi » ne correspond pas dans
+« this ».
+"""
+import re
+import unicodedata
+from collections import Counter, deque, namedtuple
+from functools import lru_cache
+
+# Genres de mots-clés ; les mots-clés de langue ont pour genre le code de la langue.
+GREETING = "greeting"
+OPENER = "opener"
+GREETING_WORD = "greeting_word"
+SUPPORT_GREETING = "support_greeting"
+THANKS = "thanks"
+
+# Par ordre de priorité.
+LANGUAGE_KEYWORDS = {
+    "fr": ["bonjour", "salut", "merci", "svp", "s'il", "mais", "pourquoi", "comment", "je"],
+    "en": ["hello", "hi", "thanks", "please"],
+    "rn": ["mwaramutse", "murakoze", "urakoze"],
+    "sw": ["habari", "asante", "tafadhali"],
+}
+
+# Salutation en tête d'une réponse du modèle, retirée avec la formule qui suit.
+GREETINGS = [
+    "bonjour", "salut", "hello", "hi", "good morning", "good afternoon", "good evening",
+    "mwaramutse", "namahoro", "habari",
+]
+OPENERS = [
+    "comment allez-vous", "comment tu vas", "comment vas-tu", "ca va", "how are you",
+    "amakuru yawe", "umeamkaje",
+]
+
+# Un message composé uniquement de ces mots est une simple salutation.
+GREETING_WORDS = [
+    "bonjour", "salut", "bonsoir", "hello", "hi", "good", "morning", "afternoon", "evening",
+    "mwaramutse", "namahoro", "habari", "hujambo", "shikamoo", "comment", "vas", "tu", "allez",
+    "vous", "ca", "va", "how", "are", "you", "amakuru", "yawe", "umeamkaje",
+]
+
+# Réponses ``greeting`` et ``thanks`` de l'intention ``support_general``.
+SUPPORT_GREETINGS = ["bonjour", "salut", "hello", "mwaramutse"]
+THANKS_WORDS = ["merci", "murakoze", "thank", "thanks"]
+
+
+def _keyword_table():
+    for lang, words in LANGUAGE_KEYWORDS.items():
+        for word in words:
+            yield word, lang
+    for kind, words in (
+        (GREETING, GREETINGS),
+        (OPENER, OPENERS),
+        (GREETING_WORD, GREETING_WORDS),
+        (SUPPORT_GREETING, SUPPORT_GREETINGS),
+        (THANKS, THANKS_WORDS),
+    ):
+        for word in words:
+            yield word, kind
+
+
+_word_re = re.compile(r"[\w'’‘]+")
+
+
+@lru_cache(maxsize=8192)
+def fold_word(word):
+    """Mot en minuscules, sans accents ni apostrophes autour"""
+    decomposed = unicodedata.normalize("NFKD", word.lower().replace("’", "'").replace("‘", "'"))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).strip("'")
+
+
+def split_words(text):
+    """Mots repliés de ``text`` et leur position (début, fin) dans le texte"""
+    words = []
+    spans = []
+    for match in _word_re.finditer(text or ""):
+        word = fold_word(match.group())
+        if word:
+            words.append(word)
+            spans.append(match.span())
+    return words, spans
+
+
+# ``start``/``end`` sont des indices de mots.
+Hit = namedtuple("Hit", ["start", "end", "kinds"])
+
+
+class KeywordScan(namedtuple("KeywordScan", ["words", "spans", "hits"])):
+    """Résultat d'une analyse : mots repliés, leur position dans le texte, mots-clés trouvés"""
+
+    __slots__ = ()
+
+    def has(self, kind):
+        return any(kind in hit.kinds for hit in self.hits)
+
+    @property
+    def languages(self):
+        """Nombre de mots-clés trouvés par langue"""
+        counts = Counter()
+        for hit in self.hits:
+            for kind in hit.kinds:
+                if kind in LANGUAGE_KEYWORDS:
+                    counts[kind] += 1
+        return counts
+
+    @property
+    def language(self):
+        """Première langue, dans l'ordre de ``LANGUAGE_KEYWORDS``, dont un mot-clé apparaît"""
+        counts = self.languages
+        return next((lang for lang in LANGUAGE_KEYWORDS if counts[lang]), None)
+
+    @property
+    def greeting_only(self):
+        """Vrai si chaque mot du message est un mot de salutation"""
+        covered = {hit.start for hit in self.hits if GREETING_WORD in hit.kinds and hit.end == hit.start + 1}
+        return bool(self.words) and len(covered) == len(self.words)
+
+    def greeting_prefix_end(self):
+        """Position, dans le texte, du premier mot après les salutations de tête"""
+        cursor = 0
+        while True:
+            ends = [
+                hit.end for hit in self.hits
+                if hit.start == cursor and (GREETING in hit.kinds or OPENER in hit.kinds)
+            ]
+            if not ends:
+                break
+            cursor = max(ends)
+        if cursor == 0:
+            return 0
+        if cursor == len(self.words):
+            return None
+        return self.spans[cursor][0]
+
+
+class KeywordAutomaton:
+    """Automate d'Aho-Corasick dont l'alphabet est fait de mots repliés
+
+    Les mots-clés étant des mots entiers, avancer mot par mot respecte les
+    limites de mots sans vérification supplémentaire.
+    """
+
+    def __init__(self, table):
+        self._goto = [{}]
+        self._fail = [0]
+        # Par état : (nombre de mots, genres) des mots-clés qui s'y terminent.
+        self._outputs = [[]]
+        kinds_by_keyword = {}
+        for keyword, kind in table:
+            words = tuple(split_words(keyword)[0])
+            if words:
+                kinds_by_keyword.setdefault(words, set()).add(kind)
+        for words, kinds in kinds_by_keyword.items():
+            self._add(words, frozenset(kinds))
+        self._link()
+
+    def _add(self, words, kinds):
+        state = 0
+        for word in words:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(words), kinds))
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def scan(self, text):
+        """Tous les mots-clés de ``text``, en une passe sur ses mots"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        words, spans = split_words(text)
+        hits = []
+        state = 0
+        for end, word in enumerate(words, 1):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for length, kinds in outputs[state]:
+                hits.append(Hit(end - length, end, kinds))
+        return KeywordScan(tuple(words), tuple(spans), tuple(hits))
+
+
+keyword_automaton = KeywordAutomaton(_keyword_table())
+
+
+@lru_cache(maxsize=1024)
+def scan_keywords(text):
+    """Analyse d'un message, partagée par les heuristiques qui le lisent"""
+    return keyword_automaton.scan(text)
+
+
+def strip_greetings(text):
+    """``text`` sans les salutations et formules d'ouverture de tête"""
+    text = (text or "").strip()
+    # Non mis en cache : appelé sur les réponses du modèle, toutes différentes.
+    end = keyword_automaton.scan(text).greeting_prefix_end()
+    if end is None:
+        return ""
+    return text[end:].strip()
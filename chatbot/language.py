@@ -0,0 +1,105 @@
+"""Identification locale de la langue (fr, rn, en, sw).
+
+Classifieur bayésien naïf sur n-grammes de caractères, entraîné sur les
+réponses du dataset qui sont déjà rangées par langue. Il évite d'appeler
+Cohere pour la plupart des messages ; l'appel distant ne sert plus que
+lorsque la confiance est trop faible.
+"""
+import math
+import re
+from collections import Counter, defaultdict, namedtuple
+
+LANGUAGES = ("fr", "rn", "en", "sw")
+NGRAM_SIZES = (1, 2, 3, 4)
+# Lissage de Laplace et température appliquée aux log-vraisemblances
+# moyennes pour obtenir une confiance exploitable plutôt que 0 ou 1.
+ALPHA = 0.5
+TEMPERATURE = 0.15
+
+LanguageGuess = namedtuple("LanguageGuess", ["lang", "confidence"])
+
+_word_re = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def _features(text):
+    features = []
+    for word in _word_re.findall((text or "").lower()):
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+    return features
+
+
+class LanguageClassifier:
+    """Bayésien naïf multinomial sur les n-grammes de caractères"""
+
+    def __init__(self, languages=LANGUAGES, alpha=ALPHA):
+        self.languages = tuple(languages)
+        self.alpha = alpha
+        self._counts = {lang: Counter() for lang in self.languages}
+        self._log_probs = {}
+        self._log_unseen = {}
+        self._log_priors = {}
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        samples = []
+        for intent_data in dataset.get("intents", []):
+            for by_lang in (intent_data.get("responses") or {}).values():
+                for lang, text in by_lang.items():
+                    samples.append((lang, text))
+        return cls().fit(samples)
+
+    @classmethod
+    def from_tables(cls, log_probs, log_unseen, log_priors):
+        """Classifieur déjà entraîné, tables lues dans l'artefact compilé"""
+        classifier = cls(languages=log_probs)
+        classifier._log_probs = log_probs
+        classifier._log_unseen = log_unseen
+        classifier._log_priors = log_priors
+        return classifier
+
+    def tables(self):
+        """(log-probabilités, log-probabilité d'un n-gramme inconnu, log-priors) par langue"""
+        return self._log_probs, self._log_unseen, self._log_priors
+
+    def fit(self, samples):
+        documents = defaultdict(int)
+        for lang, text in samples:
+            if lang not in self._counts:
+                continue
+            self._counts[lang].update(_features(text))
+            documents[lang] += 1
+
+        vocabulary = set()
+        for counts in self._counts.values():
+            vocabulary.update(counts)
+        total_documents = sum(documents.values()) or 1
+
+        for lang, counts in self._counts.items():
+            denominator = sum(counts.values()) + self.alpha * (len(vocabulary) + 1)
+            self._log_probs[lang] = {
+                feature: math.log((count + self.alpha) / denominator)
+                for feature, count in counts.items()
+            }
+            self._log_unseen[lang] = math.log(self.alpha / denominator)
+            self._log_priors[lang] = math.log((documents[lang] + 1) / (total_documents + len(self.languages)))
+        return self
+
+    def predict(self, text):
+        features = _features(text)
+        if not features or not self._log_probs:
+            return LanguageGuess(None, 0.0)
+
+        scores = {}
+        for lang in self.languages:
+            log_probs = self._log_probs[lang]
+            unseen = self._log_unseen[lang]
+            likelihood = sum(log_probs.get(feature, unseen) for feature in features)
+            scores[lang] = self._log_priors[lang] + likelihood / len(features) / TEMPERATURE
+
+        best = max(scores.values())
+        weights = {lang: math.exp(score - best) for lang, score in scores.items()}
+        total = sum(weights.values())
+        lang = max(weights, key=weights.get)
+        return LanguageGuess(lang, weights[lang] / total)
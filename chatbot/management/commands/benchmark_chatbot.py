@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.benchmark import HOLDOUT, MIN_TIMING, SEED, compare, run_benchmark
+from chatbot.dataset import get_dataset
+
+
+class Command(BaseCommand):
+    help = "Mesure la justesse et le débit de la détection d'intention, de langue et de salutation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holdout', type=float, default=HOLDOUT, help="Part des phrases mises de côté")
+        parser.add_argument('--seed', type=int, default=SEED, help="Graine du tirage et des perturbations")
+        parser.add_argument('--matcher', action='append', default=[],
+                            help="index, compiled, batch ou exhaustive (répétable ; par défaut tous sauf exhaustive)")
+        parser.add_argument('--min-time', type=float, default=MIN_TIMING, help="Durée minimale de chaque mesure de débit")
+        parser.add_argument('--output', help="Fichier JSON du résultat (par défaut la sortie standard)")
+        parser.add_argument('--compare', help="Résultat JSON d'une version précédente à comparer")
+
+    def handle(self, *args, **options):
+        if not 0 < options['holdout'] < 1:
+            raise CommandError("--holdout doit etre entre 0 et 1")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Resultat de reference illisible: {options['compare']} ({exc})")
+
+        result = run_benchmark(
+            get_dataset().data,
+            holdout=options['holdout'],
+            seed=options['seed'],
+            matchers=options['matcher'] or None,
+            min_time=options['min_time'],
+        )
+
+        payload = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(payload + '\n')
+        else:
+            self.stdout.write(payload)
+
+        if baseline is not None:
+            for key, old, new, change in compare(baseline, result):
+                delta = f"{change:+.1%}" if change is not None else "-"
+                self.stderr.write(f"{key:50} {old!s:>10} -> {new!s:>10}  {delta}")
@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.batch import get_batch_classifier
+from chatbot.dataset import get_dataset
+
+
+class Command(BaseCommand):
+    help = "Classe par lots les questions d'un fichier (une par ligne, ou JSONL avec un champ text)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier de questions ('-' pour l'entrée standard)")
+        parser.add_argument('--top-k', type=int, default=3, help="Intentions les mieux classées à garder")
+        parser.add_argument('--field', default='text', help="Champ du texte pour un fichier JSONL")
+        parser.add_argument('--output', help="Fichier JSONL de résultats (par défaut la sortie standard)")
+
+    def _read(self, path, field):
+        try:
+            file = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"Fichier illisible: {path} ({exc})")
+        utterances = []
+        with file:
+            for number, line in enumerate(file, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith('{'):
+                    try:
+                        value = json.loads(line).get(field)
+                    except ValueError:
+                        value = line
+                    if value is not None and not isinstance(value, str):
+                        raise CommandError(f"Ligne {number}: le champ {field} doit etre un texte")
+                    line = value or ''
+                if line:
+                    utterances.append(line)
+        return utterances
+
+    def handle(self, *args, **options):
+        utterances = self._read(options['path'], options['field'])
+        classifier = get_batch_classifier(get_dataset())
+
+        started = time.perf_counter()
+        results = classifier.classify(utterances, top_k=max(1, options['top_k']))
+        elapsed = time.perf_counter() - started
+
+        lines = (json.dumps(result, ensure_ascii=False) for result in results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                for line in lines:
+                    output.write(line + '\n')
+        else:
+            for line in lines:
+                self.stdout.write(line)
+
+        rate = len(results) / elapsed if elapsed else 0.0
+        self.stderr.write(f"{len(results)} questions classees en {elapsed:.2f} s ({rate:.0f}/s)")
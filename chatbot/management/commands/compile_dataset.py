@@ -0,0 +1,38 @@
+import hashlib
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.compiled import write_compiled
+from chatbot.dataset import get_compiled_path, get_dataset_path
+
+
+class Command(BaseCommand):
+    help = "Compile cjk_dataset.json (phrases dédupliquées, index et classifieur de langue pré-construits)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Chemin de l'artefact (par défaut à côté du dataset)")
+
+    def handle(self, *args, **options):
+        source = get_dataset_path()
+        output = options['output'] or get_compiled_path()
+        try:
+            with open(source, 'rb') as file:
+                raw = file.read()
+            data = json.loads(raw.decode('utf-8'))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Dataset illisible: {source} ({exc})")
+
+        report = write_compiled(output, data, hashlib.sha256(raw).hexdigest())
+
+        self.stdout.write(f"{report['intents']} intentions, {report['phrases']} phrases d'entrainement")
+        self.stdout.write(f"  {report['duplicates']} doublons apres normalisation")
+        self.stdout.write(f"  {report['templated']} variantes numerotees fusionnees")
+        self.stdout.write(
+            f"  {report['compiled']} phrases compilees ({report['collapsed']} fusionnees), "
+            f"{report['grams']} n-grammes"
+        )
+        self.stdout.write(f"  {report['language_features']} n-grammes du classifieur de langue")
+        for phrase in report['conflicts']:
+            self.stderr.write(f"  phrase partagee par plusieurs intentions (la premiere l'emporte): {phrase}")
+        self.stdout.write(self.style.SUCCESS(f"Artefact ecrit: {output} ({report['bytes']} octets)"))
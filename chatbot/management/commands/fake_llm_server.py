@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.fake_llm import FakeLLM, FakeLLMServer
+
+
+class Command(BaseCommand):
+    help = "Faux serveur Cohere local (latence, erreurs et débit simulés) pour les tests de charge"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.8,
+                            help="Délai médian avant le premier jeton (secondes)")
+        parser.add_argument('--latency-p95', type=float, default=2.0,
+                            help="p95 du délai avant le premier jeton (secondes)")
+        parser.add_argument('--tokens-per-second', type=float, default=40.0)
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Proportion d'appels en erreur (0 a 1)")
+        parser.add_argument('--error-status', type=int, default=500)
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError("--error-rate doit etre entre 0 et 1")
+        llm = FakeLLM(
+            latency_median=options['latency'],
+            latency_p95=options['latency_p95'],
+            tokens_per_second=options['tokens_per_second'],
+            error_rate=options['error_rate'],
+            seed=options['seed'],
+        )
+        server = FakeLLMServer((options['host'], options['port']), llm, error_status=options['error_status'])
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(
+            f"Faux LLM sur http://{host}:{port} (CHATBOT_LLM_BASE_URL), Ctrl+C pour arreter"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.dataset import get_dataset_path
+from chatbot.intent_store import import_intents
+
+
+class Command(BaseCommand):
+    help = "Importe les intentions d'un fichier au format cjk_dataset.json dans la base"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="Fichier JSON (par défaut le dataset du chatbot)")
+        parser.add_argument('--replace', action='store_true',
+                            help="Supprime les intentions absentes du fichier")
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_dataset_path()
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Fichier illisible: {path} ({exc})")
+
+        report = import_intents(data, replace=options['replace'])
+        self.stdout.write(
+            f"{report['created']} intentions creees, {report['updated']} mises a jour, "
+            f"{report['deleted']} supprimees"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['phrases']} phrases et {report['responses']} reponses importees depuis {path}"
+        ))
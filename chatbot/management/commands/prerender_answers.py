@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.chatbot_service import COHERE_MODEL, llm_caller, model_reformulation
+from chatbot.dataset import get_dataset
+from chatbot.rendered import (
+    get_rendered_path,
+    iter_reference_answers,
+    load_artifact,
+    source_hash,
+    write_artifact,
+)
+
+
+class Command(BaseCommand):
+    help = "Pré-génère la reformulation de chaque réponse du dataset (intention x clé x langue)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help="Appels LLM simultanés")
+        parser.add_argument('--retries', type=int, default=2, help="Nouvelles tentatives par entrée")
+        parser.add_argument(
+            '--backoff', type=float, default=2.0, help="Attente avant une nouvelle tentative (s), doublée à chaque fois"
+        )
+        parser.add_argument('--intent', action='append', default=[], help="Limiter à cette intention (répétable)")
+        parser.add_argument('--force', action='store_true', help="Régénérer aussi les entrées à jour")
+        parser.add_argument('--dry-run', action='store_true', help="Afficher le travail sans appeler le LLM")
+
+    def handle(self, *args, **options):
+        dataset = get_dataset()
+        path = get_rendered_path()
+        entries = load_artifact(path)
+
+        references = {
+            key: (reference, lang)
+            for key, reference, lang in iter_reference_answers(dataset)
+            if not options['intent'] or key.split('|', 1)[0] in options['intent']
+        }
+        # Les entrées dont l'intention a disparu du dataset sont retirées.
+        known_keys = {key for key, _, _ in iter_reference_answers(dataset)}
+        stale = [key for key in entries if key not in known_keys]
+        for key in stale:
+            del entries[key]
+
+        todo = [
+            key for key, (reference, _) in references.items()
+            if options['force'] or entries.get(key, {}).get('source') != source_hash(reference)
+        ]
+        self.stdout.write(
+            f"{len(references)} reponses, {len(todo)} a generer, {len(stale)} obsoletes retirees"
+        )
+        if options['dry_run']:
+            for key in todo:
+                self.stdout.write(f"  {key}")
+            return
+        if not todo:
+            if stale:
+                write_artifact(path, entries, COHERE_MODEL)
+            return
+
+        failures = []
+
+        breaker = llm_caller.breaker
+
+        def render(key):
+            reference, lang = references[key]
+            last_error = None
+            for attempt in range(options['retries'] + 1):
+                if attempt:
+                    delay = options['backoff'] * 2 ** (attempt - 1)
+                    # Disjoncteur ouvert : inutile de réessayer avant l'appel d'essai.
+                    if breaker.state == "open":
+                        delay = max(delay, breaker.reset_timeout)
+                    time.sleep(delay)
+                try:
+                    text = model_reformulation(reference, lang)
+                except Exception as exc:
+                    last_error = exc
+                    continue
+                if text:
+                    return text
+                # Sans texte du modèle, il n'y a rien à pré-générer : la
+                # référence est déjà servie telle quelle.
+                last_error = CommandError("reponse vide du modele")
+            raise last_error
+
+        with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as executor:
+            futures = {executor.submit(render, key): key for key in todo}
+            for done, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
+                try:
+                    text = future.result()
+                except Exception as exc:
+                    failures.append(key)
+                    self.stderr.write(f"[{done}/{len(todo)}] {key}: echec ({exc})")
+                    continue
+                reference, _ = references[key]
+                entries[key] = {'source': source_hash(reference), 'text': text}
+                # Sauvegarde après chaque entrée : une interruption ne fait
+                # perdre que les appels en cours.
+                write_artifact(path, entries, COHERE_MODEL)
+                self.stdout.write(f"[{done}/{len(todo)}] {key}")
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} entrees en echec, relancez la commande pour les reprendre"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Artefact ecrit: {path}"))
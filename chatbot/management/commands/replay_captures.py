@@ -0,0 +1,62 @@
+import json
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.capture import get_capture_path, read_captures
+
+
+class Command(BaseCommand):
+    help = "Rejoue les échanges capturés via send_message et mesure débit et latences"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="Fichier de capture (par défaut CHATBOT_CAPTURE_PATH)")
+        parser.add_argument('--concurrency', type=int, default=8, help="Sessions rejouées en parallèle")
+        parser.add_argument('--limit', type=int, help="Nombre maximal de messages")
+        parser.add_argument('--llm', choices=['fake', 'configured'], default='fake',
+                            help="fake : faux LLM dans le processus ; configured : CHATBOT_LLM_PROVIDER")
+        parser.add_argument('--latency', type=float, default=0.8,
+                            help="Faux LLM : délai médian avant le premier jeton (secondes)")
+        parser.add_argument('--latency-p95', type=float, default=2.0,
+                            help="Faux LLM : p95 du délai avant le premier jeton (secondes)")
+        parser.add_argument('--tokens-per-second', type=float, default=40.0)
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--output', help="Fichier JSON du résultat (par défaut la sortie standard)")
+
+    def handle(self, *args, **options):
+        # Importés ici : le service n'est chargé que si le rejeu démarre.
+        from chatbot.chatbot_service import set_provider
+        from chatbot.fake_llm import FakeLLM
+        from chatbot.providers import FakeProvider
+        from chatbot.replay import replay
+
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency doit etre au moins 1")
+        path = options['path'] or get_capture_path()
+        try:
+            records = list(islice(read_captures(path), options['limit']))
+        except OSError as exc:
+            raise CommandError(f"Capture illisible: {path} ({exc})")
+        if not records:
+            raise CommandError(f"Aucun echange a rejouer dans {path}")
+
+        if options['llm'] == 'fake':
+            set_provider(FakeProvider(FakeLLM(
+                latency_median=options['latency'],
+                latency_p95=options['latency_p95'],
+                tokens_per_second=options['tokens_per_second'],
+                error_rate=options['error_rate'],
+                seed=options['seed'],
+            )))
+
+        result = replay(records, concurrency=options['concurrency'])
+        result['source'] = path
+        result['llm'] = options['llm']
+
+        payload = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(payload + '\n')
+        else:
+            self.stdout.write(payload)
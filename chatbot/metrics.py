@@ -0,0 +1,200 @@
+"""Mesures du pipeline du chatbot : durée de chaque étape et jetons consommés.
+
+Chaque message ouvre une ``Trace`` (portée par une ``ContextVar``, donc
+visible dans les threads du pool et les tâches asyncio lancés pendant le
+message). Les étapes chronométrées avec ``stage`` alimentent à la fois la
+trace, écrite dans le journal en fin de message, et les histogrammes du
+processus exposés par l'endpoint ``metrics/`` réservé au staff.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("chatbot")
+
+# Bornes supérieures des intervalles des histogrammes, en millisecondes.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Histogramme cumulatif à intervalles fixes"""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """Estimation par la borne de l'intervalle qui contient le quantile"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = []
+            seen = 0
+            for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+                seen += count
+                cumulative.append([bound, seen])
+            return {
+                "count": self.count,
+                "sum": round(self.sum, 3),
+                "buckets": cumulative,
+                "p50": self.quantile(0.5),
+                "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99),
+            }
+
+
+class MetricsRegistry:
+    """Histogrammes et compteurs du processus"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        return {
+            "histograms": {name: h.snapshot() for name, h in sorted(histograms.items())},
+            "counters": dict(sorted(counters.items())),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+registry = MetricsRegistry()
+
+
+class Trace:
+    """Durées et jetons d'un message"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.timings = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.intent = None
+        self.language = None
+        self.outcome = None
+        self._lock = threading.Lock()
+
+    def add_timing(self, name, elapsed_ms):
+        with self._lock:
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed_ms, 3)
+
+    def add_usage(self, input_tokens, output_tokens):
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    @property
+    def elapsed_ms(self):
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    def summary(self):
+        return {
+            "intent": self.intent,
+            "lang": self.language,
+            "total_ms": round(self.elapsed_ms, 3),
+            "timings_ms": dict(self.timings),
+            "tokens": {"input": self.input_tokens, "output": self.output_tokens},
+            "outcome": self.outcome,
+        }
+
+
+_current_trace = contextvars.ContextVar("chatbot_trace", default=None)
+
+
+def start_trace():
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name):
+    """Chronomètre une étape du pipeline"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        registry.observe(f"stage.{name}", elapsed_ms)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_timing(name, elapsed_ms)
+
+
+def record_usage(input_tokens, output_tokens):
+    if not input_tokens and not output_tokens:
+        return
+    trace = _current_trace.get()
+    intent = trace.intent if trace is not None and trace.intent else "unknown"
+    registry.increment("tokens.input", input_tokens)
+    registry.increment("tokens.output", output_tokens)
+    registry.increment(f"tokens.input.{intent}", input_tokens)
+    registry.increment(f"tokens.output.{intent}", output_tokens)
+    if trace is not None:
+        trace.add_usage(input_tokens, output_tokens)
+
+
+def finish_trace(trace, outcome="ok"):
+    """Enregistre la durée totale et écrit la ligne de journal du message"""
+    trace.finished = time.perf_counter()
+    trace.outcome = outcome
+    summary = trace.summary()
+    registry.observe("request.total", summary["total_ms"])
+    registry.increment(f"requests.{outcome}")
+    if trace.intent:
+        registry.increment(f"requests.intent.{trace.intent}")
+    logger.info("chatbot %s", json.dumps(summary, ensure_ascii=False))
+    return summary
@@ -1,3 +1,52 @@
 from django.db import models
 
-# Create your models here.
+
+class Intent(models.Model):
+    """Intention du chatbot (``CHATBOT_INTENT_SOURCE = 'database'``)"""
+
+    name = models.CharField(max_length=100, unique=True)
+    description = models.TextField(blank=True)
+    # Une phrase partagée par deux intentions revient à la première.
+    position = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.name
+
+
+class TrainingPhrase(models.Model):
+    intent = models.ForeignKey(Intent, on_delete=models.CASCADE, related_name='training_phrases')
+    text = models.CharField(max_length=500)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.text
+
+
+class Response(models.Model):
+    LANGUAGE_CHOICES = [
+        ('fr', 'Francais'),
+        ('rn', 'Kirundi'),
+        ('en', 'Anglais'),
+        ('sw', 'Swahili'),
+    ]
+
+    intent = models.ForeignKey(Intent, on_delete=models.CASCADE, related_name='responses')
+    # La première clé de l'intention est celle servie par défaut.
+    key = models.CharField(max_length=50, default='default')
+    language = models.CharField(max_length=2, choices=LANGUAGE_CHOICES)
+    text = models.TextField()
+
+    class Meta:
+        ordering = ['id']
+        unique_together = [('intent', 'key', 'language')]
+
+    def __str__(self):
+        return f"{self.intent} / {self.key} ({self.language})"
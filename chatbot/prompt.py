@@ -0,0 +1,109 @@
+"""Historique envoyé au LLM, borné en jetons.
+
+Les derniers échanges sont repris tant qu'ils tiennent dans
+``CHATBOT_HISTORY_TOKEN_BUDGET`` ; un message trop long (un texte collé,
+par exemple) est tronqué à ``CHATBOT_MESSAGE_TOKEN_LIMIT``. Les échanges
+plus anciens ne sont pas perdus : ils sont condensés dans un résumé
+extractif (questions posées, début des réponses) placé en tête de
+l'historique et lui-même borné à ``CHATBOT_SUMMARY_TOKEN_BUDGET``.
+
+Les jetons sont estimés localement (environ un jeton pour quatre
+caractères d'un mot, un par signe de ponctuation), sans tokenizer distant.
+"""
+import math
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+from .metrics import registry
+
+HISTORY_TOKEN_BUDGET = getattr(settings, "CHATBOT_HISTORY_TOKEN_BUDGET", 600)
+SUMMARY_TOKEN_BUDGET = getattr(settings, "CHATBOT_SUMMARY_TOKEN_BUDGET", 150)
+MESSAGE_TOKEN_LIMIT = getattr(settings, "CHATBOT_MESSAGE_TOKEN_LIMIT", 250)
+MIN_CLIPPED_TOKENS = 20
+
+_token_re = re.compile(r"\w+|[^\w\s]")
+_sentence_re = re.compile(r"(?<=[.!?])\s+")
+
+
+def _piece_tokens(piece):
+    return max(1, math.ceil(len(piece) / 4))
+
+
+def count_tokens(text):
+    """Nombre de jetons estimé"""
+    return sum(_piece_tokens(piece) for piece in _token_re.findall(text or ""))
+
+
+def clip_tokens(text, limit):
+    """Début de ``text`` tenant dans ``limit`` jetons"""
+    used = 0
+    for match in _token_re.finditer(text or ""):
+        used += _piece_tokens(match.group())
+        if used > limit:
+            return text[:match.start()].rstrip() + "..."
+    return text
+
+
+def _message_tokens(message):
+    return count_tokens(message.get("message", "")) + 1
+
+
+def _summary_line(message):
+    text = " ".join(message.get("message", "").split())
+    if message.get("role") == "USER":
+        return "Q: " + clip_tokens(text, 30)
+    return "R: " + clip_tokens(_sentence_re.split(text, 1)[0], 30)
+
+
+@lru_cache(maxsize=1024)
+def _summarize(folded, budget):
+    # Les échanges les plus récents sont gardés en priorité.
+    lines = []
+    used = 0
+    for role, text in reversed(folded):
+        line = _summary_line({"role": role, "message": text})
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return " | ".join(reversed(lines))
+
+
+def summarize(messages, budget=SUMMARY_TOKEN_BUDGET):
+    """Résumé extractif des échanges sortis de la fenêtre"""
+    folded = tuple((message.get("role"), message.get("message", "")) for message in messages)
+    return _summarize(folded, budget)
+
+
+def prompt_history(chat_history, budget=HISTORY_TOKEN_BUDGET,
+                   summary_budget=SUMMARY_TOKEN_BUDGET, message_limit=MESSAGE_TOKEN_LIMIT):
+    """Historique à envoyer : échanges récents dans le budget, résumé des autres"""
+    recent = []
+    used = 0
+    cut = len(chat_history)
+    for position in range(len(chat_history) - 1, -1, -1):
+        message = chat_history[position]
+        # Un message trop long est tronqué à ce qui reste du budget, sauf
+        # s'il n'en resterait presque rien.
+        limit = min(message_limit, budget - used - 1)
+        if count_tokens(message.get("message", "")) > limit:
+            if limit < MIN_CLIPPED_TOKENS:
+                break
+            message = dict(message, message=clip_tokens(message["message"], limit))
+        cost = _message_tokens(message)
+        recent.append(message)
+        used += cost
+        cut = position
+    recent.reverse()
+
+    history = []
+    if cut > 0:
+        summary = summarize(chat_history[:cut], summary_budget)
+        if summary:
+            history.append({"role": "SYSTEM", "message": f"Resume de la conversation precedente: {summary}"})
+            used += count_tokens(summary)
+    registry.observe("prompt.history_tokens", used)
+    return history + recent
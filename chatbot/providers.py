@@ -0,0 +1,197 @@
+"""Fournisseurs du LLM utilisé par le chatbot.
+
+Le service ne parle qu'à un ``LLMProvider`` : les requêtes gardent le
+format de ``cohere.Client.chat`` (``message``, ``preamble``,
+``chat_history``...) et les réponses sont ramenées à un ``LLMReply``
+(texte et jetons consommés).
+
+- ``cohere`` : l'API Cohere, ou tout serveur compatible désigné par
+  ``CHATBOT_LLM_BASE_URL`` (par exemple ``fake_llm_server``) ;
+- ``fake`` : le faux LLM de ``fake_llm`` dans le processus même, sans
+  réseau.
+"""
+import asyncio
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+LLMReply = namedtuple("LLMReply", ["text", "input_tokens", "output_tokens"])
+
+HTTP_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+DEFAULT_BASE_URL = "https://api.cohere.com"
+
+
+def _require_ascii(value, name):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    value = value.strip()
+    try:
+        value.encode("ascii")
+    except UnicodeEncodeError as exc:
+        raise ValueError(
+            f"{name} must contain only ASCII characters. "
+            f"Check your environment variable for hidden accents or spaces."
+        ) from exc
+    return value
+
+
+def response_usage(response):
+    """(jetons d'entrée, jetons de sortie) d'une réponse Cohere"""
+    meta = getattr(response, "meta", None)
+    units = getattr(meta, "billed_units", None) or getattr(meta, "tokens", None)
+    input_tokens = getattr(units, "input_tokens", None) or 0
+    output_tokens = getattr(units, "output_tokens", None) or 0
+    return int(input_tokens), int(output_tokens)
+
+
+class LLMProvider:
+    """Interface commune des fournisseurs"""
+
+    name = None
+
+    def chat(self, request):
+        """Réponse complète (``LLMReply``)"""
+        raise NotImplementedError
+
+    async def achat(self, request):
+        """Équivalent asynchrone de ``chat``"""
+        raise NotImplementedError
+
+    def chat_stream(self, request):
+        """Fragments de texte au fil de l'eau, puis un ``LLMReply`` final"""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Prépare la connexion avant le premier appel"""
+
+
+class CohereProvider(LLMProvider):
+    """Client Cohere (SDK v5), construit au premier appel
+
+    Les processus qui ne servent pas le chatbot (migrate, workers
+    d'administration) ne paient ni l'import du SDK ni la construction.
+    """
+
+    name = "cohere"
+
+    def __init__(self, api_key, base_url=None, timeout=None):
+        self.api_key = api_key
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self._client = None
+        self._http_client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _options(self):
+        return dict(
+            api_key=_require_ascii(self.api_key, "COHERE_API_KEY"),
+            base_url=self.base_url,
+            client_name="cjk-api",
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import cohere
+                    import httpx
+
+                    # Configure Cohere avec httpx client UTF-8
+                    self._http_client = httpx.Client(headers=HTTP_HEADERS, timeout=self.timeout)
+                    self._client = cohere.Client(httpx_client=self._http_client, **self._options())
+        return self._client
+
+    @property
+    def http_client(self):
+        """Client httpx (connexions keep-alive réutilisées) du client Cohere"""
+        self.client
+        return self._http_client
+
+    @property
+    def async_client(self):
+        # Créé au premier usage dans la boucle d'événements du serveur.
+        if self._async_client is None:
+            import cohere
+            import httpx
+
+            self._async_client = cohere.AsyncClient(
+                httpx_client=httpx.AsyncClient(headers=HTTP_HEADERS, timeout=self.timeout),
+                **self._options()
+            )
+        return self._async_client
+
+    def chat(self, request):
+        response = self.client.chat(**request)
+        return LLMReply(response.text, *response_usage(response))
+
+    async def achat(self, request):
+        response = await self.async_client.chat(**request)
+        return LLMReply(response.text, *response_usage(response))
+
+    def chat_stream(self, request):
+        for event in self.client.chat_stream(**request):
+            event_type = getattr(event, "event_type", None)
+            if event_type == "text-generation":
+                yield event.text
+            elif event_type == "stream-end":
+                yield LLMReply(event.response.text, *response_usage(event.response))
+
+    def warm_up(self):
+        # Ouvre la connexion TLS, gardée ensuite par le pool keep-alive.
+        self.http_client.head(self.base_url, timeout=5.0)
+
+
+class FakeProvider(LLMProvider):
+    """Faux LLM dans le processus : latence, erreurs et débit simulés"""
+
+    name = "fake"
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def _reply(self, request):
+        text = self.llm.reply_text(request)
+        return LLMReply(text, *self.llm.usage(request, text))
+
+    def chat(self, request):
+        self.llm.check_error()
+        reply = self._reply(request)
+        time.sleep(self.llm.first_token_delay() + self.llm.generation_time(reply.text))
+        return reply
+
+    async def achat(self, request):
+        self.llm.check_error()
+        reply = self._reply(request)
+        await asyncio.sleep(self.llm.first_token_delay() + self.llm.generation_time(reply.text))
+        return reply
+
+    def chat_stream(self, request):
+        self.llm.check_error()
+        reply = self._reply(request)
+        time.sleep(self.llm.first_token_delay())
+        for token in self.llm.tokens(reply.text):
+            time.sleep(self.llm.token_delay)
+            yield token
+        yield reply
+
+
+def build_provider(timeout=None):
+    """Fournisseur désigné par ``CHATBOT_LLM_PROVIDER``"""
+    name = getattr(settings, "CHATBOT_LLM_PROVIDER", "cohere")
+    if name == "cohere":
+        return CohereProvider(
+            settings.COHERE_API_KEY,
+            base_url=getattr(settings, "CHATBOT_LLM_BASE_URL", None),
+            timeout=timeout,
+        )
+    elif name == "fake":
+        from .fake_llm import FakeLLM
+
+        return FakeProvider(FakeLLM.from_settings())
+    raise ValueError(f"CHATBOT_LLM_PROVIDER inconnu: {name}")
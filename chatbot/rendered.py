@@ -0,0 +1,100 @@
+"""Réponses reformulées à l'avance pour chaque (intention, clé, langue).
+
+L'artefact ``cjk_dataset.rendered.json`` est produit par la commande
+``prerender_answers`` et placé à côté du dataset. Chaque entrée garde
+l'empreinte de la réponse de référence dont elle est issue : si la
+référence change dans le dataset, l'entrée est ignorée à l'exécution et
+sera régénérée au prochain passage de la commande.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from .dataset import DatasetStore, get_dataset_path
+
+ARTIFACT_VERSION = 1
+# À incrémenter quand le prompt de reformulation change : toutes les
+# entrées existantes deviennent alors obsolètes.
+PROMPT_VERSION = 1
+
+
+def get_rendered_path():
+    base, _ = os.path.splitext(get_dataset_path())
+    return f"{base}.rendered.json"
+
+
+def entry_key(intent_name, response_key, lang):
+    return f"{intent_name}|{response_key}|{lang}"
+
+
+def source_hash(reference):
+    payload = f"{PROMPT_VERSION}\n{reference}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def iter_reference_answers(dataset):
+    """Toutes les réponses de référence du dataset : (clé, référence, lang)"""
+    for intent_name, responses in dataset.responses.items():
+        for response_key, by_lang in responses.items():
+            for lang, reference in by_lang.items():
+                if reference:
+                    yield entry_key(intent_name, response_key, lang), reference, lang
+
+
+class RenderedAnswers:
+    """Instantané de l'artefact des réponses pré-générées"""
+
+    def __init__(self, data, checksum=None):
+        self.data = data
+        self.checksum = checksum
+        if data.get("version") != ARTIFACT_VERSION:
+            self.entries = {}
+        else:
+            self.entries = data.get("entries", {})
+
+    def get(self, intent_name, response_key, lang, reference):
+        entry = self.entries.get(entry_key(intent_name, response_key, lang))
+        if not entry or entry.get("source") != source_hash(reference):
+            return None
+        return entry.get("text") or None
+
+
+def load_artifact(path):
+    """Entrées de l'artefact sur disque (vide s'il n'existe pas)"""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return RenderedAnswers(json.load(file)).entries
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_artifact(path, entries, model):
+    """Écrit l'artefact de façon atomique"""
+    payload = {
+        "version": ARTIFACT_VERSION,
+        "prompt_version": PROMPT_VERSION,
+        "model": model,
+        "entries": dict(sorted(entries.items())),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(payload, file, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_rendered_answer(intent_name, response_key, lang, reference):
+    """Réponse pré-générée à jour pour ce triplet, ou None"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DatasetStore(get_rendered_path(), RenderedAnswers, required=False)
+    rendered = _store.get()
+    if rendered is None:
+        return None
+    return rendered.get(intent_name, response_key, lang, reference)
@@ -0,0 +1,90 @@
+"""Rejeu hors ligne des échanges capturés par ``capture``.
+
+Les messages d'une même session sont renvoyés à ``send_message`` dans
+leur ordre d'origine, pour que l'historique se reconstruise comme en
+production. Les sessions sont réparties entre ``concurrency`` threads.
+Avec le faux LLM (``fake_llm``), on mesure le coût propre du chatbot sans
+réseau ni quota.
+"""
+import math
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .chatbot_service import send_message
+from .metrics import current_trace
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def percentiles(values, quantiles=QUANTILES):
+    """Percentiles exacts (rang le plus proche), en millisecondes arrondies"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {
+        f"p{round(q * 100)}": round(ordered[max(0, math.ceil(q * len(ordered)) - 1)], 3)
+        for q in quantiles
+    }
+    result["max"] = round(ordered[-1], 3)
+    result["mean"] = round(sum(ordered) / len(ordered), 3)
+    return result
+
+
+def group_sessions(records, limit=None):
+    """Messages par session, dans l'ordre de capture"""
+    sessions = OrderedDict()
+    count = 0
+    for record in records:
+        if limit is not None and count >= limit:
+            break
+        sessions.setdefault(record.get("session") or "default", []).append(record)
+        count += 1
+    return sessions
+
+
+def replay(records, concurrency=8, limit=None):
+    """Rejoue ``records`` et renvoie débit, latences et issues"""
+    sessions = group_sessions(records, limit)
+    run = uuid.uuid4().hex[:8]
+    latencies = []
+    captured = []
+    outcomes = Counter()
+    stages = defaultdict(list)
+    lock = threading.Lock()
+
+    def replay_session(item):
+        session, session_records = item
+        for record in session_records:
+            started = time.perf_counter()
+            send_message(record["text"], f"replay-{run}-{session}")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            trace = current_trace()
+            with lock:
+                latencies.append(elapsed_ms)
+                if record.get("total_ms") is not None:
+                    captured.append(record["total_ms"])
+                if trace is not None:
+                    outcomes[trace.outcome or "unknown"] += 1
+                    for name, value in trace.timings.items():
+                        stages[name].append(value)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="chatbot-replay") as pool:
+        for _ in pool.map(replay_session, sessions.items()):
+            pass
+    wall = time.perf_counter() - started
+
+    return {
+        "messages": len(latencies),
+        "sessions": len(sessions),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "latency_ms": percentiles(latencies),
+        "captured_latency_ms": percentiles(captured),
+        "outcomes": dict(outcomes.most_common()),
+        "stages_ms": {name: percentiles(values, (0.5, 0.95)) for name, values in sorted(stages.items())},
+    }
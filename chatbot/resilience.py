@@ -0,0 +1,213 @@
+"""Résilience des appels au LLM : budget de latence, requêtes doublées, disjoncteur.
+
+- Chaque appel a un budget (en secondes) au-delà duquel il est abandonné.
+- Si la réponse tarde au-delà du p95 récent du même type d'appel, une
+  seconde requête identique est lancée et la première réponse reçue gagne.
+- Après ``failure_threshold`` échecs ou dépassements consécutifs, le
+  disjoncteur s'ouvre : les appels échouent immédiatement avec
+  ``CircuitOpenError`` pendant ``reset_timeout`` secondes, puis un appel
+  d'essai décide de sa fermeture.
+
+La requête doublée qui perd la course est facturée elle aussi : une fois
+partie, elle n'est pas abandonnée et sa réponse est remise à
+``on_discarded`` (décompte des jetons).
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+
+class LLMUnavailable(Exception):
+    """Le LLM n'a pas répondu dans les temps ou le disjoncteur est ouvert"""
+
+
+class CircuitOpenError(LLMUnavailable):
+    pass
+
+
+class LLMTimeout(LLMUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Lève ``CircuitOpenError`` si l'appel ne doit pas être tenté
+
+        Renvoie vrai si l'appel autorisé est l'appel d'essai.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            # Semi-ouvert : un seul appel d'essai à la fois.
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+        raise CircuitOpenError("Disjoncteur LLM ouvert")
+
+    def release(self):
+        """Abandon de l'appel d'essai sans verdict : un autre pourra le remplacer"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """Latences récentes d'un type d'appel, pour estimer leur p95"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, default=None):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 10:
+            return default
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ResilientCaller:
+    """Exécute les appels au LLM sous budget, avec requête doublée et disjoncteur"""
+
+    def __init__(self, breaker, hedge_min_delay=1.0, hedge=True, max_workers=16, on_discarded=None):
+        self.breaker = breaker
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge = hedge
+        self.on_discarded = on_discarded
+        self._trackers = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chatbot-llm")
+
+    def tracker(self, kind):
+        return self._trackers.setdefault(kind, LatencyTracker())
+
+    def hedge_delay(self, kind, budget):
+        delay = self.tracker(kind).quantile(0.95, default=budget / 2)
+        return min(max(delay, self.hedge_min_delay), budget)
+
+    def call(self, kind, func, budget):
+        self.breaker.allow()
+        started = time.monotonic()
+        deadline = started + budget
+        hedge_at = started + self.hedge_delay(kind, budget) if self.hedge else None
+        pending = {self._executor.submit(func)}
+        last_error = None
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=wake - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    last_error = exc
+                    continue
+                self._succeeded(kind, started, pending)
+                return result
+            # Première requête en échec ou trop lente : une seconde part.
+            if hedge_at is not None and (not pending or time.monotonic() >= hedge_at):
+                hedge_at = None
+                pending.add(self._executor.submit(func))
+
+        return self._failed(kind, budget, pending, last_error)
+
+    async def acall(self, kind, factory, budget):
+        """Équivalent asynchrone : ``factory`` renvoie une nouvelle coroutine"""
+        probe = self.breaker.allow()
+        started = time.monotonic()
+        deadline = started + budget
+        hedge_at = started + self.hedge_delay(kind, budget) if self.hedge else None
+        pending = {asyncio.ensure_future(factory())}
+        last_error = None
+
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    self._succeeded(kind, started, pending)
+                    return task.result()
+                if hedge_at is not None and (not pending or time.monotonic() >= hedge_at):
+                    hedge_at = None
+                    pending.add(asyncio.ensure_future(factory()))
+        except BaseException:
+            # Requête annulée (client parti) : l'appel d'essai est libéré.
+            for task in pending:
+                task.cancel()
+            if probe:
+                self.breaker.release()
+            raise
+
+        return self._failed(kind, budget, pending, last_error)
+
+    def _failed(self, kind, budget, pending, last_error):
+        for future in pending:
+            future.cancel()
+        self.breaker.record_failure()
+        if not pending and last_error is not None:
+            raise last_error
+        raise LLMTimeout(f"Pas de reponse du LLM en {budget:.1f} s ({kind})")
+
+    def _succeeded(self, kind, started, pending):
+        self.tracker(kind).observe(time.monotonic() - started)
+        self.breaker.record_success()
+        if self.on_discarded is None:
+            for future in pending:
+                future.cancel()
+            return
+        context = contextvars.copy_context()
+        for future in pending:
+            # Un thread ne s'annule qu'avant de démarrer ; une tâche asyncio
+            # a déjà envoyé sa requête.
+            if isinstance(future, asyncio.Future) or not future.cancel():
+                future.add_done_callback(partial(self._discarded, context))
+
+    def _discarded(self, context, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        context.run(self.on_discarded, future.result())
@@ -0,0 +1,291 @@
+"""Passages des articles, actualités et activités publiés pertinents pour une question.
+
+Le titre et le contenu de chaque élément publié sont découpés en passages
+d'environ ``PASSAGE_CHARS`` caractères, indexés en BM25 dans le processus.
+Pour une question générale, les ``CHATBOT_RETRIEVAL_TOP_K`` meilleurs
+passages (un par élément) tiennent dans ``CHATBOT_RETRIEVAL_BUDGET``
+caractères et remplacent la liste des derniers articles et activités du
+contexte.
+
+Comme pour les intentions en base (``intent_store``), les signaux
+incrémentent un compteur de version dans ``CHATBOT_CONTEXT_CACHE`` ;
+chaque worker ne recharge alors que les éléments dont ``updated_at`` a
+changé, et retire ceux supprimés ou dépubliés.
+"""
+import heapq
+import logging
+import math
+import re
+import textwrap
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.html import strip_tags
+
+from activities.models import Activity
+from blog.models import BlogPost
+from news.models import News
+
+from .context import bump_counter, get_counter
+from .dataset import CHECK_INTERVAL
+from .keywords import split_words
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_ENABLED = getattr(settings, "CHATBOT_RETRIEVAL", True)
+TOP_K = getattr(settings, "CHATBOT_RETRIEVAL_TOP_K", 3)
+CHAR_BUDGET = getattr(settings, "CHATBOT_RETRIEVAL_BUDGET", 1000)
+SYNC_INTERVAL = getattr(settings, "CHATBOT_RETRIEVAL_SYNC_INTERVAL", 60.0)
+VERSION_CACHE_KEY = "chatbot:content:version"
+PASSAGE_CHARS = 400
+
+# Mots vides français et anglais, ignorés à l'indexation comme dans les questions
+STOPWORDS = frozenset("""
+a au aux avec c ce ces cet cette d dans de des du elle elles en est et il ils j je l la le les leur leurs
+m me mes mon n ne nos notre nous on ou par pas plus pour qu que quel quelle quelles quels qui quoi s sa
+se ses son sont sur t ta te tes ton tu un une vos votre vous y
+an and are at be by do does for from how in is it of on or that the this to was what when where which
+who with you your
+""".split())
+
+_sentence_re = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def terms(text):
+    """Termes indexés : mots repliés, sans élision ni mots vides, pluriel simple retiré"""
+    result = []
+    for word in split_words(text)[0]:
+        for part in word.split("'"):
+            if not part or part in STOPWORDS:
+                continue
+            if len(part) > 3 and part[-1] in "sx":
+                part = part[:-1]
+            result.append(part)
+    return result
+
+
+def split_passages(text, size=PASSAGE_CHARS):
+    """Phrases de ``text`` regroupées en passages d'au plus ``size`` caractères"""
+    passages = []
+    current = ""
+    for sentence in _sentence_re.split(strip_tags(text or "")):
+        for piece in textwrap.wrap(" ".join(sentence.split()), size):
+            if current and len(current) + 1 + len(piece) > size:
+                passages.append(current)
+                current = ""
+            current = f"{current} {piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _truncate(text, size):
+    if len(text) <= size:
+        return text
+    return text[:max(0, size - 3)].rsplit(" ", 1)[0] + "..."
+
+
+Source = namedtuple("Source", ["model", "label", "load"])
+
+
+def _load_blog(pks):
+    rows = BlogPost.objects.filter(pk__in=pks).values_list("id", "title", "content")
+    return {pk: (title, content) for pk, title, content in rows}
+
+
+def _load_news(pks):
+    rows = News.objects.filter(pk__in=pks).values_list("id", "title", "content")
+    return {pk: (title, content) for pk, title, content in rows}
+
+
+def _load_activities(pks):
+    rows = Activity.objects.filter(pk__in=pks).values_list("id", "title", "description", "date_activite")
+    return {pk: (f"{title} ({date:%d/%m/%Y})", description) for pk, title, description, date in rows}
+
+
+SOURCES = {
+    "blog": Source(BlogPost, "Article", _load_blog),
+    "news": Source(News, "Actualite", _load_news),
+    "activity": Source(Activity, "Activite", _load_activities),
+}
+
+
+class Passage(namedtuple("Passage", ["kind", "pk", "title", "text"])):
+    __slots__ = ()
+
+    def format(self):
+        label = SOURCES[self.kind].label
+        return f"[{label}] {self.title}: {self.text}" if self.text else f"[{label}] {self.title}"
+
+
+class BM25Index:
+    """Index BM25 de passages, modifiable document par document"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        # terme -> {id du passage: occurrences}
+        self._postings = defaultdict(dict)
+        self._lengths = {}
+        self._terms = {}
+        self._passages = {}
+        # (kind, pk) -> ids de ses passages
+        self._documents = {}
+        self._total_length = 0
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add_document(self, kind, pk, title, text):
+        """Indexe (ou réindexe) un élément ; le titre compte dans chacun de ses passages"""
+        self.remove_document(kind, pk)
+        title_terms = terms(title)
+        ids = []
+        for chunk in split_passages(text) or [""]:
+            counts = Counter(title_terms + terms(chunk))
+            if not counts:
+                continue
+            passage_id = self._next_id
+            self._next_id += 1
+            for term, count in counts.items():
+                self._postings[term][passage_id] = count
+            length = sum(counts.values())
+            self._lengths[passage_id] = length
+            self._total_length += length
+            self._terms[passage_id] = tuple(counts)
+            self._passages[passage_id] = Passage(kind, pk, title, chunk)
+            ids.append(passage_id)
+        self._documents[(kind, pk)] = ids
+
+    def remove_document(self, kind, pk):
+        for passage_id in self._documents.pop((kind, pk), ()):
+            for term in self._terms.pop(passage_id):
+                postings = self._postings[term]
+                del postings[passage_id]
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= self._lengths.pop(passage_id)
+            del self._passages[passage_id]
+
+    def search(self, query, k):
+        """(score, passage) des ``k`` meilleurs passages, un par élément"""
+        count = len(self._lengths)
+        if not count or k <= 0:
+            return []
+        average = self._total_length / count
+        scores = defaultdict(float)
+        for term in set(terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[passage_id] / average)
+                scores[passage_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        best = {}
+        for passage_id, score in scores.items():
+            passage = self._passages[passage_id]
+            key = (passage.kind, passage.pk)
+            if key not in best or score > best[key][0]:
+                best[key] = (score, passage)
+        return heapq.nlargest(k, best.values(), key=lambda item: item[0])
+
+
+def notify_content_changed():
+    """Prévient les workers, une fois la transaction validée"""
+    transaction.on_commit(lambda: bump_counter(VERSION_CACHE_KEY))
+
+
+class ContentStore:
+    """Index des éléments publiés, tenu à jour depuis la base"""
+
+    def __init__(self, check_interval=CHECK_INTERVAL, sync_interval=SYNC_INTERVAL):
+        self.check_interval = check_interval
+        self.sync_interval = sync_interval
+        self.index = BM25Index()
+        # Les recherches et les mises à jour de l'index sont exclusives.
+        self._lock = threading.Lock()
+        self._stamps = {}
+        self._version = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._synced_at = 0.0
+
+    def search(self, query, k):
+        now = time.monotonic()
+        with self._lock:
+            if not self._loaded or now - self._checked_at >= self.check_interval:
+                self._check(now)
+                self._checked_at = time.monotonic()
+            return self.index.search(query, k)
+
+    def _check(self, now):
+        version = get_counter(VERSION_CACHE_KEY)
+        if self._loaded and version == self._version and now - self._synced_at < self.sync_interval:
+            return
+        self.sync()
+        self._version = version
+        self._synced_at = time.monotonic()
+        self._loaded = True
+
+    def sync(self):
+        """Recharge les éléments modifiés ; nombre d'éléments réindexés ou retirés"""
+        stamps = {}
+        for kind, source in SOURCES.items():
+            for pk, updated_at in source.model.objects.filter(is_published=True).values_list("id", "updated_at"):
+                stamps[(kind, pk)] = updated_at
+        changed = defaultdict(list)
+        for key, stamp in stamps.items():
+            if self._stamps.get(key) != stamp:
+                changed[key[0]].append(key[1])
+        removed = [key for key in self._stamps if key not in stamps]
+
+        for key in removed:
+            self.index.remove_document(*key)
+            del self._stamps[key]
+        updated = 0
+        for kind, pks in changed.items():
+            for pk, (title, text) in SOURCES[kind].load(pks).items():
+                self.index.add_document(kind, pk, title, text)
+                self._stamps[(kind, pk)] = stamps[(kind, pk)]
+                updated += 1
+        if updated or removed:
+            logger.info("Index du contenu synchronise: %d elements reindexes, %d retires", updated, len(removed))
+        return updated + len(removed)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_content_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ContentStore()
+    return _store
+
+
+def retrieve(question, top_k=TOP_K, budget=CHAR_BUDGET):
+    """Passages les plus pertinents pour ``question``, dans ``budget`` caractères au total"""
+    if not RETRIEVAL_ENABLED or top_k <= 0:
+        return []
+    selected = []
+    used = 0
+    for _, passage in get_content_store().search(question, top_k):
+        size = len(passage.format())
+        if used + size > budget:
+            if selected:
+                continue
+            # Même seul, le meilleur passage est raccourci au budget.
+            passage = passage._replace(text=_truncate(passage.text, max(0, budget - (size - len(passage.text)))))
+            size = len(passage.format())
+        selected.append(passage)
+        used += size + 3
+    return selected
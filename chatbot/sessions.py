@@ -0,0 +1,176 @@
+"""Historique des conversations du chatbot.
+
+Deux implémentations, choisies par ``CHATBOT_SESSION_BACKEND`` :
+
+- ``memory`` : dictionnaire en mémoire du processus, borné (LRU sur le
+  nombre de sessions, expiration après inactivité, historique tronqué) ;
+- ``cache`` : cache Django partagé (``CHATBOT_SESSION_CACHE``), pour que
+  tous les workers gunicorn voient la même conversation. Avec
+  ``DatabaseCache`` l'historique vit dans une table, avec Redis ou
+  Memcached dans le serveur de cache ; l'expiration et l'éviction sont
+  alors assurées par le backend. Les ajouts à une même session sont
+  sérialisés entre les workers par un verrou posé avec ``cache.add``.
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+SESSION_TTL = getattr(settings, "CHATBOT_SESSION_TTL", 60 * 60)
+MAX_MESSAGES = getattr(settings, "CHATBOT_SESSION_MAX_MESSAGES", 20)
+MAX_SESSIONS = getattr(settings, "CHATBOT_MAX_SESSIONS", 10000)
+# Durée de vie du verrou d'ajout : un worker arrêté en plein ajout ne
+# bloque pas la session au-delà.
+APPEND_LOCK_TIMEOUT = 5
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Interface commune des stockages d'historique"""
+
+    def get_history(self, session_key):
+        """Copie de l'historique de la session (liste de messages Cohere)"""
+        raise NotImplementedError
+
+    def append(self, session_key, *messages):
+        raise NotImplementedError
+
+    def reset(self, session_key):
+        raise NotImplementedError
+
+    async def aget_history(self, session_key):
+        return await sync_to_async(self.get_history)(session_key)
+
+    async def aappend(self, session_key, *messages):
+        await sync_to_async(self.append)(session_key, *messages)
+
+
+class InMemorySessionStore(SessionStore):
+    """Historique en mémoire, propre à chaque processus"""
+
+    def __init__(self, ttl=SESSION_TTL, max_messages=MAX_MESSAGES, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Les sessions sont rangées de la moins à la plus récemment utilisée :
+        # les expirées sont donc en tête.
+        while self._sessions:
+            key, (last_seen, _) = next(iter(self._sessions.items()))
+            if now - last_seen < self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[key]
+
+    def get_history(self, session_key):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.get(session_key)
+            if entry is None:
+                return []
+            self._sessions[session_key] = (now, entry[1])
+            self._sessions.move_to_end(session_key)
+            return list(entry[1])
+
+    def append(self, session_key, *messages):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_key, None)
+            history = entry[1] if entry else []
+            history.extend(messages)
+            del history[:-self.max_messages]
+            self._sessions[session_key] = (now, history)
+            self._evict(now)
+
+    def reset(self, session_key):
+        with self._lock:
+            self._sessions.pop(session_key, None)
+
+    # Opérations purement en mémoire : inutile de passer par un thread.
+    async def aget_history(self, session_key):
+        return self.get_history(session_key)
+
+    async def aappend(self, session_key, *messages):
+        self.append(session_key, *messages)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class CacheSessionStore(SessionStore):
+    """Historique dans un cache Django partagé entre les workers"""
+
+    def __init__(self, alias="default", ttl=SESSION_TTL, max_messages=MAX_MESSAGES):
+        self.alias = alias
+        self.ttl = ttl
+        self.max_messages = max_messages
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, session_key):
+        digest = hashlib.sha256(str(session_key).encode("utf-8")).hexdigest()
+        return f"chatbot:session:{digest}"
+
+    def get_history(self, session_key):
+        history = self.cache.get(self._key(session_key))
+        if history is None:
+            return []
+        # Prolonge la session : l'expiration porte sur l'inactivité.
+        self.cache.touch(self._key(session_key), self.ttl)
+        return list(history)
+
+    def append(self, session_key, *messages):
+        key = self._key(session_key)
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        # ``add`` n'écrit que si la clé est absente, dans tous les backends :
+        # un seul worker à la fois lit puis réécrit l'historique.
+        deadline = time.monotonic() + APPEND_LOCK_TIMEOUT
+        locked = self.cache.add(lock_key, token, APPEND_LOCK_TIMEOUT)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.005)
+            locked = self.cache.add(lock_key, token, APPEND_LOCK_TIMEOUT)
+        if not locked:
+            logger.warning("Verrou de session non obtenu en %d s, ajout sans verrou", APPEND_LOCK_TIMEOUT)
+        try:
+            history = self.cache.get(key) or []
+            history.extend(messages)
+            self.cache.set(key, history[-self.max_messages:], self.ttl)
+        finally:
+            if locked and self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def reset(self, session_key):
+        self.cache.delete(self._key(session_key))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Stockage d'historique configuré pour le processus"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = getattr(settings, "CHATBOT_SESSION_BACKEND", "memory")
+                if backend == "cache":
+                    _store = CacheSessionStore(getattr(settings, "CHATBOT_SESSION_CACHE", "default"))
+                elif backend == "memory":
+                    _store = InMemorySessionStore()
+                else:
+                    raise ValueError(f"CHATBOT_SESSION_BACKEND inconnu: {backend}")
+    return _store
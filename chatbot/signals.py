@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from activities.models import Activity
+from blog.models import BlogPost, Category
+from members.models import Member
+from news.models import News
+
+from .context import invalidate_context
+from .intent_store import notify_intents_changed, touch_intent
+from .models import Intent, Response, TrainingPhrase
+from .retrieval import notify_content_changed
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+@receiver(post_delete, sender=Member)
+def invalidate_chatbot_context(sender, **kwargs):
+    """Le contexte du chatbot sera reconstruit au prochain message"""
+    # Après validation : reconstruit plus tôt, il relirait les anciennes lignes.
+    transaction.on_commit(invalidate_context)
+
+
+@receiver(post_save, sender=Member)
+def invalidate_chatbot_context_for_member(sender, update_fields=None, **kwargs):
+    # Une connexion ne met à jour que last_login : le contexte ne change pas.
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    transaction.on_commit(invalidate_context)
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+def notify_chatbot_content(sender, **kwargs):
+    """Les workers réindexeront l'élément modifié pour la recherche de passages"""
+    notify_content_changed()
+
+
+@receiver(post_save, sender=Intent)
+@receiver(post_delete, sender=Intent)
+def notify_chatbot_intents(sender, **kwargs):
+    """Les workers rechargeront l'intention modifiée"""
+    notify_intents_changed()
+
+
+@receiver(post_save, sender=TrainingPhrase)
+@receiver(post_delete, sender=TrainingPhrase)
+@receiver(post_save, sender=Response)
+@receiver(post_delete, sender=Response)
+def touch_chatbot_intent(sender, instance, **kwargs):
+    touch_intent(instance.intent_id)
@@ -0,0 +1,270 @@
+"""Réponses du chatbot diffusées au fil de l'eau (server-sent events).
+
+La ligne d'empathie part immédiatement, puis les fragments du modèle au
+fur et à mesure de leur arrivée, puis la ligne de contact. Le nettoyage
+de ``_clean_model_answer`` (salutations en tête, doublon de la ligne
+d'empathie, deux phrases au plus, espaces) est appliqué de façon
+incrémentale par ``StreamingAnswerCleaner``.
+"""
+import json
+import logging
+import re
+from contextlib import closing
+
+from asgiref.sync import sync_to_async
+
+from .chatbot_service import (
+    CONTACT_LINES,
+    EMPATHY_LINES,
+    GREETING_RESPONSES,
+    UNAVAILABLE_RESPONSES,
+    _compose_reply,
+    _general_request,
+    _is_greeting_only,
+    _normalize_line,
+    _prepared_answer,
+    _reformulation_request,
+    _remember,
+    _run_stages,
+    _strip_greetings,
+    get_chat,
+    get_provider,
+    get_response_for_intent,
+    llm_caller,
+    question_context,
+)
+from .context import get_context_snapshot
+from .dataset import get_dataset
+from .metrics import finish_trace, record_usage, stage, start_trace
+from .prompt import prompt_history
+from .providers import LLMReply
+from .resilience import LLMUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Texte retenu avant de décider si le début est une salutation à retirer.
+GREETING_LOOKAHEAD = 40
+
+_sentence_end_re = re.compile(r"[.!?]\s")
+
+
+class StreamingAnswerCleaner:
+    """Version incrémentale de ``_clean_model_answer``
+
+    ``feed`` reçoit les fragments du modèle et renvoie le texte qui peut
+    déjà être envoyé ; ``finish`` renvoie le reste. ``done`` passe à vrai
+    dès que la deuxième phrase est complète : la suite est ignorée.
+    """
+
+    def __init__(self, lang, max_sentences=2):
+        self.empathy = EMPATHY_LINES.get(lang, EMPATHY_LINES["fr"])
+        self.max_sentences = max_sentences
+        self.sentences = 0
+        self.started = False
+        self.done = False
+        self._pending = ""
+        self._emitted = []
+
+    @property
+    def text(self):
+        return "".join(self._emitted).strip()
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return ""
+        self._pending += chunk
+        if not self.started:
+            if len(self._pending) < GREETING_LOOKAHEAD and not _sentence_end_re.search(self._pending):
+                return ""
+            self._pending = self._strip_head(self._pending)
+            self.started = True
+        # Garde de quoi reconnaître la ligne d'empathie coupée entre deux
+        # fragments.
+        keep = len(self.empathy) - 1
+        ready, self._pending = self._pending[:-keep or None], self._pending[-keep:] if keep else ""
+        if len(ready) == 0:
+            return ""
+        return self._emit(ready)
+
+    def finish(self):
+        if self.done:
+            return ""
+        pending, self._pending = self._pending, ""
+        if not self.started:
+            pending = self._strip_head(pending)
+            self.started = True
+        out = self._emit(pending.rstrip())
+        self.done = True
+        return out.rstrip()
+
+    def _strip_head(self, text):
+        text = text.replace(self.empathy, "")
+        # _strip_greetings retire aussi les espaces de fin, qui séparent
+        # peut-être ce début du fragment suivant.
+        trailing = text[len(text.rstrip()):]
+        return _strip_greetings(text) + trailing
+
+    def _emit(self, text):
+        text = text.replace(self.empathy, "")
+        previous = self._emitted[-1][-1:] if self._emitted else ""
+        # Une fin de phrase peut être coupée entre deux fragments.
+        scan = previous + text
+        for match in _sentence_end_re.finditer(scan):
+            self.sentences += 1
+            if self.sentences >= self.max_sentences:
+                text = scan[:match.start() + 1][len(previous):]
+                self.done = True
+                self._pending = ""
+                break
+        text = re.sub(r"\s+", " ", text)
+        if not self._emitted or previous == " ":
+            text = text.lstrip()
+        if text:
+            self._emitted.append(text)
+        return text
+
+
+def _event(event_type, **data):
+    data["type"] = event_type
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_model(request, cleaner):
+    """Diffuse la réponse du modèle nettoyée, fragment par fragment.
+
+    Un flux ne peut pas être doublé : seul le disjoncteur s'applique.
+    """
+    breaker = llm_caller.breaker
+    probe = breaker.allow()
+    try:
+        with stage("llm.stream"):
+            with closing(get_provider().chat_stream(request)) as stream:
+                for chunk in stream:
+                    if isinstance(chunk, LLMReply):
+                        record_usage(chunk.input_tokens, chunk.output_tokens)
+                        continue
+                    text = cleaner.feed(chunk)
+                    if text:
+                        yield text
+                    if cleaner.done:
+                        # Deux phrases reçues : inutile d'attendre la fin de la génération.
+                        break
+    except Exception:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        # Flux fermé en cours de route (client parti) : rien n'est appris du
+        # modèle, mais l'appel d'essai ne doit pas rester pris.
+        if probe:
+            breaker.release()
+        raise
+    breaker.record_success()
+    tail = cleaner.finish()
+    if tail:
+        yield tail
+
+
+def stream_message(text, session_key):
+    """Équivalent de ``send_message`` produisant des événements SSE"""
+    trace = start_trace()
+    outcome = "error"
+    chat_history = get_chat(session_key)
+    dataset = get_dataset()
+
+    try:
+        user_text = (text or "").strip()
+        greeting = _is_greeting_only(user_text)
+        user_language, match, db_context = _run_stages(user_text, chat_history, dataset, greeting)
+        trace.language = user_language
+        if greeting:
+            outcome = "greeting"
+            bot_response = GREETING_RESPONSES.get(user_language, GREETING_RESPONSES["fr"])
+            yield _event("line", text=bot_response)
+            _remember(session_key, user_text, bot_response)
+            yield _event("done", response=bot_response)
+            return
+
+        yield _event("line", text=EMPATHY_LINES.get(user_language, EMPATHY_LINES["fr"]))
+
+        trace.intent = match.intent_name
+        dataset_response = get_response_for_intent(match.intent_name, match.response_key, user_language, dataset)
+        cleaner = StreamingAnswerCleaner(user_language)
+
+        if dataset_response:
+            add_contact = False
+            outcome = "dataset"
+            main_answer = _prepared_answer(match, dataset_response, user_language, dataset)
+            if main_answer is not None:
+                main_answer = _normalize_line(main_answer)
+                yield _event("token", text=main_answer)
+            else:
+                outcome = "reformulated"
+                request = _reformulation_request(dataset_response, user_language, question=user_text)
+                streamed = False
+                try:
+                    for token in _stream_model(request, cleaner):
+                        streamed = True
+                        yield _event("token", text=token)
+                except Exception:
+                    if streamed:
+                        raise
+                    logger.warning("Reformulation impossible, reponse du dataset servie", exc_info=True)
+                    outcome = "fallback"
+                main_answer = cleaner.text if streamed else ""
+                if not main_answer:
+                    main_answer = dataset_response.strip()
+                    yield _event("token", text=main_answer)
+        else:
+            add_contact = True
+            outcome = "general"
+            if db_context is None:
+                with stage("context"):
+                    db_context = get_context_snapshot()
+            db_context = question_context(user_text, db_context)
+            request = _general_request(
+                user_text, user_language, db_context.context_block, prompt_history(chat_history)
+            )
+            try:
+                for token in _stream_model(request, cleaner):
+                    yield _event("token", text=token)
+                main_answer = cleaner.text
+            except LLMUnavailable:
+                outcome = "fallback"
+                main_answer = UNAVAILABLE_RESPONSES.get(user_language, UNAVAILABLE_RESPONSES["fr"])
+                yield _event("token", text=main_answer)
+            yield _event("line", text=CONTACT_LINES.get(user_language, CONTACT_LINES["fr"]))
+
+        bot_response = _compose_reply(main_answer, user_language, add_contact=add_contact)
+        _remember(session_key, user_text, bot_response)
+        yield _event("done", response=bot_response)
+
+    except Exception:
+        outcome = "error"
+        logger.exception("Erreur du chatbot (flux)")
+        yield _event("error", text="Desole, une erreur s'est produite. Veuillez reessayer.")
+
+    finally:
+        finish_trace(trace, outcome)
+
+
+_exhausted = object()
+
+
+async def astream_message(text, session_key):
+    """``stream_message`` pour les déploiements ASGI
+
+    Sous ASGI, Django lit un itérateur synchrone en entier avant d'envoyer
+    le premier octet. Ici chaque événement est produit dans un thread puis
+    envoyé aussitôt.
+    """
+    events = stream_message(text, session_key)
+    step = sync_to_async(next)
+    try:
+        while True:
+            event = await step(events, _exhausted)
+            if event is _exhausted:
+                break
+            yield event
+    finally:
+        # Client déconnecté : le générateur termine sa trace.
+        await sync_to_async(events.close)()
@@ -1,3 +1,769 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from activities.models import Activity
+from blog.models import BlogPost, Category
+from members.models import Member
+from news.models import News
+
+from .batch import BatchClassifier
+from .capture import CaptureWriter
+from .chatbot_service import _clean_model_answer, _is_greeting_only, find_intent, llm_caller, quick_language_guess
+from .coalesce import AsyncSingleFlight, SingleFlight
+from .compiled import MappedIntentIndex, load_compiled, write_compiled
+from .context import CONTEXT_CACHE_KEY, get_context_cache, get_counter
+from .dataset import ChatbotDataset, DatasetStore, get_compiled_path, get_dataset_path
+from .intent_index import IntentIndex, LiveIntentIndex, canonical_phrase
+from .intent_store import DatabaseIntentStore, import_intents
+from .language import LanguageClassifier
+from .providers import LLMProvider, LLMReply
+from .resilience import CircuitBreaker, CircuitOpenError, LLMTimeout, ResilientCaller
+from . import retrieval
+from .sessions import CacheSessionStore, InMemorySessionStore
+from .streaming import StreamingAnswerCleaner, _stream_model
+
+
+class IntentResolutionTests(SimpleTestCase):
+    """Intentions retenues pour des questions dont la résolution a changé avec l'index"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(get_dataset_path(), encoding="utf-8") as file:
+            data = json.load(file)
+        cls.dataset = ChatbotDataset(data, "tests", index=IntentIndex.from_dataset(data))
+
+    def assertIntent(self, text, intent_name):
+        self.assertEqual(find_intent(text, self.dataset)[0], intent_name)
+
+    def test_best_scoring_phrase_wins(self):
+        # L'ancienne boucle s'arrêtait sur « Mission du CJK », première
+        # phrase au-dessus de 0.6.
+        self.assertIntent("Musique au CJK", "activites_culture")
+
+    def test_template_numbers_are_ignored(self):
+        cases = [
+            ("Musique 57", "activites_culture"),
+            ("Sport au CJK 72", "activites_sport"),
+            ("Michezo CJK 15", "activites_sport"),
+            ("Aderesi 45", "contact_cjk"),
+        ]
+        for text, intent_name in cases:
+            with self.subTest(text=text):
+                self.assertIntent(text, intent_name)
+
+    def test_unmatched_question_is_a_general_inquiry(self):
+        self.assertEqual(find_intent("xqzw vbnm", self.dataset), ("general_inquiry", None))
+
+    def test_batch_classification_matches_the_online_matcher(self):
+        phrases = [phrase for intent in self.dataset.data["intents"] for phrase in intent["training_phrases"]]
+        texts = phrases[::40] + [phrase[1:] + " 7" for phrase in phrases[5::40]] + ["xqzw vbnm", ""]
+        classifier = BatchClassifier(self.dataset.index)
+        for top_k in (1, 3):
+            results = classifier.classify(texts, top_k=top_k)
+            for text, result in zip(texts, results):
+                with self.subTest(text=text, top_k=top_k):
+                    self.assertEqual((result["intent"], result["response_key"]), find_intent(text, self.dataset))
+                    # Meilleures intentions : celles du classement de chaque candidate en ligne.
+                    index = self.dataset.index
+                    query = canonical_phrase(text)
+                    scores = index.intent_scores(query, index.candidates(query)) if query else {}
+                    expected = sorted(scores.items(), key=lambda item: (-item[1][0], item[1][1]))[:top_k]
+                    self.assertEqual(
+                        [(entry["intent"], entry["score"]) for entry in result["top"]],
+                        [(index.intents[intent_id][0], round(score, 4)) for intent_id, (score, _, _) in expected],
+                    )
+
+
+LIVE_DATASET = {
+    "intents": [
+        {
+            "intent_name": "horaires",
+            "training_phrases": ["Horaires du centre", "Le centre ouvre a quelle heure ?", "Ou est le centre ?"],
+            "responses": {"default": {"fr": "Du lundi au samedi."}},
+        },
+        {
+            "intent_name": "adresse",
+            "training_phrases": ["Adresse du centre", "Ou est le centre ?"],
+            "responses": {"default": {"fr": "A Kamenge, Bujumbura."}},
+        },
+        {
+            "intent_name": "contact",
+            "training_phrases": ["Comment vous contacter ?", "Numero de telephone"],
+            "responses": {"default": {"fr": "Appelez le secretariat."}},
+        },
+    ]
+}
+
+
+class LiveIntentIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = LiveIntentIndex.from_dataset(LIVE_DATASET)
+
+    def assertMatch(self, index, text, intent_name):
+        match = index.best_match(text, cutoff=0.9)
+        self.assertEqual(match.intent_name if match else None, intent_name)
+
+    def test_replace_intent_swaps_its_phrases(self):
+        self.index.replace_intent("contact", "whatsapp", ["Numero WhatsApp du centre"])
+        self.assertMatch(self.index, "Numero WhatsApp du centre", "contact")
+        self.assertMatch(self.index, "Comment vous contacter ?", None)
+        self.assertEqual(self.index.best_match("Numero WhatsApp du centre").response_key, "whatsapp")
+        self.assertEqual(len(self.index), 5)
+
+    def test_remove_intent_hides_its_phrases(self):
+        self.index.remove_intent("contact")
+        self.assertMatch(self.index, "Numero de telephone", None)
+        self.assertMatch(self.index, "Horaires du centre", "horaires")
+        self.assertEqual(len(self.index), 4)
+
+    def test_shadowed_phrase_returns_to_the_next_owner(self):
+        self.assertMatch(self.index, "Ou est le centre ?", "horaires")
+        self.index.remove_intent("horaires")
+        self.assertMatch(self.index, "Ou est le centre ?", "adresse")
+        self.index.remove_intent("adresse")
+        self.assertMatch(self.index, "Ou est le centre ?", None)
+
+    def test_copy_leaves_the_original_untouched(self):
+        copy = self.index.copy()
+        copy.remove_intent("horaires")
+        copy.replace_intent("contact", "default", ["Numero WhatsApp du centre"])
+        self.assertMatch(self.index, "Ou est le centre ?", "horaires")
+        self.assertMatch(self.index, "Numero de telephone", "contact")
+        self.assertMatch(self.index, "Numero WhatsApp du centre", None)
+        self.assertMatch(copy, "Ou est le centre ?", "adresse")
+        self.assertMatch(copy, "Numero WhatsApp du centre", "contact")
+
+
+class DatabaseIntentStoreTests(TestCase):
+    def setUp(self):
+        with open(get_dataset_path(), encoding="utf-8") as file:
+            intents = json.load(file)["intents"]
+        self.data = {"intents": [dict(intent, training_phrases=intent["training_phrases"][:80]) for intent in intents]}
+        import_intents(self.data)
+        self.store = DatabaseIntentStore(check_interval=0, sync_interval=0)
+
+    def queries(self, data):
+        phrases = [phrase for intent in data["intents"] for phrase in intent["training_phrases"]]
+        return phrases[::7] + [phrase[1:] + " 7" for phrase in phrases[3::11]] + ["xqzw vbnm"]
+
+    def test_sync_never_mutates_a_published_index(self):
+        before = self.store.get()
+        first = self.data["intents"][0]
+        import_intents({"intents": [dict(first, training_phrases=["Question toute nouvelle sur le centre"])]})
+        after = self.store.get()
+        self.assertIsNot(after.index, before.index)
+        phrase = first["training_phrases"][0]
+        self.assertEqual(before.index.best_match(phrase).intent_name, first["intent_name"])
+        self.assertEqual(after.index.best_match("Question toute nouvelle sur le centre").intent_name, first["intent_name"])
+        self.assertFalse(before.index.removed)
+
+    def test_compacted_index_matches_a_freshly_built_index(self):
+        before = self.store.get()
+        # Assez d'intentions remplacées pour dépasser ``COMPACT_RATIO``.
+        changed = {"intents": [
+            dict(intent, training_phrases=[f"{phrase} svp" for phrase in intent["training_phrases"]])
+            for intent in self.data["intents"][1:]
+        ]}
+        import_intents(changed)
+        after = self.store.get()
+        self.assertIsNot(after.index, before.index)
+        self.assertFalse(after.index.removed)
+        fresh = IntentIndex.from_dataset(after.data)
+        self.assertEqual(after.index.phrases, fresh.phrases)
+        for text in self.queries(after.data):
+            with self.subTest(text=text):
+                self.assertEqual(after.index.best_match(text), fresh.best_match(text))
+
+
+class KeywordTests(SimpleTestCase):
+    """Salutations et langue reconnues par l'automate de mots-clés"""
+
+    def test_leading_greetings_and_openers_are_stripped(self):
+        cases = [
+            ("Comment allez-vous? Le centre est ouvert.", "Le centre est ouvert."),
+            ("Bonjour, comment allez-vous ? Le centre est ouvert.", "Le centre est ouvert."),
+            ("Ça va ? Le centre est ouvert.", "Le centre est ouvert."),
+            ("Hello! How are you? The centre is open.", "The centre is open."),
+            ("Habari! Kituo kiko wazi.", "Kituo kiko wazi."),
+            ("Le centre est ouvert. Bonjour a tous.", "Le centre est ouvert. Bonjour a tous."),
+            ("Bonjour", ""),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(_clean_model_answer(text, "fr"), expected)
+
+    def test_language_keywords_match_whole_words_only(self):
+        cases = [
+            ("this is it", None),
+            ("hillary", None),
+            ("Hi!", "en"),
+            ("please help", "en"),
+            ("Salut, ça va ?", "fr"),
+            ("Pourquoi ?", "fr"),
+            # Le français passe avant l'anglais.
+            ("Hello merci", "fr"),
+            ("Murakoze", "rn"),
+            ("Asante sana", "sw"),
+        ]
+        for text, lang in cases:
+            with self.subTest(text=text):
+                self.assertEqual(quick_language_guess(text), lang)
+
+    def test_greeting_only_messages(self):
+        for text in ("hi", "Bonjour", "Salut, ça va ?", "Good morning!"):
+            with self.subTest(text=text):
+                self.assertTrue(_is_greeting_only(text))
+        for text in ("this is it", "Bonjour, horaires du centre ?", "Merci beaucoup"):
+            with self.subTest(text=text):
+                self.assertFalse(_is_greeting_only(text))
+
+
+class InMemorySessionStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("chatbot.sessions.time")
+        patcher.start().monotonic.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+
+    def test_session_expires_after_inactivity(self):
+        store = InMemorySessionStore(ttl=60)
+        store.append("a", {"role": "USER", "message": "bonjour"})
+        self.now += 59
+        self.assertEqual(len(store.get_history("a")), 1)
+        # La lecture a prolongé la session.
+        self.now += 59
+        self.assertEqual(len(store.get_history("a")), 1)
+        self.now += 60
+        self.assertEqual(store.get_history("a"), [])
+
+    def test_least_recently_used_session_is_evicted(self):
+        store = InMemorySessionStore(max_sessions=2)
+        store.append("a", {"message": "a"})
+        store.append("b", {"message": "b"})
+        store.get_history("a")
+        store.append("c", {"message": "c"})
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get_history("b"), [])
+        self.assertEqual(store.get_history("a"), [{"message": "a"}])
+
+    def test_history_keeps_the_last_messages(self):
+        store = InMemorySessionStore(max_messages=3)
+        for i in range(5):
+            store.append("a", {"message": str(i)})
+        self.assertEqual([m["message"] for m in store.get_history("a")], ["2", "3", "4"])
+
+
+class SlowCache:
+    """Cache dont les lectures laissent la main aux autres threads"""
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def get(self, *args, **kwargs):
+        value = self._cache.get(*args, **kwargs)
+        time.sleep(0.001)
+        return value
+
+
+class CacheSessionStoreTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+
+    def test_concurrent_appends_from_several_workers_keep_every_turn(self):
+        slow = SlowCache(caches["default"])
+        patcher = mock.patch.object(CacheSessionStore, "cache", property(lambda store: slow))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Deux stockages sur le même cache : deux workers.
+        stores = [CacheSessionStore(max_messages=1000), CacheSessionStore(max_messages=1000)]
+        barrier = threading.Barrier(8)
+
+        def append(worker):
+            barrier.wait()
+            for i in range(25):
+                stores[worker % 2].append("shared", {"message": f"{worker}-{i}"})
+
+        threads = [threading.Thread(target=append, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(stores[0].get_history("shared")), 200)
+
+    def test_history_keeps_the_last_messages(self):
+        store = CacheSessionStore(max_messages=2)
+        store.append("a", {"message": "1"}, {"message": "2"})
+        store.append("a", {"message": "3"})
+        self.assertEqual([m["message"] for m in store.get_history("a")], ["2", "3"])
+
+
+class ChatAsyncViewTests(SimpleTestCase):
+    def test_json_body_must_be_an_object(self):
+        for body in ('[]', '"bonjour"', '3'):
+            with self.subTest(body=body):
+                response = self.client.post(reverse('chatbot-async'), body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'Objet JSON attendu'})
+
+    def test_invalid_json_is_rejected(self):
+        response = self.client.post(reverse('chatbot-async'), '{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ScriptedProvider(LLMProvider):
+    """Fournisseur qui diffuse des fragments fixés à l'avance"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def chat_stream(self, request):
+        yield from self.chunks
+        yield LLMReply("".join(self.chunks), 10, 5)
+
+
+class StreamBreakerTests(SimpleTestCase):
+    def setUp(self):
+        # Disjoncteur ouvert, immédiatement semi-ouvert.
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.breaker.record_failure()
+        provider = ScriptedProvider(["Le centre est ouvert. ", "Venez nous voir. ", "Merci."])
+        for patcher in (
+            mock.patch.object(llm_caller, "breaker", self.breaker),
+            mock.patch("chatbot.streaming.get_provider", return_value=provider),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_stream_closed_by_the_client_releases_the_probe(self):
+        stream = _stream_model({}, StreamingAnswerCleaner("fr"))
+        self.assertTrue(next(stream))
+        stream.close()
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow())
+
+    def test_complete_stream_closes_the_breaker(self):
+        text = "".join(_stream_model({}, StreamingAnswerCleaner("fr")))
+        self.assertEqual(text, "Le centre est ouvert. Venez nous voir.")
+        self.assertEqual(self.breaker.state, "closed")
+
+
+class ContextInvalidationTests(TestCase):
+    def test_context_is_invalidated_once_the_transaction_commits(self):
+        cache = get_context_cache()
+        cache.set(CONTEXT_CACHE_KEY, "contexte")
+        self.addCleanup(cache.delete, CONTEXT_CACHE_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Sport", slug="sport")
+            # Un message traité avant la validation garde l'ancien contexte.
+            self.assertEqual(cache.get(CONTEXT_CACHE_KEY), "contexte")
+        self.assertIsNone(cache.get(CONTEXT_CACHE_KEY))
+
+
+class ContentRetrievalTests(TestCase):
+    def setUp(self):
+        author = Member.objects.create_user(username="redaction", password="secret")
+        sport = Category.objects.create(name="Sport", slug="sport")
+        self.post = BlogPost.objects.create(
+            title="Tournoi de football", slug="tournoi-football", author=author, category=sport, is_published=True,
+            content="Les equipes du quartier s'affrontent au stade du centre. Inscriptions au secretariat.",
+        )
+        self.news = News.objects.create(
+            title="Nouvelle bibliotheque", author=author, is_published=True,
+            content="La bibliotheque du centre ouvre une salle de lecture et prete des livres aux jeunes.",
+        )
+        self.activity = Activity.objects.create(
+            title="Atelier de musique", author=author, activity_type="culture", date_activite="2026-11-07",
+            is_published=True, description="Cours de guitare et de percussions chaque samedi pour les debutants.",
+        )
+        BlogPost.objects.create(
+            title="Brouillon sur le football", slug="brouillon", author=author, content="Football football football.",
+        )
+        self.store = retrieval.ContentStore(check_interval=0)
+
+    def top(self, query):
+        return [(passage.kind, passage.pk) for _, passage in self.store.search(query, 3)]
+
+    def test_best_passage_comes_first(self):
+        cases = [
+            ("Quand a lieu le tournoi de football ?", ("blog", self.post.pk)),
+            ("Peut-on emprunter des livres a la bibliotheque ?", ("news", self.news.pk)),
+            ("Y a-t-il des cours de guitare ?", ("activity", self.activity.pk)),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                self.assertEqual(self.top(query)[0], expected)
+        # Un article non publié n'est pas indexé.
+        self.assertEqual(self.top("football"), [("blog", self.post.pk)])
+
+    def test_retrieve_formats_passages_within_the_budget(self):
+        with mock.patch.object(retrieval, "_store", self.store):
+            passages = retrieval.retrieve("cours de guitare", top_k=1, budget=60)
+        self.assertEqual(len(passages), 1)
+        self.assertTrue(passages[0].format().startswith("[Activite] Atelier de musique (07/11/2026):"))
+        self.assertLessEqual(len(passages[0].format()), 60)
+
+    def test_save_bumps_the_version_once_committed_and_reindexes(self):
+        self.assertEqual(self.top("natation")[:1], [])
+        before = get_counter(retrieval.VERSION_CACHE_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.news.content = "Le centre ouvre une piscine : cours de natation le mercredi."
+            self.news.save()
+            self.assertEqual(get_counter(retrieval.VERSION_CACHE_KEY), before)
+        self.assertNotEqual(get_counter(retrieval.VERSION_CACHE_KEY), before)
+        self.assertEqual(self.top("natation"), [("news", self.news.pk)])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def open_breaker(self, breaker):
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+    def expire(self, breaker):
+        breaker.opened_at -= breaker.reset_timeout
+
+    def test_opens_after_failure_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_open_breaker_rejects_calls_without_running_them(self):
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise ValueError("panne")
+
+        caller = ResilientCaller(CircuitBreaker(failure_threshold=2, reset_timeout=60), hedge=False)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                caller.call("test", failing, budget=1.0)
+        with self.assertRaises(CircuitOpenError):
+            caller.call("test", failing, budget=1.0)
+        self.assertEqual(len(calls), 2)
+
+    def test_half_open_breaker_allows_a_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.open_breaker(breaker)
+        self.expire(breaker)
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+    def test_probe_success_closes_the_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.open_breaker(breaker)
+        self.expire(breaker)
+        breaker.allow()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertFalse(breaker.allow())
+
+    def test_probe_failure_reopens_the_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        self.open_breaker(breaker)
+        self.expire(breaker)
+        breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+    def test_cancelled_async_probe_is_released(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.open_breaker(breaker)
+        self.expire(breaker)
+        caller = ResilientCaller(breaker, hedge=False)
+
+        async def cancelled_call():
+            task = asyncio.ensure_future(caller.acall("test", lambda: asyncio.sleep(10), budget=10))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancelled_call())
+        self.assertTrue(breaker.allow())
+
+
+class ResilientCallerTests(SimpleTestCase):
+    def setUp(self):
+        # Libère les appels encore bloqués à la fin du test.
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def test_hedge_is_sent_after_the_hedge_delay(self):
+        caller = ResilientCaller(CircuitBreaker(), hedge_min_delay=0.05)
+        # Sans historique de latence, le délai vaut la moitié du budget.
+        self.assertEqual(caller.hedge_delay("test", 0.4), 0.2)
+        started = []
+
+        def call():
+            started.append(time.monotonic())
+            if len(started) == 1:
+                self.release.wait(5)
+                return "premiere"
+            return "doublee"
+
+        self.assertEqual(caller.call("test", call, budget=0.4), "doublee")
+        self.assertEqual(len(started), 2)
+        self.assertGreaterEqual(started[1] - started[0], 0.19)
+
+    def test_fast_call_is_not_hedged(self):
+        caller = ResilientCaller(CircuitBreaker(), hedge_min_delay=0.05)
+        calls = []
+        self.assertEqual(caller.call("test", lambda: calls.append(1) or "ok", budget=0.4), "ok")
+        time.sleep(0.25)
+        self.assertEqual(len(calls), 1)
+
+    def test_losing_hedge_is_reported(self):
+        discarded = []
+        arrived = threading.Event()
+
+        def on_discarded(result):
+            discarded.append(result)
+            arrived.set()
+
+        caller = ResilientCaller(CircuitBreaker(), hedge_min_delay=0.05, on_discarded=on_discarded)
+        started = []
+
+        def call():
+            started.append(1)
+            if len(started) == 1:
+                self.release.wait(5)
+                return "premiere"
+            return "doublee"
+
+        self.assertEqual(caller.call("test", call, budget=0.2), "doublee")
+        self.release.set()
+        self.assertTrue(arrived.wait(5))
+        self.assertEqual(discarded, ["premiere"])
+
+    def test_timeout_when_the_budget_runs_out(self):
+        breaker = CircuitBreaker()
+        caller = ResilientCaller(breaker, hedge=False)
+        started = time.monotonic()
+        with self.assertRaises(LLMTimeout):
+            caller.call("test", lambda: self.release.wait(5), budget=0.1)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(breaker.failures, 1)
+
+    def test_async_hedge_and_timeout(self):
+        caller = ResilientCaller(CircuitBreaker(), hedge_min_delay=0.05)
+        delays = iter([10, 0])
+
+        async def reply():
+            await asyncio.sleep(next(delays))
+            return "reponse"
+
+        self.assertEqual(asyncio.run(caller.acall("test", reply, budget=0.2)), "reponse")
+        with self.assertRaises(LLMTimeout):
+            asyncio.run(caller.acall("test", lambda: asyncio.sleep(10), budget=0.1))
+
+
+class SingleFlightTests(SimpleTestCase):
+    def run_concurrently(self, func, waiters=4):
+        """Un meneur bloqué dans ``func`` puis ``waiters`` demandeurs ; résultats ou erreurs"""
+        flight = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        calls = []
+        outcomes = []
+
+        def leader_func():
+            calls.append(1)
+            entered.set()
+            release.wait(5)
+            return func()
+
+        def ask():
+            try:
+                outcomes.append(flight.do("cle", leader_func))
+            except Exception as exc:
+                outcomes.append(exc)
+
+        threads = [threading.Thread(target=ask)]
+        threads[0].start()
+        self.assertTrue(entered.wait(5))
+        threads += [threading.Thread(target=ask) for _ in range(waiters)]
+        for thread in threads[1:]:
+            thread.start()
+        # Laisse les demandeurs se mettre en attente de l'appel en cours.
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight._calls, {})
+        return outcomes
+
+    def test_waiters_share_the_leader_result(self):
+        outcomes = self.run_concurrently(lambda: "reponse")
+        self.assertCountEqual(outcomes, [("reponse", False)] + [("reponse", True)] * 4)
+
+    def test_leader_error_reaches_every_waiter(self):
+        def fail():
+            raise ValueError("panne")
+
+        outcomes = self.run_concurrently(fail)
+        self.assertEqual(len(outcomes), 5)
+        for outcome in outcomes:
+            self.assertIsInstance(outcome, ValueError)
+
+    def test_key_is_released_after_completion(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("cle", lambda: 1), (1, False))
+        self.assertEqual(flight.do("cle", lambda: 2), (2, False))
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    def gather(self, factory, waiters=5):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def counted():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return await factory()
+
+        async def main():
+            outcomes = await asyncio.gather(
+                *(flight.do("cle", counted) for _ in range(waiters)), return_exceptions=True
+            )
+            return outcomes, dict(flight._tasks)
+
+        outcomes, remaining = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(remaining, {})
+        return outcomes
+
+    def test_waiters_share_the_leader_result(self):
+        async def reply():
+            return "reponse"
+
+        outcomes = self.gather(reply)
+        self.assertEqual(outcomes, [("reponse", False)] + [("reponse", True)] * 4)
+
+    def test_leader_error_reaches_every_waiter(self):
+        async def fail():
+            raise ValueError("panne")
+
+        outcomes = self.gather(fail)
+        self.assertEqual(len(outcomes), 5)
+        for outcome in outcomes:
+            self.assertIsInstance(outcome, ValueError)
+
+
+SMALL_DATASET = {
+    "intents": [
+        {
+            "intent_name": "horaires",
+            "training_phrases": ["Quels sont les horaires ?", "Le centre ouvre a quelle heure ?"],
+            "responses": {"default": {
+                "fr": "Le centre est ouvert du lundi au samedi.",
+                "en": "The centre is open from Monday to Saturday.",
+            }},
+        },
+        {
+            "intent_name": "contact",
+            "training_phrases": ["Comment vous contacter ?", "Numero de telephone"],
+            "responses": {"default": {
+                "fr": "Appelez le secretariat du centre.",
+                "en": "Call the centre's office.",
+            }},
+        },
+    ]
+}
+
+
+class CompiledDatasetTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "dataset.json")
+        self.raw = json.dumps(SMALL_DATASET).encode("utf-8")
+        with open(self.path, "wb") as file:
+            file.write(self.raw)
+        patcher = override_settings(CHATBOT_DATASET_PATH=self.path)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.checksum = hashlib.sha256(self.raw).hexdigest()
+
+    def compile(self):
+        write_compiled(get_compiled_path(), SMALL_DATASET, self.checksum)
+
+    def test_artifact_keeps_responses_and_language_model(self):
+        self.compile()
+        compiled = load_compiled(get_compiled_path(), self.checksum)
+        trained = LanguageClassifier.from_dataset(SMALL_DATASET)
+        self.assertEqual(compiled.responses["contact"], SMALL_DATASET["intents"][1]["responses"])
+        for text in ("Le centre est ouvert", "Call the office", "xyz"):
+            with self.subTest(text=text):
+                guess = compiled.language_classifier.predict(text)
+                self.assertEqual(guess.lang, trained.predict(text).lang)
+                self.assertAlmostEqual(guess.confidence, trained.predict(text).confidence)
+
+    def test_up_to_date_artifact_is_loaded_without_rebuilding(self):
+        self.compile()
+        with mock.patch.object(LanguageClassifier, "from_dataset") as train, \
+                mock.patch.object(IntentIndex, "from_dataset") as build:
+            dataset = ChatbotDataset(SMALL_DATASET, self.checksum)
+        train.assert_not_called()
+        build.assert_not_called()
+        self.assertIsInstance(dataset.index, MappedIntentIndex)
+        self.assertEqual(dataset.get_response("horaires", None, "en"), "The centre is open from Monday to Saturday.")
+
+    def test_stale_artifact_is_ignored(self):
+        write_compiled(get_compiled_path(), SMALL_DATASET, "autre contenu")
+        dataset = ChatbotDataset(SMALL_DATASET, self.checksum)
+        self.assertNotIsInstance(dataset.index, MappedIntentIndex)
+
+    def test_recompiled_artifact_is_picked_up_without_dataset_change(self):
+        store = DatasetStore(self.path, ChatbotDataset, check_interval=0, companions=[get_compiled_path()])
+        self.assertNotIsInstance(store.get().index, MappedIntentIndex)
+        self.compile()
+        self.assertIsInstance(store.get().index, MappedIntentIndex)
+
+
+class ClassifyUtterancesCommandTests(SimpleTestCase):
+    def test_non_text_field_is_rejected(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8", delete=False) as file:
+            file.write('{"text": "Horaires du centre"}\n{"text": 42}\n')
+        self.addCleanup(os.remove, file.name)
+        with self.assertRaisesMessage(CommandError, "Ligne 2: le champ text doit etre un texte"):
+            call_command("classify_utterances", file.name)
+
+
+class CaptureWriterTests(SimpleTestCase):
+    def test_only_the_pid_placeholder_is_replaced(self):
+        writer = CaptureWriter("/var/log/cjk/{pid}/chat-{date}-{0}.jsonl")
+        self.assertEqual(writer.path, f"/var/log/cjk/{os.getpid()}/chat-{{date}}-{{0}}.jsonl")
@@ -1,6 +1,11 @@
 from django.urls import path
-from .views import chat
+from .views import chat, chat_async, chat_stream, classify, metrics, ready
 
 urlpatterns = [
     path('chat/', chat, name='chatbot'),
+    path('chat/stream/', chat_stream, name='chatbot-stream'),
+    path('chat/async/', chat_async, name='chatbot-async'),
+    path('metrics/', metrics, name='chatbot-metrics'),
+    path('ready/', ready, name='chatbot-ready'),
+    path('classify/', classify, name='chatbot-classify'),
 ]
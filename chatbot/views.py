@@ -1,8 +1,18 @@
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from .chatbot_service import send_message
+from .chatbot_service import is_warm, send_message, warm_up
+from .dataset import get_dataset
+from .async_service import asend_message
+from .streaming import astream_message, stream_message
+from .metrics import current_trace, registry
+from .capture import capture_exchange
+from .answer_cache import answer_cache
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -16,6 +26,108 @@ def chat(request):
     
     try:
         response = send_message(message, session_key)
+        capture_exchange(message, session_key, current_trace(), response)
         return Response({'response': response}, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def chat_stream(request):
+    """Réponse du chatbot diffusée en server-sent events"""
+    message = request.data.get('message')
+    session_key = request.data.get('session_key', 'default')
+
+    if not message:
+        return Response({'error': 'Message requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Sous ASGI, seul un itérateur asynchrone est envoyé au fil de l'eau.
+    if isinstance(request._request, ASGIRequest):
+        events = astream_message(message, session_key)
+    else:
+        events = stream_message(message, session_key)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Empêche nginx de retenir le flux dans son tampon
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Durées par étape et jetons consommés (processus courant, staff uniquement)"""
+    snapshot = registry.snapshot()
+    snapshot['answer_cache'] = answer_cache.stats()
+    return Response(snapshot)
+
+
+# Nombre maximal de questions par appel à ``classify``
+CLASSIFY_MAX_UTTERANCES = 5000
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def classify(request):
+    """Intentions d'une liste de questions (staff, réglage du dataset)"""
+    # NumPy n'est chargé que par les workers qui servent cet endpoint.
+    from .batch import get_batch_classifier
+
+    utterances = request.data.get('utterances')
+    if not isinstance(utterances, list) or not all(isinstance(text, str) for text in utterances):
+        return Response({'error': 'utterances doit etre une liste de textes'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(utterances) > CLASSIFY_MAX_UTTERANCES:
+        return Response(
+            {'error': f'{CLASSIFY_MAX_UTTERANCES} questions au plus par appel'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        top_k = max(1, int(request.data.get('top_k', 3)))
+    except (TypeError, ValueError):
+        return Response({'error': 'top_k invalide'}, status=status.HTTP_400_BAD_REQUEST)
+
+    dataset = get_dataset()
+    results = get_batch_classifier(dataset).classify(utterances, top_k=top_k)
+    return Response({'dataset': dataset.checksum[:12], 'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def ready(request):
+    """Sonde de disponibilité : prépare le chatbot au premier appel"""
+    try:
+        dataset = get_dataset() if is_warm() else warm_up()
+    except Exception as e:
+        return Response({'ready': False, 'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({'ready': True, 'dataset': dataset.checksum[:12], 'phrases': len(dataset.index)})
+
+
+async def chat_async(request):
+    """Variante asynchrone de ``chat`` pour les déploiements ASGI"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    try:
+        data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        return JsonResponse({'error': 'JSON invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Objet JSON attendu'}, status=status.HTTP_400_BAD_REQUEST)
+
+    message = data.get('message')
+    session_key = data.get('session_key', 'default')
+
+    if not message:
+        return JsonResponse({'error': 'Message requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        response = await asend_message(message, session_key)
+        return JsonResponse({'response': response}, status=status.HTTP_200_OK)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Comme les vues DRF, l'endpoint public n'exige pas de jeton CSRF
+# (csrf_exempt ne gère pas encore les vues asynchrones sous Django 4.2).
+chat_async.csrf_exempt = True
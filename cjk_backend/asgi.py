@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Served by an ASGI server (e.g. ``gunicorn cjk_backend.asgi:application -k
+uvicorn.workers.UvicornWorker``), the async chatbot endpoint
+``/api/chatbot/chat/async/`` awaits Cohere without holding a worker thread.
 """
 
 import os
@@ -95,6 +95,20 @@ DATABASES = {
     }
 }
 
+# Cache Django. LocMemCache (par defaut) est propre a chaque worker : avec
+# plusieurs workers, choisir un cache partage, par exemple
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache et
+# CACHE_LOCATION=cjk_cache (apres `createcachetable`), ou
+# django.core.cache.backends.redis.RedisCache et redis://... (paquet redis).
+# Sinon l'invalidation du contexte du chatbot et les compteurs de version
+# des intentions et du contenu ne depassent pas le worker qui a sauvegarde.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -141,6 +155,104 @@ GOOGLE_API_KEY = config('GOOGLE_API_KEY', default='')
 
 COHERE_API_KEY = config('COHERE_API_KEY', default='')
 COHERE_MODEL = config('COHERE_MODEL', default='command-r-08-2024')
+CHATBOT_LANGUAGE_CONFIDENCE = config('CHATBOT_LANGUAGE_CONFIDENCE', default=0.75, cast=float)
+CHATBOT_DIRECT_ANSWER_SCORE = config('CHATBOT_DIRECT_ANSWER_SCORE', default=0.9, cast=float)
+CHATBOT_DIRECT_ANSWER_MARGIN = config('CHATBOT_DIRECT_ANSWER_MARGIN', default=0.15, cast=float)
+CHATBOT_PIPELINE_WORKERS = config('CHATBOT_PIPELINE_WORKERS', default=8, cast=int)
+
+# Historique du chatbot : 'memory' (par worker) ou 'cache' (cache Django
+# partagé, par exemple DatabaseCache apres `createcachetable`, ou Redis)
+CHATBOT_SESSION_BACKEND = config('CHATBOT_SESSION_BACKEND', default='memory')
+CHATBOT_SESSION_CACHE = config('CHATBOT_SESSION_CACHE', default='default')
+CHATBOT_SESSION_TTL = config('CHATBOT_SESSION_TTL', default=3600, cast=int)
+CHATBOT_SESSION_MAX_MESSAGES = config('CHATBOT_SESSION_MAX_MESSAGES', default=20, cast=int)
+CHATBOT_MAX_SESSIONS = config('CHATBOT_MAX_SESSIONS', default=10000, cast=int)
+
+# Contexte BDD du chatbot (articles, activites, membres), invalide par signaux
+CHATBOT_CONTEXT_CACHE = config('CHATBOT_CONTEXT_CACHE', default='default')
+CHATBOT_CONTEXT_TTL = config('CHATBOT_CONTEXT_TTL', default=300, cast=int)
+
+# Passages des articles, actualites et activites publies les plus proches
+# de la question (BM25), a la place des derniers elements : au plus
+# CHATBOT_RETRIEVAL_TOP_K passages dans CHATBOT_RETRIEVAL_BUDGET caracteres ;
+# index tenu a jour par signaux (compteur de version du cache
+# CHATBOT_CONTEXT_CACHE) et au plus tard apres CHATBOT_RETRIEVAL_SYNC_INTERVAL
+CHATBOT_RETRIEVAL = config('CHATBOT_RETRIEVAL', default=True, cast=bool)
+CHATBOT_RETRIEVAL_TOP_K = config('CHATBOT_RETRIEVAL_TOP_K', default=3, cast=int)
+CHATBOT_RETRIEVAL_BUDGET = config('CHATBOT_RETRIEVAL_BUDGET', default=1000, cast=int)
+CHATBOT_RETRIEVAL_SYNC_INTERVAL = config('CHATBOT_RETRIEVAL_SYNC_INTERVAL', default=60.0, cast=float)
+
+# Historique envoye au LLM, en jetons estimes : derniers echanges dans le
+# budget, les plus anciens resumes, messages trop longs tronques
+CHATBOT_HISTORY_TOKEN_BUDGET = config('CHATBOT_HISTORY_TOKEN_BUDGET', default=600, cast=int)
+CHATBOT_SUMMARY_TOKEN_BUDGET = config('CHATBOT_SUMMARY_TOKEN_BUDGET', default=150, cast=int)
+CHATBOT_MESSAGE_TOKEN_LIMIT = config('CHATBOT_MESSAGE_TOKEN_LIMIT', default=250, cast=int)
+
+# Cache des reponses aux questions generales (questions quasi identiques,
+# meme langue, meme contexte BDD)
+CHATBOT_ANSWER_CACHE_SIZE = config('CHATBOT_ANSWER_CACHE_SIZE', default=1000, cast=int)
+CHATBOT_ANSWER_CACHE_TTL = config('CHATBOT_ANSWER_CACHE_TTL', default=600, cast=int)
+CHATBOT_ANSWER_CACHE_SIMILARITY = config('CHATBOT_ANSWER_CACHE_SIMILARITY', default=0.9, cast=float)
+
+# Appels a Cohere : budget de latence (secondes) par type d'appel, requete
+# doublee au-dela du p95 recent, disjoncteur apres N echecs consecutifs
+CHATBOT_LLM_BUDGETS = {
+    'language': config('CHATBOT_LLM_BUDGET_LANGUAGE', default=3.0, cast=float),
+    'reformulate': config('CHATBOT_LLM_BUDGET_REFORMULATE', default=8.0, cast=float),
+    'general': config('CHATBOT_LLM_BUDGET_GENERAL', default=12.0, cast=float),
+}
+CHATBOT_LLM_HEDGE = config('CHATBOT_LLM_HEDGE', default=True, cast=bool)
+CHATBOT_LLM_HEDGE_MIN_DELAY = config('CHATBOT_LLM_HEDGE_MIN_DELAY', default=1.0, cast=float)
+CHATBOT_BREAKER_FAILURES = config('CHATBOT_BREAKER_FAILURES', default=5, cast=int)
+CHATBOT_BREAKER_RESET = config('CHATBOT_BREAKER_RESET', default=30.0, cast=float)
+
+# Fournisseur du LLM : 'cohere' (API Cohere, ou serveur compatible a
+# CHATBOT_LLM_BASE_URL, par exemple `manage.py fake_llm_server`) ou 'fake'
+# (faux LLM dans le processus, sans reseau, pour les tests de charge)
+CHATBOT_LLM_PROVIDER = config('CHATBOT_LLM_PROVIDER', default='cohere')
+CHATBOT_LLM_BASE_URL = config('CHATBOT_LLM_BASE_URL', default='https://api.cohere.com')
+CHATBOT_FAKE_LLM_LATENCY = config('CHATBOT_FAKE_LLM_LATENCY', default=0.8, cast=float)
+CHATBOT_FAKE_LLM_LATENCY_P95 = config('CHATBOT_FAKE_LLM_LATENCY_P95', default=2.0, cast=float)
+CHATBOT_FAKE_LLM_TOKENS_PER_SECOND = config('CHATBOT_FAKE_LLM_TOKENS_PER_SECOND', default=40.0, cast=float)
+CHATBOT_FAKE_LLM_ERROR_RATE = config('CHATBOT_FAKE_LLM_ERROR_RATE', default=0.0, cast=float)
+
+# Intentions du chatbot : 'file' (cjk_dataset.json) ou 'database' (modeles
+# Intent/TrainingPhrase/Response edites dans l'admin, `import_intents` pour
+# charger le fichier) ; les workers rechargent les intentions modifiees des
+# que le compteur de version du cache CHATBOT_CONTEXT_CACHE change, et au
+# plus tard apres CHATBOT_INTENT_SYNC_INTERVAL secondes
+CHATBOT_INTENT_SOURCE = config('CHATBOT_INTENT_SOURCE', default='file')
+CHATBOT_INTENT_SYNC_INTERVAL = config('CHATBOT_INTENT_SYNC_INTERVAL', default=60.0, cast=float)
+
+# Enregistrement des echanges de `chat/` en JSONL (session anonymisee,
+# message, langue, intention, durees, reponse) pour `replay_captures` ;
+# ecrit en arriere-plan, avec rotation. `{pid}` dans le chemin donne un
+# fichier par worker.
+CHATBOT_CAPTURE = config('CHATBOT_CAPTURE', default=False, cast=bool)
+CHATBOT_CAPTURE_PATH = config('CHATBOT_CAPTURE_PATH', default=str(BASE_DIR / 'logs' / 'chatbot_requests.jsonl'))
+CHATBOT_CAPTURE_MAX_BYTES = config('CHATBOT_CAPTURE_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+CHATBOT_CAPTURE_BACKUPS = config('CHATBOT_CAPTURE_BACKUPS', default=5, cast=int)
+
+# Preparation du chatbot au demarrage d'un serveur (dataset, index, connexion
+# keep-alive vers le LLM) ; a activer pour les workers web uniquement
+CHATBOT_WARMUP = config('CHATBOT_WARMUP', default=False, cast=bool)
+
+# Une ligne de journal par message du chatbot (durées par etape, jetons)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'chatbot': {
+            'handlers': ['console'],
+            'level': config('CHATBOT_LOG_LEVEL', default='INFO'),
+        },
+    },
+}
 
 
 # CORS Settings